@@ -1,24 +1,39 @@
 from datetime import timedelta
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.dependencies import get_db
 from app.schemas.token_schema import Token
 from app.services import auth_service
 from app.core.config import settings
+from app.core.instrumentation import TimedRoute
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
 @router.post("/login", response_model=Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
+async def login_for_access_token(
+    form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)
+):
     """
     Authenticates a user based on a username and password form.
 
     On successful authentication, it returns a JWT access token.
     On failure, it raises a 401 Unauthorized error.
+    The bcrypt check runs on a bounded thread pool; when too many logins are
+    already waiting for it, a 503 error with Retry-After is raised instead.
+    Logins are also rate limited per client IP by app.core.admission (429).
     """
-    user = auth_service.get_user(form_data.username)
+    try:
+        user = await auth_service.authenticate_user(db, form_data.username, form_data.password)
+    except auth_service.PasswordHashingBusy:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many login attempts in progress, try again shortly",
+            headers={"Retry-After": "1"},
+        )
 
-    if not user or not auth_service.verify_password(form_data.password, user["hashed_password"]):
+    if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
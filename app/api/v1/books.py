@@ -1,26 +1,214 @@
-from typing import List, Optional
-from fastapi import APIRouter, Depends, Query
+import json
+from typing import List, Literal, Optional, Sequence, Tuple
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from pydantic import TypeAdapter
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.dependencies import get_db
+from app.core import fast_json
+from app.core.config import settings
+
+from app.core.dependencies import get_read_db, get_recommendation_model
+from app.core.pagination import decode_cursor, encode_cursor
+from app.core.replicas import replica_router
+from app.core.response_cache import book_tag, etag_for, etag_matches, pack_entry, response_cache, unpack_entry
 from app.core.security import get_current_user
+from app.core.instrumentation import TimedRoute
+from app.recommender.incremental import IncrementalModel
 from app.schemas import book_schema, user_schema
 
-from app.services import book_service
+from app.services import book_service, leaderboard_service, recommendation_service, suggest_service
+
+router = APIRouter(route_class=TimedRoute)
+
+books_adapter = TypeAdapter(List[book_schema.Book])
+BOOK_FIELDS = tuple(book_schema.Book.model_fields)
+
+LeaderboardMetric = Literal["rating", "popularity", "trending"]
+
+def _encode_books(books: List[dict]) -> bytes:
+    if settings.FAST_JSON_RESPONSES:
+        # the dicts already have the schema's shape, apart from the extras used for the cursor
+        return fast_json.dumps([{field: book[field] for field in BOOK_FIELDS} for book in books])
+    return books_adapter.dump_json(books_adapter.validate_python(books))
+
+async def _render_ranked_page(
+    db: AsyncSession, sort: str, skip: int, limit: int, cursor: Optional[str], genres: Optional[Sequence[str]]
+) -> Tuple[bytes, dict]:
+    """
+    Reads a page of books in leaderboard order. Not cached: the leaderboards
+    are in memory and change with every review, and the books are fetched by id.
+    """
+    after_id = after_score = None
+    if cursor is not None:
+        try:
+            values = decode_cursor(cursor)
+            after_id = int(values["id"])
+            after_score = float(values["score"])
+        except (ValueError, KeyError, TypeError):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+    books = await leaderboard_service.get_ranked_books(
+        db, metric=sort, limit=limit, skip=0 if cursor else skip, after_score=after_score, after_id=after_id, genres=genres
+    )
+    body = _encode_books(books)
+    headers = {"ETag": etag_for(body)}
+    if len(books) == limit:
+        headers["X-Next-Cursor"] = encode_cursor({"id": books[-1]["id"], "score": books[-1]["score"]})
+    return body, headers
 
-router = APIRouter()
+async def _render_books_page(
+    db: AsyncSession,
+    search: Optional[str],
+    skip: int,
+    limit: int,
+    cursor: Optional[str],
+    genres: Optional[Sequence[str]],
+    author: Optional[str],
+) -> Tuple[bytes, List[str]]:
+    """
+    Queries a page of books and packs its JSON body and headers into a cache
+    entry. Also returns the cache tags of the books on the page.
+    """
+    after_id = after_relevance = None
+    if cursor is not None:
+        try:
+            values = decode_cursor(cursor)
+            after_id = int(values["id"])
+            if search:
+                after_relevance = float(values["relevance"])
+        except (ValueError, KeyError, TypeError):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+    books = await book_service.get_all_books(
+        db,
+        search=search,
+        skip=0 if cursor else skip,
+        limit=limit,
+        after_id=after_id,
+        after_relevance=after_relevance,
+        lean=settings.FAST_JSON_RESPONSES,
+        genres=genres,
+        author=author,
+    )
+
+    body = _encode_books(books)
+    headers = {"ETag": etag_for(body)}
+    if len(books) == limit:
+        last = books[-1]
+        values = {"id": last["id"]}
+        if search:
+            values["relevance"] = last["relevance"]
+        headers["X-Next-Cursor"] = encode_cursor(values)
+    return pack_entry(body, headers), [book_tag(book["id"]) for book in books]
 
 @router.get("/", response_model=List[book_schema.Book])
 async def read_books(
+    request: Request,
     search: Optional[str] = Query(None, description="Search by title or author"),
     skip: int = Query(0, ge=0, description="Offset for pagination"),
     limit: int = Query(10, ge=1, le=100, description="Limit for pagination"),
-    db: AsyncSession = Depends(get_db),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header of the previous page"),
+    sort: Optional[LeaderboardMetric] = Query(None, description="Order by Bayesian rating, number of ratings or recent review activity"),
+    genre: Optional[List[str]] = Query(None, description="Only books of these genres (exact match, repeatable)"),
+    author: Optional[str] = Query(None, description="Only books by this author (exact match)"),
+    db: AsyncSession = Depends(get_read_db),
     current_user: user_schema.User = Depends(get_current_user)
 ):
     """
     Retrieve a list of all books. Requires a valid JWT token.
-    Supports search by title/author and pagination (skip/limit).
+    Supports search by title/author, with results ordered by relevance, or
+    ordering by a leaderboard with `sort`, exact-match `genre` (any of
+    several) and `author` filters, and pagination, either with
+    skip/limit or, for deep pages, with the cursor returned in the
+    X-Next-Cursor header.
+
+    Unsorted pages are served from the response cache when possible; every
+    page carries an ETag, and a request whose If-None-Match matches it gets
+    an empty 304 response.
+    """
+    genres = sorted(set(genre)) if genre else None
+    if sort is not None:
+        if search or author is not None:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="sort cannot be combined with search or author")
+        body, headers = await _render_ranked_page(db, sort, skip, limit, cursor, genres)
+    else:
+        cache_key = "books:" + json.dumps([limit, cursor or skip, search or "", genres, author])
+        # a user who just wrote reads the primary, not pages cached before the write
+        entry = None if replica_router.is_recent_writer(current_user.username) else await response_cache.get(cache_key)
+        if entry is None:
+            entry, tags = await _render_books_page(db, search, skip, limit, cursor, genres, author)
+            # a lagging replica could put a page back that a write just invalidated
+            if not db.info.get("replica") or replica_router.writes_settled():
+                await response_cache.set(cache_key, entry, ttl=settings.BOOKS_CACHE_TTL_SECONDS, tags=tags)
+        body, headers = unpack_entry(entry)
+
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@router.get("/suggest", response_model=List[book_schema.BookSuggestion])
+async def suggest_books(
+    q: str = Query(..., min_length=1, max_length=100, description="What the user has typed so far"),
+    limit: int = Query(10, ge=1, le=20, description="Number of suggestions"),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: user_schema.User = Depends(get_current_user)
+):
+    """
+    Autocomplete for the search box: the most popular books with a title or
+    author word starting with every word typed, from an in-memory prefix
+    index rather than a database search. Requires a valid JWT token.
+    """
+    return await suggest_service.suggest_books(db, q=q, limit=limit)
+
+@router.get("/facets", response_model=book_schema.BookFacets)
+async def read_book_facets(
+    request: Request,
+    search: Optional[str] = Query(None, description="Count only books matching this title/author search"),
+    author: Optional[str] = Query(None, description="Count only books by this author (exact match)"),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: user_schema.User = Depends(get_current_user)
+):
+    """
+    Retrieve the number of books per genre, for the whole catalogue or for
+    the books matching a search and/or author. Requires a valid JWT token.
+    Responses are cached like book pages, without per-book invalidation.
+    """
+    cache_key = "facets:" + json.dumps([search or "", author])
+    entry = await response_cache.get(cache_key)
+    if entry is None:
+        body = fast_json.dumps(await book_service.get_genre_facets(db, search=search, author=author))
+        entry = pack_entry(body, {"ETag": etag_for(body)})
+        await response_cache.set(cache_key, entry, ttl=settings.BOOKS_CACHE_TTL_SECONDS)
+
+    body, headers = unpack_entry(entry)
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@router.get("/top", response_model=List[book_schema.ScoredBook])
+async def read_top_books(
+    metric: LeaderboardMetric = Query("rating", description="Bayesian rating, number of ratings or recent review activity"),
+    genre: Optional[str] = Query(None, description="Only rank books of this genre"),
+    limit: int = Query(10, ge=1, le=100, description="Number of books"),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: user_schema.User = Depends(get_current_user)
+):
+    """
+    Retrieve the best books by a metric, overall or within a genre, from the
+    in-memory leaderboards. Requires a valid JWT token.
+    """
+    return await leaderboard_service.get_top_books(db, metric=metric, genre=genre, limit=limit)
+
+@router.get("/{book_id}/similar", response_model=List[book_schema.ScoredBook])
+async def read_similar_books(
+    book_id: int,
+    limit: int = Query(10, ge=1, le=50, description="Number of similar books"),
+    db: AsyncSession = Depends(get_read_db),
+    model: IncrementalModel = Depends(get_recommendation_model),
+    current_user: user_schema.User = Depends(get_current_user)
+):
+    """
+    Retrieve the books most similar to the given book, based on how users
+    rated them. Requires a valid JWT token.
     """
-    books = await book_service.get_all_books(db, search=search, skip=skip, limit=limit)
-    return books
\ No newline at end of file
+    return await recommendation_service.get_similar_books(db, model, book_id=book_id, limit=limit)
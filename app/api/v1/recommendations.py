@@ -0,0 +1,27 @@
+from typing import List
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.dependencies import get_read_db, get_recommendation_model
+from app.core.security import get_current_user
+from app.core.instrumentation import TimedRoute
+from app.recommender.incremental import IncrementalModel
+from app.schemas import book_schema, user_schema
+from app.services import recommendation_service
+
+router = APIRouter(route_class=TimedRoute)
+
+@router.get("/me", response_model=List[book_schema.ScoredBook])
+async def read_my_recommendations(
+    limit: int = Query(10, ge=1, le=50, description="Number of recommendations"),
+    db: AsyncSession = Depends(get_read_db),
+    model: IncrementalModel = Depends(get_recommendation_model),
+    current_user: user_schema.User = Depends(get_current_user)
+):
+    """
+    Recommend books the current user has not reviewed yet, based on the books
+    they have rated. Requires authentication.
+    """
+    return await recommendation_service.get_recommendations_for_user(
+        db, model, user_id=current_user.id, limit=limit
+    )
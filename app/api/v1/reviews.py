@@ -1,24 +1,74 @@
-from typing import List
-from fastapi import APIRouter, Depends, status
+from typing import List, Literal, Optional, Tuple
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.dependencies import get_db
+from app.core import fast_json
+from app.core.config import settings
+from app.core.dependencies import get_db, get_read_db, read_session
+from app.core.pagination import decode_cursor, encode_cursor
+from app.core.replicas import replica_router
 from app.core.security import get_current_user
+from app.core.instrumentation import TimedRoute
 from app.schemas import review_schema, user_schema
 from app.services import review_service
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
+
+def _decode_review_cursor(cursor: Optional[str], sort: str) -> Tuple[Optional[int], Optional[int]]:
+    if cursor is None:
+        return None, None
+    try:
+        values = decode_cursor(cursor)
+        return int(values["id"]), int(values["rating"]) if sort == "rating" else None
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+async def _stream_reviews(user_key: str, book_id: int, sort: str, after_id: Optional[int], after_rating: Optional[int]):
+    # the request's session is closed before a streaming body is sent, so the stream opens its own
+    async with read_session(user_key) as db:
+        async for chunk in review_service.iter_reviews_ndjson(
+            db, book_id=book_id, sort=sort, after_id=after_id, after_rating=after_rating
+        ):
+            yield chunk
 
 @router.get("/books/{book_id}/reviews", response_model=List[review_schema.Review])
 async def get_reviews_for_book(
     book_id: int,
-    db: AsyncSession = Depends(get_db),
+    response: Response,
+    limit: int = Query(50, ge=1, le=500, description="Page size"),
+    sort: Literal["id", "rating"] = Query("id", description="Oldest first, or highest rating first"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header of the previous page"),
+    format: Literal["json", "ndjson"] = Query("json", description="ndjson streams all remaining reviews, ignoring limit"),
+    db: AsyncSession = Depends(get_read_db),
     current_user: user_schema.User = Depends(get_current_user)
 ):
     """
-    Retrieve all reviews for a specific book. Requires authentication.
+    Retrieve the reviews for a specific book, a page at a time, with the
+    cursor for the next page in the X-Next-Cursor header. With format=ndjson,
+    every review from the cursor on is streamed as newline-delimited JSON
+    instead. Requires authentication.
     """
-    reviews = await review_service.get_reviews_for_book(db, book_id=book_id)
+    after_id, after_rating = _decode_review_cursor(cursor, sort)
+    if format == "ndjson":
+        return StreamingResponse(
+            _stream_reviews(current_user.username, book_id, sort, after_id, after_rating),
+            media_type="application/x-ndjson",
+        )
+
+    reviews = await review_service.get_reviews_for_book(
+        db, book_id=book_id, limit=limit, sort=sort, after_id=after_id, after_rating=after_rating
+    )
+    if len(reviews) == limit:
+        last = reviews[-1]
+        values = {"id": last["id"]}
+        if sort == "rating":
+            values["rating"] = last["rating"]
+        response.headers["X-Next-Cursor"] = encode_cursor(values)
+
+    if settings.FAST_JSON_RESPONSES:
+        # the rows come straight from the review columns, so there is nothing to validate
+        return Response(content=fast_json.dumps(reviews), media_type="application/json", headers=response.headers)
     return reviews
 
 @router.post(
@@ -34,9 +84,27 @@ async def create_or_update_book_review(
 ):
     """
     Create a new review for a book or update an existing one.
-    Requires authentication.
+    Requires authentication. The user's reads then go to the primary for a
+    few seconds, so they see their review even if the replicas lag.
     """
     created_review = await review_service.create_or_update_review(
         db=db, book_id=book_id, user_id=current_user.id, review=review
     )
-    return created_review
\ No newline at end of file
+    replica_router.record_write(current_user.username)
+    return created_review
+
+@router.post("/reviews:batch", response_model=List[review_schema.ReviewBatchResult])
+async def create_or_update_reviews_batch(
+    batch: review_schema.ReviewBatch,
+    db: AsyncSession = Depends(get_db),
+    current_user: user_schema.User = Depends(get_current_user)
+):
+    """
+    Create or update up to REVIEW_BATCH_MAX_ITEMS reviews of different books
+    in one request and one transaction. Returns one result per item, in order;
+    items for unknown books are reported as errors without failing the rest.
+    Requires authentication.
+    """
+    results = await review_service.create_or_update_reviews(db, user_id=current_user.id, items=batch.items)
+    replica_router.record_write(current_user.username)
+    return results
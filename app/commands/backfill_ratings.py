@@ -0,0 +1,26 @@
+"""
+Recomputes the denormalized rating aggregates on every book from the reviews table.
+
+Run once after upgrading an existing database, or whenever the aggregates are
+suspected to have drifted:
+
+    python -m app.commands.backfill_ratings
+"""
+import asyncio
+
+from app.core.database import engine, AsyncSessionLocal
+from app.core.migrations import run_migrations
+from app.repositories import book_repository
+
+async def main() -> None:
+    async with engine.begin() as conn:
+        await run_migrations(conn)
+
+    async with AsyncSessionLocal() as session:
+        updated = await book_repository.backfill_rating_aggregates(session)
+    print(f"--- Backfilled rating aggregates for {updated} books ---")
+
+    await engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
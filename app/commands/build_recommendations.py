@@ -0,0 +1,31 @@
+"""
+Rebuilds the item-item recommendation model from the reviews table and
+publishes it as a new version of the model store at RECOMMENDER_MODEL_PATH.
+Running API workers swap to it within RECOMMENDER_RELOAD_SECONDS.
+
+    python -m app.commands.build_recommendations
+"""
+import asyncio
+import time
+
+from app.core.config import settings
+from app.core.database import engine, AsyncSessionLocal
+from app.recommender.store import write_version
+from app.services import recommendation_service
+
+async def main() -> None:
+    started = time.perf_counter()
+    async with AsyncSessionLocal() as session:
+        model = await recommendation_service.build_model_from_db(session)
+
+    version = write_version(model, settings.RECOMMENDER_MODEL_PATH, keep=settings.RECOMMENDER_KEEP_VERSIONS)
+    elapsed = time.perf_counter() - started
+    print(
+        f"--- Built recommendation model {version} for {model.n_items} books "
+        f"({len(model.indices)} neighbour links) in {elapsed:.1f}s ---"
+    )
+
+    await engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
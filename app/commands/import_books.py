@@ -0,0 +1,74 @@
+"""
+Streams a book catalog file into the books table in batches, upserting on the
+(title, author) natural key. JSON arrays, JSON Lines and CSV files are parsed
+incrementally, so memory use does not grow with the file size.
+
+    python -m app.commands.import_books books.json
+    python -m app.commands.import_books catalog.csv --mode skip --batch-size 50000
+"""
+import argparse
+import asyncio
+import time
+from typing import Optional, Tuple
+
+from app.core.database import engine, Base, AsyncSessionLocal
+from app.core.migrations import run_migrations
+from app.core.record_readers import READERS, detect_format
+from app.repositories import book_repository
+
+def to_row(record: dict) -> Optional[Tuple[str, str, Optional[str]]]:
+    """Normalizes a catalog record into a (title, author, genre) row, or None if it is incomplete."""
+    title = (record.get("title") or "").strip()
+    author = (record.get("author") or "").strip()
+    genre = (record.get("genre") or "").strip() or None
+    if not title or not author:
+        return None
+    return title, author, genre
+
+async def main(path: str, record_format: Optional[str], mode: str, batch_size: int) -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await run_migrations(conn)
+
+    reader = READERS[record_format or detect_format(path)]
+    started = time.perf_counter()
+    imported = skipped = 0
+
+    async def flush(session, batch):
+        nonlocal imported
+        await book_repository.import_books(session, batch, mode=mode)
+        imported += len(batch)
+        rate = imported / max(time.perf_counter() - started, 1e-9)
+        print(f"--- {imported} books written ({skipped} skipped, {rate:,.0f} rows/s) ---")
+
+    async with AsyncSessionLocal() as session:
+        with open(path, "r", newline="", encoding="utf-8") as f:
+            batch = []
+            for record in reader(f):
+                row = to_row(record)
+                if row is None:
+                    skipped += 1
+                    continue
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    await flush(session, batch)
+                    batch = []
+            if batch:
+                await flush(session, batch)
+
+    print(f"--- Imported {imported} books from {path} in {time.perf_counter() - started:.1f}s ---")
+    await engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-import a book catalog file.")
+    parser.add_argument("path")
+    parser.add_argument("--format", dest="record_format", choices=sorted(READERS), help="defaults to the file extension")
+    parser.add_argument(
+        "--mode",
+        choices=["upsert", "skip", "append"],
+        default="upsert",
+        help="upsert: update existing books; skip: keep existing books; append: plain COPY of new books",
+    )
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    args = parser.parse_args()
+    asyncio.run(main(args.path, args.record_format, args.mode, args.batch_size))
@@ -0,0 +1,52 @@
+"""
+Bulk-imports users into the users table from a JSON file shaped like users.json
+(an object keyed by username). Existing usernames are skipped unless
+--overwrite is given.
+
+    python -m app.commands.import_users users.json
+"""
+import argparse
+import asyncio
+import json
+
+from sqlalchemy import text
+
+from app.core.database import engine, Base, AsyncSessionLocal
+from app.repositories import user_repository
+
+USER_FIELDS = ("id", "username", "full_name", "email", "hashed_password", "disabled")
+
+def to_row(user: dict) -> dict:
+    """Picks the user columns out of a users.json record; a missing or null `disabled` means enabled."""
+    row = {field: user[field] for field in USER_FIELDS if field in user}
+    row["disabled"] = bool(user.get("disabled"))
+    return row
+
+async def main(path: str, overwrite: bool, batch_size: int) -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    with open(path, "r") as f:
+        users = [to_row(user) for user in json.load(f).values()]
+
+    async with AsyncSessionLocal() as session:
+        for start in range(0, len(users), batch_size):
+            await user_repository.upsert_users(session, users[start:start + batch_size], overwrite=overwrite)
+
+        if session.bind.dialect.name == "postgresql":
+            # ids came from the file, so move the serial sequence past them
+            await session.execute(text(
+                "SELECT setval(pg_get_serial_sequence('users', 'id'), COALESCE((SELECT MAX(id) FROM users), 1))"
+            ))
+            await session.commit()
+    print(f"--- Imported {len(users)} users from {path} ---")
+
+    await engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-import users from a JSON file.")
+    parser.add_argument("path")
+    parser.add_argument("--overwrite", action="store_true", help="update users that already exist")
+    parser.add_argument("--batch-size", type=int, default=1_000)
+    args = parser.parse_args()
+    asyncio.run(main(args.path, args.overwrite, args.batch_size))
@@ -0,0 +1,248 @@
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Deque, Tuple
+
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core import metrics
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.security import user_id_for_token
+
+LOGIN_PATH = "/api/v1/auth/login"
+# health checks and scrapes must get through an overloaded worker
+EXEMPT_PATHS = frozenset({"/", "/metrics"})
+
+RATE_LIMITED = metrics.Counter(
+    "http_requests_rate_limited_total", "Requests rejected with 429 by the rate limit", ["key"]
+)
+SHED = metrics.Counter(
+    "http_requests_shed_total", "Requests rejected with 503 because the worker was at its in-flight cap", ["reason"]
+)
+QUEUED = metrics.Counter("http_requests_queued_total", "Requests that waited for an in-flight slot")
+RATE_LIMIT_ERRORS = metrics.Counter(
+    "rate_limit_backend_errors_total", "Rate limit checks that failed and let the request through"
+)
+
+class RateLimitBackend:
+    """
+    Storage for token buckets. Every key has a bucket holding up to `burst`
+    tokens that refills at `rate` tokens per second; a request takes one.
+    """
+
+    async def take(self, key: str, rate: float, burst: int, now: float) -> float:
+        """Takes a token from the key's bucket; returns 0 if it had one, else the seconds until it will."""
+        raise NotImplementedError
+
+    async def clear(self) -> None:
+        raise NotImplementedError
+
+class InMemoryRateLimitBackend(RateLimitBackend):
+    """Per-process backend; the least recently seen keys are dropped beyond `maxsize`."""
+
+    def __init__(self, maxsize: int):
+        # key -> (tokens, updated_at); a bucket that has refilled is the same as no bucket
+        self.buckets = TTLCache(maxsize=maxsize)
+
+    async def take(self, key: str, rate: float, burst: int, now: float) -> float:
+        tokens, updated_at = self.buckets.get(key) or (burst, now)
+        tokens = min(burst, tokens + max(0.0, now - updated_at) * rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / rate
+        # TTLCache expires on the wall clock
+        self.buckets.set(key, (tokens, max(now, updated_at)), expires_at=time.time() + (burst - tokens) / rate)
+        return wait
+
+    async def clear(self) -> None:
+        self.buckets.clear()
+
+# the same refill as InMemoryRateLimitBackend.take, run atomically by Redis;
+# the wait is returned as a string because Redis truncates Lua numbers to integers
+_TAKE_SCRIPT = """
+local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'at')
+local tokens = tonumber(bucket[1]) or burst
+local at = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - at) * rate)
+local wait = 0
+if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'at', tostring(math.max(now, at)))
+redis.call('PEXPIRE', KEYS[1], math.ceil((burst - tokens) / rate * 1000) + 1)
+return tostring(wait)
+"""
+
+class RedisRateLimitBackend(RateLimitBackend):
+    """
+    Backend shared by all workers, for a `redis.asyncio.Redis`-compatible client.
+    Each bucket is a hash updated by one Lua script, so concurrent takes from
+    different workers cannot both spend the last token.
+    """
+
+    def __init__(self, client, prefix: str = "rate-limit:"):
+        self.client = client
+        self.prefix = prefix
+
+    async def take(self, key: str, rate: float, burst: int, now: float) -> float:
+        wait = await self.client.eval(_TAKE_SCRIPT, 1, self.prefix + key, rate, burst, now)
+        return float(wait)
+
+    async def clear(self) -> None:
+        async for key in self.client.scan_iter(match=self.prefix + "*"):
+            await self.client.delete(key)
+
+def create_backend() -> RateLimitBackend:
+    """Creates the backend selected by RATE_LIMIT_BACKEND."""
+    if settings.RATE_LIMIT_BACKEND == "redis":
+        try:
+            from redis import asyncio as redis_asyncio
+        except ImportError as exc:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis requires the 'redis' package") from exc
+        return RedisRateLimitBackend(redis_asyncio.from_url(settings.RATE_LIMIT_URL))
+    return InMemoryRateLimitBackend(maxsize=settings.RATE_LIMIT_MAX_KEYS)
+
+class Overloaded(Exception):
+    """Raised when a request can get neither an in-flight slot nor a place in the queue."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+class ConcurrencyLimiter:
+    """
+    Caps the requests a worker serves at once. Beyond `max_in_flight`, up to
+    `max_queue` requests wait in FIFO order for at most `queue_timeout`
+    seconds; a released slot is handed straight to the oldest waiter. A
+    `max_in_flight` of 0 disables the cap.
+    """
+
+    def __init__(self, max_in_flight: int, max_queue: int, queue_timeout: float):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> None:
+        """Takes a slot, waiting in the queue if needed; raises Overloaded if it cannot."""
+        if self.max_in_flight <= 0:
+            return
+        if self.in_flight < self.max_in_flight and not self._waiters:
+            self.in_flight += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            raise Overloaded("queue_full")
+
+        QUEUED.inc()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as exc:
+            if waiter.done() and not waiter.cancelled():
+                # the slot was handed over just as the wait ended
+                self.release()
+            else:
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+            if isinstance(exc, asyncio.TimeoutError):
+                raise Overloaded("queue_timeout") from None
+            raise
+
+    def release(self) -> None:
+        if self.max_in_flight <= 0:
+            return
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+rate_limit_backend: RateLimitBackend = create_backend()
+concurrency_limiter = ConcurrencyLimiter(
+    settings.ADMISSION_MAX_IN_FLIGHT, settings.ADMISSION_QUEUE_SIZE, settings.ADMISSION_QUEUE_TIMEOUT_SECONDS
+)
+QUEUE_DEPTH = metrics.Gauge(
+    "http_requests_waiting", "Requests waiting for an in-flight slot", callback=lambda: concurrency_limiter.waiting
+)
+
+def rate_limit_key(scope: Scope) -> Tuple[str, float, int]:
+    """
+    Returns the bucket key, rate and burst for a request: the user id of a
+    valid bearer token, or the client IP for logins and anonymous requests.
+    """
+    client_ip = scope["client"][0] if scope.get("client") else "unknown"
+    if scope["path"] == LOGIN_PATH:
+        return f"ip:{client_ip}", settings.LOGIN_RATE_LIMIT_PER_SECOND, settings.LOGIN_RATE_LIMIT_BURST
+
+    scheme, _, token = Headers(scope=scope).get("authorization", "").partition(" ")
+    user_id = user_id_for_token(token) if scheme.lower() == "bearer" and token else None
+    key = f"user:{user_id}" if user_id is not None else f"ip:{client_ip}"
+    return key, settings.RATE_LIMIT_PER_SECOND, settings.RATE_LIMIT_BURST
+
+def _retry_after(seconds: float) -> str:
+    return str(max(1, math.ceil(seconds)))
+
+class AdmissionMiddleware:
+    """
+    Sheds load before it reaches the database pool. A request first takes a
+    token from its user's bucket (429 with Retry-After when it is empty), then
+    an in-flight slot of the worker (503 with Retry-After when the cap and its
+    queue are full). Rejections are answered without running the endpoint.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        if settings.RATE_LIMIT_ENABLED:
+            key, rate, burst = rate_limit_key(scope)
+            try:
+                wait = await rate_limit_backend.take(key, rate, burst, time.time())
+            except Exception:
+                # an unreachable shared backend must not take the API down with it
+                RATE_LIMIT_ERRORS.inc()
+                wait = 0.0
+            if wait > 0:
+                RATE_LIMITED.inc(key=key.partition(":")[0])
+                response = JSONResponse(
+                    {"detail": "Too many requests, slow down"},
+                    status_code=429,
+                    headers={"Retry-After": _retry_after(wait)},
+                )
+                await response(scope, receive, send)
+                return
+
+        limiter = concurrency_limiter
+        try:
+            await limiter.acquire()
+        except Overloaded as exc:
+            SHED.inc(reason=exc.reason)
+            response = JSONResponse(
+                {"detail": "Server is busy, try again shortly"},
+                status_code=503,
+                headers={"Retry-After": _retry_after(settings.ADMISSION_RETRY_AFTER_SECONDS)},
+            )
+            await response(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
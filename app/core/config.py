@@ -1,3 +1,4 @@
+from typing import List
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -14,9 +15,104 @@ class Settings(BaseSettings):
             f"{self.POSTGRES_HOST}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
         )
 
+    # connection pool, per worker process
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    # transaction-pooling PgBouncer cannot keep server-side prepared statements
+    DB_PGBOUNCER_MODE: bool = False
+
+    # read replicas for GET endpoints: comma-separated host or host:port, same
+    # credentials and database as the primary; empty means reads use the primary
+    DB_READ_REPLICAS: str = ""
+    DB_REPLICA_EJECT_SECONDS: int = 30
+    # reads go to the primary for this long after the user writes
+    READ_YOUR_WRITES_SECONDS: int = 5
+
+    @property
+    def REPLICA_DATABASE_URLS(self) -> List[str]:
+        urls = []
+        for replica in filter(None, (part.strip() for part in self.DB_READ_REPLICAS.split(","))):
+            host, _, port = replica.partition(":")
+            urls.append(
+                f"postgresql+asyncpg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@"
+                f"{host}:{port or self.POSTGRES_PORT}/{self.POSTGRES_DB}"
+            )
+        return urls
+
+    # send a Server-Timing breakdown to requests carrying an X-Debug-Timing header
+    SERVER_TIMING_ENABLED: bool = False
+
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    TOKEN_CACHE_SIZE: int = 10_000
+    USER_CACHE_SIZE: int = 10_000
+    USER_CACHE_TTL_SECONDS: int = 60
+
+    # password hashing pool, per worker process
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_REHASH_ON_LOGIN: bool = False
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_QUEUE_SIZE: int = 64
+
+    # admission control (app.core.admission)
+    # per-user token buckets: RATE_LIMIT_PER_SECOND requests sustained, bursts of
+    # up to RATE_LIMIT_BURST; logins and unauthenticated requests are keyed on the client IP
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_PER_SECOND: float = 20.0
+    RATE_LIMIT_BURST: int = 40
+    LOGIN_RATE_LIMIT_PER_SECOND: float = 1.0
+    LOGIN_RATE_LIMIT_BURST: int = 10
+    # "memory" (per process) or "redis" (shared by all workers)
+    RATE_LIMIT_BACKEND: str = "memory"
+    RATE_LIMIT_URL: str = "redis://localhost:6379/0"
+    RATE_LIMIT_MAX_KEYS: int = 100_000
+    # requests served at once per worker process (0 for no cap); up to
+    # ADMISSION_QUEUE_SIZE more wait for ADMISSION_QUEUE_TIMEOUT_SECONDS, the rest get 503
+    ADMISSION_MAX_IN_FLIGHT: int = 64
+    ADMISSION_QUEUE_SIZE: int = 128
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = 1.0
+    ADMISSION_RETRY_AFTER_SECONDS: int = 1
+
+    # build list responses straight from column rows and encode them with
+    # app.core.fast_json, skipping response_model validation
+    FAST_JSON_RESPONSES: bool = False
+
+    # response cache for the books list: "memory" (per process) or "redis" (shared)
+    RESPONSE_CACHE_BACKEND: str = "memory"
+    RESPONSE_CACHE_URL: str = "redis://localhost:6379/0"
+    RESPONSE_CACHE_SIZE: int = 1_024
+    BOOKS_CACHE_TTL_SECONDS: int = 30
+
+    # most reviews accepted by one POST /reviews:batch request
+    REVIEW_BATCH_MAX_ITEMS: int = 500
+
+    # in-memory book leaderboards (sort=rating|popularity|trending, /books/top)
+    LEADERBOARD_PRIOR_WEIGHT: float = 10.0
+    LEADERBOARD_TRENDING_HALF_LIFE_SECONDS: int = 86_400
+    # full rebuild from the database, which also picks up other workers' writes
+    LEADERBOARD_REFRESH_SECONDS: int = 600
+
+    # in-memory title/author prefix index for /books/suggest; rebuilt when an
+    # import adds books, and at least every SUGGEST_REBUILD_SECONDS to follow popularity
+    SUGGEST_CHECK_SECONDS: int = 30
+    SUGGEST_REBUILD_SECONDS: int = 3_600
+
+    # item-item recommendation model
+    # versioned model store written by app.commands.build_recommendations;
+    # workers memory-map the current version and swap to new ones as they appear
+    RECOMMENDER_MODEL_PATH: str = "models/recommender"
+    RECOMMENDER_KEEP_VERSIONS: int = 3
+    RECOMMENDER_RELOAD_SECONDS: float = 30.0
+    RECOMMENDER_NEIGHBOURS: int = 50
+    RECOMMENDER_MAX_HISTORY: int = 200
+    RECOMMENDER_UPDATE_QUEUE_SIZE: int = 10_000
+    RECOMMENDER_UPDATE_BATCH_SIZE: int = 500
+    RECOMMENDER_UPDATE_FLUSH_SECONDS: float = 1.0
 
     # as per pydentic convention we use Config class to specify env file
     class Config:
@@ -1,9 +1,96 @@
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+import time
+from typing import Dict
+from uuid import uuid4
+
+from sqlalchemy import exc
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from .config import settings
+from . import metrics
+from .instrumentation import instrument_engine
+
+POOL_CHECKOUT_SECONDS = metrics.Histogram(
+    "db_pool_checkout_seconds", "Time spent waiting for a pooled database connection", ["host"]
+)
+POOL_CHECKOUT_TIMEOUTS = metrics.Counter(
+    "db_pool_checkout_timeouts_total", "Checkouts that gave up after DB_POOL_TIMEOUT", ["host"]
+)
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """The default asyncio pool, timing every checkout including the pre-ping."""
+
+    # the metrics label of the database, set by create_pooled_engine
+    host = ""
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            POOL_CHECKOUT_TIMEOUTS.inc(host=self.host)
+            raise
+        finally:
+            POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - start, host=self.host)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.host = self.host
+        return pool
+
+# metrics label -> engine, for the pool gauges
+pooled_engines: Dict[str, AsyncEngine] = {}
+
+def _host_label(url) -> str:
+    if url.host is None:
+        return url.database or ""
+    return f"{url.host}:{url.port}" if url.port else url.host
+
+def _connect_args() -> dict:
+    if settings.DB_PGBOUNCER_MODE:
+        # PgBouncer may hand every transaction a different server connection, so
+        # nothing can be prepared once and reused; unique names avoid collisions
+        return {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+        }
+    return {
+        "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+    }
+
+def create_pooled_engine(url: str):
+    """Creates an async engine with the pool and statement cache settings and query instrumentation."""
+    engine = create_async_engine(
+        url,
+        poolclass=InstrumentedQueuePool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args=_connect_args(),
+    )
+    instrument_engine(engine)
+    engine.pool.host = _host_label(engine.url)
+    pooled_engines[engine.pool.host] = engine
+    return engine
 
 # this gives us the url for the async database connection
-engine = create_async_engine(settings.ASYNC_DATABASE_URL)
+engine = create_pooled_engine(settings.ASYNC_DATABASE_URL)
+
+def _pool_gauge(name: str, documentation: str, read) -> metrics.Gauge:
+    # reads the live pools of the primary and every replica whenever /metrics is scraped
+    return metrics.Gauge(
+        name, documentation, ["host"],
+        callback=lambda: {(host,): read(pooled.pool) for host, pooled in pooled_engines.items()},
+    )
+
+_pool_gauge("db_pool_size", "Connections the pool keeps open", lambda pool: pool.size())
+_pool_gauge("db_pool_checked_out", "Connections currently in use", lambda pool: pool.checkedout())
+_pool_gauge("db_pool_checked_in", "Idle connections in the pool", lambda pool: pool.checkedin())
+_pool_gauge("db_pool_overflow", "Connections open beyond DB_POOL_SIZE", lambda pool: max(pool.overflow(), 0))
 
 # for sessions to interact with the database
 AsyncSessionLocal = async_sessionmaker(
@@ -11,4 +98,4 @@ AsyncSessionLocal = async_sessionmaker(
 )
 
 # this is the base class for our ORM models
-Base = declarative_base()
\ No newline at end of file
+Base = declarative_base()
@@ -1,4 +1,14 @@
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+from fastapi import HTTPException, Request, status
+from jose import JWTError, jwt
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
 from app.core.database import AsyncSessionLocal
+from app.core.replicas import is_connection_error, replica_router
+from app.recommender.incremental import IncrementalModel
+from app.services import recommendation_service
 
 async def get_db():
     """
@@ -8,4 +18,53 @@ async def get_db():
         try:
             yield session
         finally:
-            await session.close()
\ No newline at end of file
+            await session.close()
+
+def _token_subject(request: Request) -> Optional[str]:
+    # only used to pick a database; the token is still verified by get_current_user
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return jwt.get_unverified_claims(token).get("sub")
+    except JWTError:
+        return None
+
+@asynccontextmanager
+async def read_session(user_key: Optional[str]) -> AsyncIterator[AsyncSession]:
+    """
+    Opens a session for reads. Sessions go to the read replicas in turn, or to
+    the primary when there is no healthy replica or the user has just written
+    something. A replica whose connection fails is ejected for a while.
+    """
+    replica = replica_router.choose(user_key)
+    sessionmaker = AsyncSessionLocal if replica is None else replica.sessionmaker
+    async with sessionmaker() as session:
+        session.info["replica"] = replica is not None
+        try:
+            yield session
+        except Exception as error:
+            if replica is not None and is_connection_error(error):
+                replica_router.eject(replica)
+            raise
+
+async def get_read_db(request: Request):
+    """
+    Dependency that provides an async database session for read-only handlers,
+    on a read replica when possible.
+    """
+    async with read_session(_token_subject(request)) as session:
+        yield session
+
+def get_recommendation_model() -> IncrementalModel:
+    """
+    Dependency that provides the loaded recommendation model.
+    Raises 503 error if no model has been built yet.
+    """
+    model = recommendation_service.get_model()
+    if model is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Recommendation model is not available",
+        )
+    return model
@@ -0,0 +1,16 @@
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # optional; the standard library encoder is the fallback
+    orjson = None
+
+def dumps(value: Any) -> bytes:
+    """
+    Encodes plain JSON data (dicts, lists, strings, numbers, None) to bytes,
+    with orjson when it is installed. Nothing is validated on the way.
+    """
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode()
@@ -0,0 +1,152 @@
+import asyncio
+import functools
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core import metrics
+from app.core.config import settings
+
+REQUEST_SECONDS = metrics.Histogram(
+    "http_request_duration_seconds", "Time to serve a request", ["method", "route", "status"]
+)
+REQUESTS_IN_FLIGHT = metrics.Gauge("http_requests_in_flight", "Requests being served")
+REQUEST_DB_QUERIES = metrics.Histogram(
+    "http_request_db_queries", "Database queries run per request", ["route"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+)
+REQUEST_DB_SECONDS = metrics.Histogram("http_request_db_seconds", "Time spent in database queries per request", ["route"])
+SERIALIZATION_SECONDS = metrics.Histogram(
+    "http_response_serialization_seconds", "Time to validate and encode a response after the endpoint returned", ["route"]
+)
+
+class RequestStats:
+    """What one request spent its time on, filled in while it is served."""
+
+    __slots__ = ("route", "db_queries", "db_seconds", "endpoint_done_at", "serialization_seconds")
+
+    def __init__(self):
+        self.route: Optional[str] = None
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.endpoint_done_at: Optional[float] = None
+        self.serialization_seconds = 0.0
+
+    def server_timing(self, total_seconds: float) -> str:
+        return (
+            f'db;dur={self.db_seconds * 1000:.2f};desc="{self.db_queries} queries", '
+            f"serialize;dur={self.serialization_seconds * 1000:.2f}, "
+            f"total;dur={total_seconds * 1000:.2f}"
+        )
+
+# the stats of the request being served by the current task, if any
+_current_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """Counts and times every query of an engine towards the request that ran it."""
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context.query_started_at = time.perf_counter()
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.db_queries += 1
+            stats.db_seconds += time.perf_counter() - context.query_started_at
+
+def _mark_endpoint_done() -> None:
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.endpoint_done_at = time.perf_counter()
+
+class TimedRoute(APIRoute):
+    """
+    An APIRoute that reports its path template and the time FastAPI spends
+    after the endpoint returns (response_model validation and encoding) to
+    the current request's stats.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        call = self.dependant.call
+        if asyncio.iscoroutinefunction(call):
+            @functools.wraps(call)
+            async def timed_call(*call_args, **call_kwargs):
+                try:
+                    return await call(*call_args, **call_kwargs)
+                finally:
+                    _mark_endpoint_done()
+        else:
+            @functools.wraps(call)
+            def timed_call(*call_args, **call_kwargs):
+                try:
+                    return call(*call_args, **call_kwargs)
+                finally:
+                    _mark_endpoint_done()
+        # the request handler looks the endpoint up on the dependant at call time
+        self.dependant.call = timed_call
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        route = self.path_format
+
+        async def timed_handler(request):
+            stats = _current_stats.get()
+            if stats is not None:
+                # set before the handler runs, so requests that raise are labelled too
+                stats.route = route
+            response = await handler(request)
+            if stats is not None and stats.endpoint_done_at is not None:
+                stats.serialization_seconds = time.perf_counter() - stats.endpoint_done_at
+            return response
+
+        return timed_handler
+
+class MetricsMiddleware:
+    """
+    Records latency, in-flight requests, database queries and serialization
+    time per route. With SERVER_TIMING_ENABLED, requests sending an
+    X-Debug-Timing header get the breakdown back in a Server-Timing header.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current_stats.set(stats)
+        debug = settings.SERVER_TIMING_ENABLED and any(name == b"x-debug-timing" for name, _ in scope["headers"])
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if debug:
+                    MutableHeaders(scope=message).append("Server-Timing", stats.server_timing(time.perf_counter() - started))
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            REQUESTS_IN_FLIGHT.dec()
+            _current_stats.reset(token)
+            route = stats.route or "unmatched"
+            REQUEST_SECONDS.observe(time.perf_counter() - started, method=scope["method"], route=route, status=status_code)
+            REQUEST_DB_QUERIES.observe(stats.db_queries, route=route)
+            REQUEST_DB_SECONDS.observe(stats.db_seconds, route=route)
+            SERIALIZATION_SECONDS.observe(stats.serialization_seconds, route=route)
@@ -0,0 +1,271 @@
+import heapq
+from bisect import bisect_left, bisect_right, insort
+from itertools import islice
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# a book's position on a leaderboard: best score first, ties broken by id
+Key = Tuple[float, int]
+
+class SortedList:
+    """
+    A list kept in sorted order, split into blocks of about `load` items so
+    that inserting or removing an item moves at most one block instead of the
+    whole list.
+    """
+
+    def __init__(self, items: Iterable = (), load: int = 1_000):
+        items = sorted(items)
+        self.load = load
+        self._blocks = [items[i:i + load] for i in range(0, len(items), load)]
+        self._maxes = [block[-1] for block in self._blocks]
+        self._len = len(items)
+
+    def __len__(self) -> int:
+        return self._len
+
+    def add(self, item) -> None:
+        if not self._blocks:
+            self._blocks.append([item])
+            self._maxes.append(item)
+        else:
+            i = min(bisect_left(self._maxes, item), len(self._blocks) - 1)
+            block = self._blocks[i]
+            insort(block, item)
+            self._maxes[i] = block[-1]
+            if len(block) > 2 * self.load:
+                self._blocks[i:i + 1] = [block[:self.load], block[self.load:]]
+                self._maxes[i:i + 1] = [block[self.load - 1], block[-1]]
+        self._len += 1
+
+    def remove(self, item) -> None:
+        i = bisect_left(self._maxes, item)
+        if i == len(self._blocks):
+            raise ValueError(f"{item!r} not in list")
+        block = self._blocks[i]
+        j = bisect_left(block, item)
+        if j == len(block) or block[j] != item:
+            raise ValueError(f"{item!r} not in list")
+        del block[j]
+        if block:
+            self._maxes[i] = block[-1]
+        else:
+            del self._blocks[i]
+            del self._maxes[i]
+        self._len -= 1
+
+    def islice(self, start: int = 0) -> Iterator:
+        """Iterates over the items from position `start` onwards."""
+        for block in self._blocks:
+            if start >= len(block):
+                start -= len(block)
+                continue
+            yield from block[start:]
+            start = 0
+
+    def irange_after(self, item) -> Iterator:
+        """Iterates over the items greater than `item`."""
+        i = bisect_right(self._maxes, item)
+        if i == len(self._blocks):
+            return
+        block = self._blocks[i]
+        yield from block[bisect_right(block, item):]
+        for block in self._blocks[i + 1:]:
+            yield from block
+
+class Leaderboard:
+    """Books ranked by one score, highest first."""
+
+    def __init__(self, scores: Iterable[Tuple[int, float]] = ()):
+        self._keys_by_book: Dict[int, Key] = {book_id: (-score, book_id) for book_id, score in scores}
+        self._keys = SortedList(self._keys_by_book.values())
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def update(self, book_id: int, score: float) -> None:
+        key = (-score, book_id)
+        old = self._keys_by_book.get(book_id)
+        if old == key:
+            return
+        if old is not None:
+            self._keys.remove(old)
+        self._keys.add(key)
+        self._keys_by_book[book_id] = key
+
+    def book_ids(self) -> List[int]:
+        return list(self._keys_by_book)
+
+    def discard(self, book_id: int) -> None:
+        key = self._keys_by_book.pop(book_id, None)
+        if key is not None:
+            self._keys.remove(key)
+
+    def keys(self, after: Optional[Key] = None) -> Iterator[Key]:
+        """Iterates over the keys in rank order, optionally starting below `after`."""
+        return self._keys.islice() if after is None else self._keys.irange_after(after)
+
+    def top(self, limit: int, offset: int = 0) -> List[Tuple[int, float]]:
+        """Returns up to `limit` (book_id, score) pairs, skipping the first `offset`."""
+        return _pairs(self._keys.islice(offset), limit)
+
+    def after(self, score: float, book_id: int, limit: int) -> List[Tuple[int, float]]:
+        """Returns up to `limit` pairs ranked below the given (score, book_id) position."""
+        return _pairs(self.keys((-score, book_id)), limit)
+
+def _pairs(keys: Iterator[Key], limit: int) -> List[Tuple[int, float]]:
+    return [(book_id, -negated) for negated, book_id in islice(keys, limit)]
+
+def merged_ranking(
+    boards: List[Leaderboard],
+    limit: int,
+    offset: int = 0,
+    after: Optional[Tuple[float, int]] = None,
+) -> List[Tuple[int, float]]:
+    """
+    Pages through the union of several leaderboards of the same metric, e.g.
+    of a few genres, either by offset or below an (score, book_id) position.
+    """
+    after_key = None if after is None else (-after[0], after[1])
+    keys = heapq.merge(*(board.keys(after_key) for board in boards))
+    return _pairs(islice(keys, offset, None), limit)
+
+class BookStats:
+    __slots__ = ("genre", "rating_count", "rating_sum", "velocity")
+
+    def __init__(self, genre: Optional[str], rating_count: int, rating_sum: int, velocity: float = 0.0):
+        self.genre = genre
+        self.rating_count = rating_count
+        self.rating_sum = rating_sum
+        self.velocity = velocity
+
+class Leaderboards:
+    """
+    Top-rated, most popular and trending books, overall (genre None) and per
+    genre, maintained from rating writes so that a top-N read never touches
+    the database.
+
+    "rating" is the Bayesian average (C * m + sum) / (C + count): every book
+    starts from `prior_weight` virtual ratings at the catalogue mean `m`, so a
+    single 5-star review does not outrank hundreds of 4.5s. The mean is fixed
+    when the leaderboards are built, otherwise every write would move every
+    score. "popularity" is the number of ratings. "trending" is the number of
+    new reviews, each decaying by half every `half_life` seconds.
+
+    Trending uses forward decay: a review at time t adds 2 ** ((t - epoch) /
+    half_life) to the book's velocity. Decaying every book by the same factor
+    does not change their order, so the stored values never need re-sorting
+    as time passes; they are only scaled down to the actual decayed counts
+    when read, and renormalized once the exponents grow large.
+    """
+
+    METRICS = ("rating", "popularity", "trending")
+    _MAX_EXPONENT = 60.0
+
+    def __init__(self, prior_mean: float, prior_weight: float, half_life: float, epoch: float):
+        self.prior_mean = prior_mean
+        self.prior_weight = prior_weight
+        self.half_life = half_life
+        self.epoch = epoch
+        self.books: Dict[int, BookStats] = {}
+        self.boards: Dict[Tuple[str, Optional[str]], Leaderboard] = {}
+
+    @classmethod
+    def build(
+        cls,
+        books: Iterable[Tuple[int, Optional[str], int, int]],
+        review_times: Iterable[Tuple[int, float]],
+        prior_weight: float,
+        half_life: float,
+        now: float,
+    ) -> "Leaderboards":
+        """
+        Builds the leaderboards from (book_id, genre, rating_count, rating_sum)
+        rows and the (book_id, timestamp) of recent reviews.
+        """
+        stats = {book_id: BookStats(genre, count, total) for book_id, genre, count, total in books}
+        rating_count = sum(book.rating_count for book in stats.values())
+        rating_sum = sum(book.rating_sum for book in stats.values())
+        # with no ratings at all, centre new books on the middle of the 1-5 scale
+        prior_mean = rating_sum / rating_count if rating_count else 3.0
+
+        leaderboards = cls(prior_mean, prior_weight, half_life, epoch=now)
+        leaderboards.books = stats
+        for book_id, at in review_times:
+            book = stats.get(book_id)
+            if book is not None:
+                book.velocity += leaderboards._weight(at)
+
+        members: Dict[Optional[str], List[int]] = defaultdict(list)
+        for book_id, book in stats.items():
+            members[None].append(book_id)
+            if book.genre is not None:
+                members[book.genre].append(book_id)
+        for genre, book_ids in members.items():
+            for metric in cls.METRICS:
+                leaderboards.boards[(metric, genre)] = Leaderboard(
+                    (book_id, leaderboards._score(metric, stats[book_id])) for book_id in book_ids
+                )
+        return leaderboards
+
+    def _weight(self, at: float) -> float:
+        return 2.0 ** ((at - self.epoch) / self.half_life)
+
+    def _score(self, metric: str, book: BookStats) -> float:
+        if metric == "rating":
+            return (self.prior_weight * self.prior_mean + book.rating_sum) / (self.prior_weight + book.rating_count)
+        if metric == "popularity":
+            return float(book.rating_count)
+        return book.velocity
+
+    def _genres(self, book: BookStats) -> Tuple[Optional[str], ...]:
+        return (None,) if book.genre is None else (None, book.genre)
+
+    def _update_boards(self, book_id: int, book: BookStats, metrics: Iterable[str]) -> None:
+        for metric in metrics:
+            score = self._score(metric, book)
+            for genre in self._genres(book):
+                board = self.boards.get((metric, genre))
+                if board is None:
+                    board = self.boards[(metric, genre)] = Leaderboard()
+                board.update(book_id, score)
+
+    def record_rating(self, book_id: int, old_rating: Optional[int], new_rating: int, at: float) -> None:
+        """
+        Applies one rating write. Books created since the build are only
+        ranked overall, as their genre is not known until the next build.
+        """
+        book = self.books.get(book_id)
+        if book is None:
+            book = self.books[book_id] = BookStats(None, 0, 0)
+
+        if old_rating is None:
+            book.rating_count += 1
+            book.rating_sum += new_rating
+            if (at - self.epoch) / self.half_life > self._MAX_EXPONENT:
+                self._renormalize(at)
+            book.velocity += self._weight(at)
+            self._update_boards(book_id, book, self.METRICS)
+        elif old_rating != new_rating:
+            book.rating_sum += new_rating - old_rating
+            self._update_boards(book_id, book, ("rating",))
+
+    def _renormalize(self, now: float) -> None:
+        """Moves the epoch to `now`, rescaling every velocity to match."""
+        factor = self._weight(now) ** -1
+        self.epoch = now
+        for book in self.books.values():
+            book.velocity *= factor
+        for (metric, genre), board in self.boards.items():
+            if metric == "trending":
+                self.boards[(metric, genre)] = Leaderboard(
+                    (book_id, self.books[book_id].velocity) for book_id in board.book_ids()
+                )
+
+    def decay(self, now: float) -> float:
+        """The factor turning stored trending scores into decayed review counts at `now`."""
+        return 2.0 ** ((self.epoch - now) / self.half_life)
+
+    def board(self, metric: str, genre: Optional[str] = None) -> Leaderboard:
+        """The leaderboard for a metric, overall or for one genre; empty for an unknown genre."""
+        return self.boards.get((metric, genre)) or Leaderboard()
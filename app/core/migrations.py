@@ -0,0 +1,159 @@
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+# counts the existing books once, before the triggers below keep genre_counts up to date
+GENRE_COUNTS_BACKFILL = """
+INSERT INTO genre_counts (genre, book_count)
+SELECT genre, count(*) FROM books
+WHERE genre IS NOT NULL AND NOT EXISTS (SELECT 1 FROM genre_counts)
+GROUP BY genre
+"""
+
+def _create_books_trigger_once(name: str, timing: str) -> str:
+    """
+    PostgreSQL has no CREATE TRIGGER IF NOT EXISTS; dropping and recreating
+    the trigger would lock books on every startup of every worker instead.
+    """
+    return f"""
+    DO $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = '{name}' AND tgrelid = to_regclass('books')) THEN
+            CREATE TRIGGER {name} {timing}
+            FOR EACH STATEMENT EXECUTE FUNCTION books_genre_counts();
+        END IF;
+    EXCEPTION WHEN duplicate_object THEN
+        -- another worker starting at the same time created it first
+        NULL;
+    END $$
+    """
+
+# `Base.metadata.create_all` only creates missing tables, so schema changes to
+# existing tables are applied here. Every statement must be idempotent.
+POSTGRES_MIGRATIONS = [
+    "ALTER TABLE books ADD COLUMN IF NOT EXISTS rating_count INTEGER NOT NULL DEFAULT 0",
+    "ALTER TABLE books ADD COLUMN IF NOT EXISTS rating_sum INTEGER NOT NULL DEFAULT 0",
+    "CREATE INDEX IF NOT EXISTS ix_reviews_user_id ON reviews (user_id)",
+    # trigram indexes serve the leading-wildcard ILIKE searches on books
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_books_title_trgm ON books USING gin (title gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_books_author_trgm ON books USING gin (author gin_trgm_ops)",
+    # imports upsert on (title, author); books added before that may repeat a pair,
+    # and merging them would need their reviews moved, so refuse to start instead
+    """
+    DO $$
+    DECLARE
+        duplicates bigint;
+    BEGIN
+        IF to_regclass('uq_books_title_author') IS NULL THEN
+            SELECT count(*) INTO duplicates FROM (
+                SELECT 1 FROM books GROUP BY title, author HAVING count(*) > 1
+            ) AS pairs;
+            IF duplicates > 0 THEN
+                RAISE EXCEPTION 'books has % (title, author) pairs stored more than once; cannot create uq_books_title_author', duplicates
+                    USING HINT = 'List them with SELECT title, author, array_agg(id) FROM books GROUP BY title, author HAVING count(*) > 1; merge or delete the extra rows (moving their reviews) and restart.';
+            END IF;
+        END IF;
+    END $$
+    """,
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_books_title_author ON books (title, author)",
+    "CREATE INDEX IF NOT EXISTS ix_reviews_book_id_id ON reviews (book_id, id)",
+    "CREATE INDEX IF NOT EXISTS ix_reviews_book_id_rating_id ON reviews (book_id, rating DESC, id)",
+    # keep only the newest review per user and book before enforcing uniqueness;
+    # run app.commands.backfill_ratings afterwards if any were deleted. The
+    # self-join only runs until the unique index exists, not on every startup
+    """
+    DO $$
+    BEGIN
+        IF to_regclass('uq_reviews_book_id_user_id') IS NULL THEN
+            DELETE FROM reviews older USING reviews newer
+            WHERE older.book_id = newer.book_id AND older.user_id = newer.user_id AND older.id < newer.id;
+        END IF;
+    END $$
+    """,
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_reviews_book_id_user_id ON reviews (book_id, user_id)",
+    # existing reviews have no known creation time; dating them to 1970 keeps them out of trending
+    "ALTER TABLE reviews ADD COLUMN IF NOT EXISTS created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT 'epoch'",
+    "ALTER TABLE reviews ALTER COLUMN created_at SET DEFAULT now()",
+    "CREATE INDEX IF NOT EXISTS ix_reviews_created_at ON reviews (created_at)",
+    "CREATE INDEX IF NOT EXISTS ix_books_genre_id ON books (genre, id)",
+    "CREATE INDEX IF NOT EXISTS ix_books_author_id ON books (author, id)",
+    # superseded by ix_books_author_id
+    "DROP INDEX IF EXISTS ix_books_author",
+    GENRE_COUNTS_BACKFILL,
+    # one aggregated upsert per statement, so a COPY of a million books does not
+    # queue a million updates on the same few genre rows; updates that leave the
+    # genre alone, like the rating aggregates of every review write, write nothing
+    """
+    CREATE OR REPLACE FUNCTION books_genre_counts() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            INSERT INTO genre_counts (genre, book_count)
+            SELECT genre, count(*) FROM new_books WHERE genre IS NOT NULL GROUP BY genre
+            ON CONFLICT (genre) DO UPDATE SET book_count = genre_counts.book_count + EXCLUDED.book_count;
+        ELSIF TG_OP = 'DELETE' THEN
+            UPDATE genre_counts SET book_count = genre_counts.book_count - removed.book_count
+            FROM (SELECT genre, count(*) AS book_count FROM old_books WHERE genre IS NOT NULL GROUP BY genre) AS removed
+            WHERE genre_counts.genre = removed.genre;
+        ELSE
+            INSERT INTO genre_counts (genre, book_count)
+            SELECT genre, sum(change) FROM (
+                SELECT old_books.genre, -1 AS change FROM old_books JOIN new_books ON new_books.id = old_books.id
+                WHERE old_books.genre IS DISTINCT FROM new_books.genre
+                UNION ALL
+                SELECT new_books.genre, 1 FROM old_books JOIN new_books ON new_books.id = old_books.id
+                WHERE old_books.genre IS DISTINCT FROM new_books.genre
+            ) AS moved
+            WHERE genre IS NOT NULL
+            GROUP BY genre
+            ON CONFLICT (genre) DO UPDATE SET book_count = genre_counts.book_count + EXCLUDED.book_count;
+        END IF;
+        RETURN NULL;
+    END $$
+    """,
+    _create_books_trigger_once(
+        "books_genre_counts_insert",
+        "AFTER INSERT ON books REFERENCING NEW TABLE AS new_books",
+    ),
+    _create_books_trigger_once(
+        "books_genre_counts_update",
+        "AFTER UPDATE ON books REFERENCING OLD TABLE AS old_books NEW TABLE AS new_books",
+    ),
+    _create_books_trigger_once(
+        "books_genre_counts_delete",
+        "AFTER DELETE ON books REFERENCING OLD TABLE AS old_books",
+    ),
+]
+
+# SQLite (tests and benchmarks) only has row-level triggers
+SQLITE_MIGRATIONS = [
+    GENRE_COUNTS_BACKFILL,
+    """
+    CREATE TRIGGER IF NOT EXISTS books_genre_counts_insert AFTER INSERT ON books
+    BEGIN
+        INSERT OR IGNORE INTO genre_counts (genre, book_count) SELECT NEW.genre, 0 WHERE NEW.genre IS NOT NULL;
+        UPDATE genre_counts SET book_count = book_count + 1 WHERE genre = NEW.genre;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS books_genre_counts_update AFTER UPDATE OF genre ON books
+    WHEN OLD.genre IS NOT NEW.genre
+    BEGIN
+        UPDATE genre_counts SET book_count = book_count - 1 WHERE genre = OLD.genre;
+        INSERT OR IGNORE INTO genre_counts (genre, book_count) SELECT NEW.genre, 0 WHERE NEW.genre IS NOT NULL;
+        UPDATE genre_counts SET book_count = book_count + 1 WHERE genre = NEW.genre;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS books_genre_counts_delete AFTER DELETE ON books
+    BEGIN
+        UPDATE genre_counts SET book_count = book_count - 1 WHERE genre = OLD.genre;
+    END
+    """,
+]
+
+MIGRATIONS = {"postgresql": POSTGRES_MIGRATIONS, "sqlite": SQLITE_MIGRATIONS}
+
+async def run_migrations(conn: AsyncConnection) -> None:
+    """Applies the idempotent schema migrations for the connected database."""
+    for statement in MIGRATIONS.get(conn.dialect.name, []):
+        await conn.execute(text(statement))
@@ -0,0 +1,19 @@
+import base64
+import binascii
+import json
+
+def encode_cursor(values: dict) -> str:
+    """Encodes the sort key of the last row on a page into an opaque cursor string."""
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> dict:
+    """Decodes a cursor produced by `encode_cursor`. Raises ValueError if it is malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError) as exc:
+        raise ValueError("Invalid cursor") from exc
+    if not isinstance(values, dict):
+        raise ValueError("Invalid cursor")
+    return values
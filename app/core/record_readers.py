@@ -0,0 +1,75 @@
+import csv
+import json
+from typing import IO, Iterator
+
+CHUNK_SIZE = 1 << 16
+
+def iter_json_array(f: IO[str], chunk_size: int = CHUNK_SIZE) -> Iterator[dict]:
+    """
+    Incrementally parses a JSON array of objects from a text stream, yielding
+    one element at a time. Only the current element and one chunk are kept in
+    memory, however large the file is.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    eof = False
+    opened = False
+
+    while True:
+        # skip whitespace, and the commas between elements
+        while pos < len(buffer) and (buffer[pos].isspace() or (opened and buffer[pos] == ",")):
+            pos += 1
+
+        if pos < len(buffer):
+            if not opened:
+                if buffer[pos] != "[":
+                    raise ValueError("Expected a JSON array")
+                opened = True
+                pos += 1
+                continue
+            if buffer[pos] == "]":
+                return
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                # an element ending exactly at the buffer end may be a truncated scalar
+                if end < len(buffer) or eof:
+                    yield item
+                    pos = end
+                    continue
+        elif eof:
+            raise ValueError("Unexpected end of JSON array")
+
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[pos:] + chunk
+        pos = 0
+
+def iter_json_lines(f: IO[str]) -> Iterator[dict]:
+    """Yields one object per non-blank line of a JSON Lines stream."""
+    for line in f:
+        if line.strip():
+            yield json.loads(line)
+
+def iter_csv(f: IO[str]) -> Iterator[dict]:
+    """Yields one dict per CSV row, keyed by the header row."""
+    yield from csv.DictReader(f)
+
+READERS = {
+    "json": iter_json_array,
+    "jsonl": iter_json_lines,
+    "csv": iter_csv,
+}
+
+def detect_format(path: str) -> str:
+    """Guesses the record format from a file extension."""
+    extension = path.rsplit(".", 1)[-1].lower()
+    if extension == "ndjson":
+        return "jsonl"
+    if extension not in READERS:
+        raise ValueError(f"Cannot detect the format of {path}; use one of {sorted(READERS)}")
+    return extension
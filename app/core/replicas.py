@@ -0,0 +1,77 @@
+import itertools
+import time
+from typing import List, Optional
+
+from sqlalchemy import exc
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.database import create_pooled_engine
+
+class Replica:
+    """A read-only database with its own engine, taken out of rotation while failing."""
+
+    def __init__(self, url: str):
+        self.engine = create_pooled_engine(url)
+        self.sessionmaker = async_sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.ejected_until = 0.0
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.ejected_until
+
+class ReplicaRouter:
+    """
+    Picks a replica per read session: round-robin over the healthy replicas.
+    A replica whose connection fails is ejected for `eject_seconds` and then
+    tried again. Users who wrote within the last `sticky_seconds` are not
+    routed to replicas at all, so they always read their own writes even if
+    the replicas lag behind.
+    """
+
+    def __init__(self, replicas: List[Replica], eject_seconds: float, sticky_seconds: float, sticky_size: int = 10_000):
+        self.replicas = replicas
+        self.eject_seconds = eject_seconds
+        self.sticky_seconds = sticky_seconds
+        self._next = itertools.count()
+        self.recent_writers = TTLCache(maxsize=sticky_size, ttl=sticky_seconds)
+        self.last_write_at = float("-inf")
+
+    def is_recent_writer(self, user_key: Optional[str]) -> bool:
+        return user_key is not None and bool(self.recent_writers.get(user_key))
+
+    def writes_settled(self) -> bool:
+        """Whether this process's last write is old enough for the replicas to have it."""
+        return time.monotonic() - self.last_write_at >= self.sticky_seconds
+
+    def choose(self, user_key: Optional[str] = None) -> Optional[Replica]:
+        """Returns the replica to read from, or None to read from the primary."""
+        if not self.replicas or self.is_recent_writer(user_key):
+            return None
+        start = next(self._next)
+        for offset in range(len(self.replicas)):
+            replica = self.replicas[(start + offset) % len(self.replicas)]
+            if replica.healthy:
+                return replica
+        return None
+
+    def eject(self, replica: Replica) -> None:
+        print(f"!!! WARNING: Read replica {replica.engine.url.host} failed, ejecting it for {self.eject_seconds}s !!!")
+        replica.ejected_until = time.monotonic() + self.eject_seconds
+
+    def record_write(self, user_key: str) -> None:
+        self.recent_writers.set(user_key, True)
+        self.last_write_at = time.monotonic()
+
+def is_connection_error(error: BaseException) -> bool:
+    """Whether an error means the database itself is unreachable, not that a query was wrong."""
+    if isinstance(error, (OSError, exc.OperationalError, exc.InterfaceError)):
+        return True
+    return isinstance(error, exc.DBAPIError) and error.connection_invalidated
+
+replica_router = ReplicaRouter(
+    [Replica(url) for url in settings.REPLICA_DATABASE_URLS],
+    eject_seconds=settings.DB_REPLICA_EJECT_SECONDS,
+    sticky_seconds=settings.READ_YOUR_WRITES_SECONDS,
+)
@@ -0,0 +1,153 @@
+import hashlib
+import json
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+
+class CacheBackend:
+    """
+    Storage for cached responses. Values are opaque bytes; every entry can be
+    tagged, e.g. with the ids of the books it contains, so that all entries
+    sharing a tag can be invalidated together.
+    """
+
+    async def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: bytes, ttl: int, tags: Iterable[str] = ()) -> None:
+        raise NotImplementedError
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> int:
+        """Deletes every entry carrying one of the tags; returns how many were deleted."""
+        raise NotImplementedError
+
+    async def clear(self) -> None:
+        raise NotImplementedError
+
+class InMemoryCacheBackend(CacheBackend):
+    """Per-process LRU backend."""
+
+    def __init__(self, maxsize: int):
+        self.entries = TTLCache(maxsize=maxsize)
+        self.tags: Dict[str, Set[str]] = defaultdict(set)
+        self._tagged = 0
+        self._prune_at = 4 * maxsize
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return self.entries.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: int, tags: Iterable[str] = ()) -> None:
+        self.entries.set(key, value, expires_at=time.time() + ttl)
+        for tag in tags:
+            self.tags[tag].add(key)
+            self._tagged += 1
+
+        # evicted and expired entries leave their keys behind in the tag index
+        if self._tagged > self._prune_at:
+            self._prune_tags()
+
+    def _prune_tags(self) -> None:
+        live = set(self.entries.keys())
+        for tag in list(self.tags):
+            self.tags[tag] &= live
+            if not self.tags[tag]:
+                del self.tags[tag]
+        self._tagged = sum(len(keys) for keys in self.tags.values())
+        self._prune_at = max(4 * self.entries.maxsize, 2 * self._tagged)
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> int:
+        keys = set()
+        for tag in tags:
+            keys |= self.tags.pop(tag, set())
+        for key in keys:
+            self.entries.delete(key)
+        return len(keys)
+
+    async def clear(self) -> None:
+        self.entries.clear()
+        self.tags.clear()
+        self._tagged = 0
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Backend shared by all workers, for a `redis.asyncio.Redis`-compatible client.
+    Tags are stored as sets of cache keys that expire with their entries.
+    Every call is one round trip: multi-command updates go through a MULTI pipeline.
+    """
+
+    def __init__(self, client, prefix: str = "response-cache:"):
+        self.client = client
+        self.prefix = prefix
+
+    def _tag_key(self, tag: str) -> str:
+        return f"{self.prefix}tag:{tag}"
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(self.prefix + key)
+
+    async def set(self, key: str, value: bytes, ttl: int, tags: Iterable[str] = ()) -> None:
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.set(self.prefix + key, value, ex=ttl)
+            for tag in tags:
+                pipe.sadd(self._tag_key(tag), key)
+                pipe.expire(self._tag_key(tag), ttl)
+            await pipe.execute()
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> int:
+        tag_keys = [self._tag_key(tag) for tag in tags]
+        if not tag_keys:
+            return 0
+        async with self.client.pipeline(transaction=False) as pipe:
+            for tag_key in tag_keys:
+                pipe.smembers(tag_key)
+            members = await pipe.execute()
+        keys = {self.prefix + (k.decode() if isinstance(k, bytes) else k) for tag_members in members for k in tag_members}
+        await self.client.delete(*keys, *tag_keys)
+        return len(keys)
+
+    async def clear(self) -> None:
+        """Deletes every entry and tag under this backend's prefix."""
+        batch = []
+        async for key in self.client.scan_iter(match=self.prefix + "*", count=1_000):
+            batch.append(key)
+            if len(batch) >= 1_000:
+                await self.client.delete(*batch)
+                batch = []
+        if batch:
+            await self.client.delete(*batch)
+
+def create_backend() -> CacheBackend:
+    """Creates the backend selected by RESPONSE_CACHE_BACKEND."""
+    if settings.RESPONSE_CACHE_BACKEND == "redis":
+        try:
+            from redis import asyncio as redis_asyncio
+        except ImportError as exc:
+            raise RuntimeError("RESPONSE_CACHE_BACKEND=redis requires the 'redis' package") from exc
+        return RedisCacheBackend(redis_asyncio.from_url(settings.RESPONSE_CACHE_URL))
+    return InMemoryCacheBackend(maxsize=settings.RESPONSE_CACHE_SIZE)
+
+response_cache: CacheBackend = create_backend()
+
+def book_tag(book_id: int) -> str:
+    return f"book:{book_id}"
+
+def etag_for(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Checks an If-None-Match request header against the current ETag."""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+def pack_entry(body: bytes, headers: Dict[str, str]) -> bytes:
+    """Serializes a response body and its headers into one cache value."""
+    return json.dumps(headers).encode() + b"\n" + body
+
+def unpack_entry(entry: bytes) -> Tuple[bytes, Dict[str, str]]:
+    header_line, body = entry.split(b"\n", 1)
+    return body, json.loads(header_line)
@@ -1,19 +1,39 @@
+import time
+from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core import metrics
+from app.core.cache import TTLCache
+from app.core.dependencies import get_db
 from app.schemas import user_schema, token_schema
 from app.services import auth_service
 from app.core.config import settings
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 
-async def get_current_user(token: str = Depends(oauth2_scheme)) -> user_schema.User:
+# validated users keyed by their raw token, each kept until the token's exp
+# (or USER_CACHE_TTL_SECONDS, so changes made by other workers are picked up)
+token_cache = TTLCache(maxsize=settings.TOKEN_CACHE_SIZE)
+metrics.Counter("token_cache_hits_total", "Requests whose token was found in the token cache", callback=lambda: token_cache.hits)
+metrics.Counter("token_cache_misses_total", "Requests whose token had to be decoded", callback=lambda: token_cache.misses)
+
+async def get_current_user(
+    token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)
+) -> user_schema.User:
     """
     Decodes JWT, validates its payload using the TokenData schema, and returns
-    the current user as a Pydantic model. Raises 401 error if token is invalid.
+    the current user as a Pydantic model. Raises 401 error if token is invalid
+    and 403 error if the user is disabled.
+    Validated tokens are cached until they expire, so repeat requests skip the decode.
     """
+    cached_user = token_cache.get(token)
+    if cached_user is not None:
+        return cached_user
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -25,8 +45,36 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> user_schema.U
     except (JWTError, ValidationError):
         raise credentials_exception
     
-    user_dict = auth_service.get_user(username=token_data.sub)
+    user_dict = await auth_service.get_user(db, username=token_data.sub)
     if user_dict is None:
         raise credentials_exception
         
-    return user_schema.User(**user_dict)
\ No newline at end of file
+    user = user_schema.User(**user_dict)
+    if user.disabled:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Inactive user")
+    if "exp" in payload:
+        expires_at = min(payload["exp"], time.time() + settings.USER_CACHE_TTL_SECONDS)
+        token_cache.set(token, user, expires_at=expires_at)
+    return user
+
+def invalidate_user_tokens(username: str) -> int:
+    """
+    Drops every cached token of a user, e.g. after the user is disabled,
+    so their next request is validated again.
+    """
+    return token_cache.delete_where(lambda user: user.username == username)
+
+def user_id_for_token(token: str) -> Optional[int]:
+    """
+    Returns the id of the user a token was issued to, or None if the token is
+    invalid. Checks the signature and expiry only, without a database lookup,
+    so it is cheap enough to key rate limits on before the request is routed.
+    """
+    # get_current_user looks the token up again; peek so that is the lookup counted
+    cached_user = token_cache.peek(token)
+    if cached_user is not None:
+        return cached_user.id
+    try:
+        return int(jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])["id"])
+    except (JWTError, KeyError, TypeError, ValueError):
+        return None
@@ -0,0 +1,140 @@
+import re
+import unicodedata
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+_WORD = re.compile(r"\w+")
+# sorts after every character, so [prefix, prefix + _LAST) covers all words starting with prefix
+_LAST = "\U0010ffff"
+
+def tokenize(text: str) -> List[str]:
+    """Splits text into casefolded words, with accents stripped ("Émile" -> "emile")."""
+    text = text.casefold()
+    if not text.isascii():
+        text = "".join(ch for ch in unicodedata.normalize("NFKD", text) if not unicodedata.combining(ch))
+    return _WORD.findall(text)
+
+class PrefixIndex:
+    """
+    Autocomplete over the words of book titles and authors.
+
+    The distinct words are kept in one sorted list, so the words starting
+    with a prefix are a contiguous range of it found by binary search. The
+    books containing each word are stored CSR-style in one flat array, in
+    word order, so the books of a whole prefix range are one contiguous
+    slice as well. Books are numbered in rank order, by popularity (number of
+    ratings) then id, so ranking a set of postings is just sorting them.
+
+    A short prefix like "t" covers a large part of the catalogue, so scanning
+    its slice would take too long; for every prefix whose slice is longer
+    than `scan_limit`, the best `pool` books are precomputed at build time.
+    Any other prefix is answered by ranking its slice directly, which keeps
+    every lookup to at most `scan_limit` postings.
+
+    For several words, the rarest one picks the candidates and the others
+    must each start a word of the candidate's title or author, so a query
+    whose every word is very common only searches the precomputed pool.
+    """
+
+    def __init__(
+        self,
+        books: Iterable[Tuple[int, str, str, int]],
+        scan_limit: int = 1_024,
+        pool: int = 64,
+    ):
+        self.scan_limit = scan_limit
+        self.pool = pool
+        ids, titles, authors, texts = [], [], [], []
+        postings_by_word: Dict[str, List[int]] = {}
+        ranked = sorted(books, key=lambda book: (-book[3], book[0]))
+        for index, (book_id, title, author, _) in enumerate(ranked):
+            ids.append(book_id)
+            titles.append(title)
+            authors.append(author)
+            words = tokenize(title) + tokenize(author)
+            texts.append(" " + " ".join(words))
+            for word in set(words):
+                postings_by_word.setdefault(word, []).append(index)
+
+        self.ids = np.array(ids, dtype=np.int64)
+        self.titles = titles
+        self.authors = authors
+        # " word word ...": a word w starts a word of the book when " " + w is in it
+        self.texts = texts
+
+        self.words = sorted(postings_by_word)
+        lengths = np.array([len(postings_by_word[word]) for word in self.words], dtype=np.int64)
+        self.offsets = np.zeros(len(self.words) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=self.offsets[1:])
+        self.postings = np.fromiter(
+            (index for word in self.words for index in postings_by_word[word]),
+            dtype=np.int32,
+            count=int(self.offsets[-1]),
+        )
+        self.top: Dict[str, np.ndarray] = {}
+        self._precompute_heavy_prefixes()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @staticmethod
+    def _rank(candidates: np.ndarray, limit: Optional[int]) -> np.ndarray:
+        """Orders book indices best first, dropping duplicates (np.unique is much slower on small arrays)."""
+        candidates = np.sort(candidates)
+        if len(candidates) > 1:
+            candidates = candidates[np.concatenate(([True], candidates[1:] != candidates[:-1]))]
+        return candidates[:limit]
+
+    def _precompute_heavy_prefixes(self) -> None:
+        length = 1
+        # word ranges still longer than scan_limit at the previous prefix length
+        ranges = [(0, len(self.words))]
+        while ranges:
+            heavy = []
+            for start, end in ranges:
+                i = start
+                while i < end:
+                    if len(self.words[i]) < length:
+                        i += 1
+                        continue
+                    prefix = self.words[i][:length]
+                    j = bisect_left(self.words, prefix + _LAST, i, end)
+                    if self.offsets[j] - self.offsets[i] > self.scan_limit:
+                        self.top[prefix] = self._rank(self.postings[self.offsets[i]:self.offsets[j]], self.pool)
+                        heavy.append((i, j))
+                    i = j
+            ranges = heavy
+            length += 1
+
+    def _word_range(self, prefix: str) -> Tuple[int, int]:
+        return bisect_left(self.words, prefix), bisect_left(self.words, prefix + _LAST)
+
+    def suggest(self, query: str, limit: int) -> List[Tuple[int, str, str]]:
+        """Returns up to `limit` (book_id, title, author) whose words start with every word of the query."""
+        words = tokenize(query)
+        if not words:
+            return []
+
+        best = None
+        for word in words:
+            start, end = self._word_range(word)
+            size = int(self.offsets[end] - self.offsets[start])
+            if size == 0:
+                return []
+            if best is None or size < best[0]:
+                best = (size, word, start, end)
+        size, driver, start, end = best
+
+        if size > self.scan_limit:
+            candidates = self.top[driver]
+        else:
+            candidates = self._rank(self.postings[self.offsets[start]:self.offsets[end]], None)
+
+        matches = candidates.tolist()
+        for word in words:
+            if word != driver:
+                word = " " + word
+                matches = [index for index in matches if word in self.texts[index]]
+        return [(int(self.ids[index]), self.titles[index], self.authors[index]) for index in matches[:limit]]
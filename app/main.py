@@ -1,29 +1,42 @@
-import json
+import asyncio
 from fastapi import FastAPI
-from app.core.database import engine, Base, AsyncSessionLocal
-from app.models import orm_models
-from sqlalchemy.future import select
-from app.api.v1 import auth, books, reviews
+from fastapi.responses import PlainTextResponse
+from app.core import metrics
+from app.core.admission import AdmissionMiddleware
+from app.core.instrumentation import MetricsMiddleware, TimedRoute
+from app.core.database import engine, Base
+from app.core.migrations import run_migrations
+from app.models import orm_models  # noqa: F401  (registers the tables on Base.metadata)
+from app.api.v1 import auth, books, recommendations, reviews
+from app.services import leaderboard_service, recommendation_service, suggest_service
 
 # initialize FastAPI app
 app = FastAPI(title="Book Recommendation System API")
+app.router.route_class = TimedRoute
+# the last middleware added runs first, so rejected requests are still measured
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 @app.on_event("startup")
 async def startup():
+    # data is loaded by the import commands (app.commands.*), not at startup
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await run_migrations(conn)
 
-    async with AsyncSessionLocal() as session:
-        async with session.begin():
-            result = await session.execute(select(orm_models.Book))
-            if not result.scalars().first():
-                print("--- Seeding book data into the database ---")
-                with open("books.json", "r") as f:
-                    books_data = json.load(f)
-                    for book_item in books_data:
-                        book = orm_models.Book(**book_item)
-                        session.add(book)
-                await session.commit()
+    app.state.leaderboard_refresher = asyncio.create_task(leaderboard_service.run_refresh_worker())
+    app.state.suggest_refresher = asyncio.create_task(suggest_service.run_refresh_worker())
+    # the model may also appear later; the reloader swaps it in without a restart
+    recommendation_service.load_model_from_disk()
+    app.state.recommendation_updater = asyncio.create_task(recommendation_service.run_update_worker())
+    app.state.recommendation_reloader = asyncio.create_task(recommendation_service.run_reload_worker())
+
+@app.on_event("shutdown")
+async def shutdown():
+    for name in ("leaderboard_refresher", "suggest_refresher", "recommendation_updater", "recommendation_reloader"):
+        task = getattr(app.state, name, None)
+        if task is not None:
+            task.cancel()
 
 # to check if the API is running
 @app.get("/")
@@ -31,6 +44,11 @@ def read_root():
     """A simple endpoint to confirm the API is running."""
     return {"status": "ok", "message": "Welcome to the Book Recommendation System API!"}
 
+@app.get("/metrics", include_in_schema=False)
+def read_metrics():
+    """Process metrics in the Prometheus text format."""
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 # Add the login router
 app.include_router(auth.router, prefix="/api/v1/auth", tags=["Authentication"])
 
@@ -39,3 +57,6 @@ app.include_router(books.router, prefix="/api/v1/books", tags=["Books"])
 
 # Add the reviews router
 app.include_router(reviews.router, prefix="/api/v1", tags=["Reviews"])
+
+# Add the recommendations router
+app.include_router(recommendations.router, prefix="/api/v1/recommendations", tags=["Recommendations"])
@@ -1,21 +1,62 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
-from sqlalchemy.orm import relationship
+from sqlalchemy import Boolean, Column, DateTime, Index, Integer, String, ForeignKey, UniqueConstraint, func
+from sqlalchemy.orm import query_expression, relationship
 from app.core.database import Base
 
 class Book(Base):
     __tablename__ = "books"
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True, nullable=False)
-    author = Column(String, index=True, nullable=False)
+    author = Column(String, nullable=False)
     genre = Column(String, nullable=True)
 
+    # denormalized rating aggregates, kept in sync by review_repository
+    rating_count = Column(Integer, nullable=False, default=0, server_default="0")
+    rating_sum = Column(Integer, nullable=False, default=0, server_default="0")
+
+    # search relevance, only populated by book_repository.get_books when searching
+    relevance = query_expression()
+
     reviews = relationship("Review", back_populates="book", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # natural key used by the catalog import to upsert books
+        UniqueConstraint("title", "author", name="uq_books_title_author"),
+        # serve the genre and author filters of the book list in id order
+        Index("ix_books_genre_id", genre, id),
+        Index("ix_books_author_id", author, id),
+    )
+
+class GenreCount(Base):
+    """Number of books per genre, maintained by triggers on books (see app.core.migrations)."""
+
+    __tablename__ = "genre_counts"
+    genre = Column(String, primary_key=True)
+    book_count = Column(Integer, nullable=False, default=0, server_default="0")
+
 class Review(Base):
     __tablename__ = "reviews"
     id = Column(Integer, primary_key=True, index=True)
     rating = Column(Integer, nullable=False)
     review_text = Column(String, nullable=True)
     book_id = Column(Integer, ForeignKey("books.id", ondelete="CASCADE"), nullable=False)
-    user_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, index=True, nullable=False)
+    # when the review was first written; updates keep it, feeding the trending leaderboard
+    created_at = Column(DateTime(timezone=True), index=True, nullable=False, server_default=func.now())
     book = relationship("Book", back_populates="reviews")
+
+    __table_args__ = (
+        # one review per user and book, the conflict target of review_repository.upsert_review
+        UniqueConstraint("book_id", "user_id", name="uq_reviews_book_id_user_id"),
+        # serve the keyset pages of a book's reviews, in id and in rating order
+        Index("ix_reviews_book_id_id", book_id, id),
+        Index("ix_reviews_book_id_rating_id", book_id, rating.desc(), id),
+    )
+
+class User(Base):
+    __tablename__ = "users"
+    id = Column(Integer, primary_key=True, index=True)
+    username = Column(String, unique=True, index=True, nullable=False)
+    full_name = Column(String, nullable=True)
+    email = Column(String, nullable=True)
+    hashed_password = Column(String, nullable=False)
+    disabled = Column(Boolean, nullable=False, default=False, server_default="false")
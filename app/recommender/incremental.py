@@ -0,0 +1,125 @@
+import math
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.recommender.model import SimilarityModel
+
+class RatingChange:
+    """A single rating write: `old_rating` is None for a new review."""
+
+    __slots__ = ("user_id", "book_id", "old_rating", "new_rating")
+
+    def __init__(self, user_id: int, book_id: int, old_rating: Optional[int], new_rating: int):
+        self.user_id = user_id
+        self.book_id = book_id
+        self.old_rating = old_rating
+        self.new_rating = new_rating
+
+class IncrementalModel:
+    """
+    A SimilarityModel plus the rating changes made since it was built.
+
+    Cosine similarity is dot(i, j) / (|i| * |j|), where dot(i, j) sums
+    r_ui * r_uj over the users who rated both books. Changing one rating r_ui
+    therefore only moves |i| and dot(i, j) for the other books j the same user
+    rated, by amounts that depend on that user's ratings alone. Those deltas
+    are accumulated here, and the neighbour lists of the touched books are
+    recomputed from the base dot products plus the deltas.
+
+    Base dot products are only known for pairs stored in the base top-k lists;
+    any other pair starts from zero, so a pair that climbs into the top-k
+    between rebuilds is slightly under-scored until the next full rebuild.
+    Likewise, only the rows of books the user rated are recomputed, so other
+    rows keep their old similarity to a book whose norm moved until then.
+    """
+
+    def __init__(self, base: SimilarityModel, k: int):
+        self.base = base
+        self.k = k
+        self.norm_sq: Dict[int, float] = {}
+        self.dot_delta: Dict[int, Dict[int, float]] = defaultdict(dict)
+        self.rows: Dict[int, List[Tuple[int, float]]] = {}
+
+    @property
+    def n_items(self) -> int:
+        return self.base.n_items
+
+    def neighbours(self, book_id: int, limit: int) -> List[Tuple[int, float]]:
+        """Returns up to `limit` (book_id, similarity) pairs for a book."""
+        row = self.rows.get(book_id)
+        if row is not None:
+            return row[:limit]
+        return self.base.neighbours(book_id, limit)
+
+    def _norm_sq(self, book_id: int) -> float:
+        if book_id in self.norm_sq:
+            return self.norm_sq[book_id]
+        i = self.base.index_of(book_id)
+        return float(self.base.norms[i]) ** 2 if i >= 0 else 0.0
+
+    def _base_dot(self, a: int, b: int, base_row: Dict[int, float]) -> float:
+        similarity = base_row.get(b)
+        if similarity is None:
+            return 0.0
+        i, j = self.base.index_of(a), self.base.index_of(b)
+        return similarity * float(self.base.norms[i]) * float(self.base.norms[j])
+
+    def _recompute_row(self, book_id: int) -> None:
+        base_row = dict(self.base.neighbours(book_id, self.base.n_items))
+        norm_a = self._norm_sq(book_id)
+        deltas = self.dot_delta.get(book_id, {})
+
+        row = []
+        for other_id in base_row.keys() | deltas.keys():
+            norm_b = self._norm_sq(other_id)
+            if norm_a <= 0 or norm_b <= 0:
+                continue
+            dot = self._base_dot(book_id, other_id, base_row) + deltas.get(other_id, 0.0)
+            similarity = dot / math.sqrt(norm_a * norm_b)
+            if similarity > 0:
+                row.append((other_id, similarity))
+
+        row.sort(key=lambda item: item[1], reverse=True)
+        # swap the whole list in so readers never see a partial row
+        self.rows[book_id] = row[:self.k]
+
+    def apply(self, changes: Iterable[RatingChange], user_ratings: Dict[int, Dict[int, int]]) -> int:
+        """
+        Applies a batch of rating changes.
+
+        `user_ratings` maps every user in the batch to their current
+        {book_id: rating}, i.e. the state after all the changes. Returns the
+        number of neighbour rows that were recomputed.
+        """
+        changes_by_user: Dict[int, List[RatingChange]] = defaultdict(list)
+        for change in changes:
+            changes_by_user[change.user_id].append(change)
+
+        touched = set()
+        for user_id, user_changes in changes_by_user.items():
+            # rewind to the ratings the user had before this batch, then replay
+            ratings = dict(user_ratings.get(user_id, {}))
+            for change in reversed(user_changes):
+                if change.old_rating is None:
+                    ratings.pop(change.book_id, None)
+                else:
+                    ratings[change.book_id] = change.old_rating
+
+            for change in user_changes:
+                old = change.old_rating or 0
+                diff = change.new_rating - old
+                book_id = change.book_id
+                self.norm_sq[book_id] = self._norm_sq(book_id) + change.new_rating ** 2 - old ** 2
+                for other_id, other_rating in ratings.items():
+                    if other_id == book_id:
+                        continue
+                    delta = diff * other_rating
+                    self.dot_delta[book_id][other_id] = self.dot_delta[book_id].get(other_id, 0.0) + delta
+                    self.dot_delta[other_id][book_id] = self.dot_delta[other_id].get(book_id, 0.0) + delta
+                    touched.add(other_id)
+                ratings[book_id] = change.new_rating
+                touched.add(book_id)
+
+        for book_id in touched:
+            self._recompute_row(book_id)
+        return len(touched)
@@ -0,0 +1,110 @@
+from typing import List, Tuple
+
+import numpy as np
+from scipy import sparse
+
+# upper bound on the size of the dense similarity block computed at once
+BLOCK_ELEMENTS = 8_000_000
+
+class SimilarityModel:
+    """
+    Item-item cosine similarity model.
+
+    The top-k neighbours of every book are stored as CSR-style flat arrays:
+    the neighbours of the book at index `i` are `indices[indptr[i]:indptr[i + 1]]`
+    with similarities `scores[indptr[i]:indptr[i + 1]]`, sorted by descending
+    similarity. `item_ids` maps an index to its book id and is sorted, so the
+    reverse lookup is a binary search. `norms` holds the length of every book's
+    rating vector, which incremental updates need to turn similarities back
+    into dot products.
+    """
+
+    def __init__(
+        self,
+        item_ids: np.ndarray,
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        scores: np.ndarray,
+        norms: np.ndarray,
+    ):
+        self.item_ids = item_ids
+        self.indptr = indptr
+        self.indices = indices
+        self.scores = scores
+        self.norms = norms
+
+    @property
+    def n_items(self) -> int:
+        return len(self.item_ids)
+
+    def index_of(self, book_id: int) -> int:
+        """Returns the internal index of a book, or -1 if the book is unknown."""
+        i = int(np.searchsorted(self.item_ids, book_id))
+        if i < self.n_items and self.item_ids[i] == book_id:
+            return i
+        return -1
+
+    def neighbours(self, book_id: int, limit: int) -> List[Tuple[int, float]]:
+        """Returns up to `limit` (book_id, similarity) pairs for a book."""
+        i = self.index_of(book_id)
+        if i < 0:
+            return []
+        start = self.indptr[i]
+        end = min(self.indptr[i + 1], start + limit)
+        return [
+            (int(self.item_ids[j]), float(s))
+            for j, s in zip(self.indices[start:end], self.scores[start:end])
+        ]
+
+def build_model(user_ids: np.ndarray, book_ids: np.ndarray, ratings: np.ndarray, k: int) -> SimilarityModel:
+    """
+    Builds the top-k cosine similarity neighbours of every book from parallel
+    arrays of (user_id, book_id, rating) triples.
+    """
+    item_ids, item_idx = np.unique(book_ids, return_inverse=True)
+    _, user_idx = np.unique(user_ids, return_inverse=True)
+    n_items = len(item_ids)
+    n_users = int(user_idx.max()) + 1 if len(user_idx) else 0
+
+    # user x item rating matrix with every item column scaled to unit length
+    matrix = sparse.csr_matrix(
+        (ratings.astype(np.float32), (user_idx, item_idx)), shape=(n_users, n_items)
+    )
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+    scale = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    normalized = matrix @ sparse.diags(scale).astype(np.float32)
+    items_by_users = normalized.T.tocsr()
+    normalized = normalized.tocsc()
+
+    indptr = np.zeros(n_items + 1, dtype=np.int64)
+    indices_blocks = []
+    scores_blocks = []
+    block = max(1, BLOCK_ELEMENTS // max(n_items, 1))
+
+    for start in range(0, n_items, block):
+        end = min(start + block, n_items)
+        sims = (items_by_users[start:end] @ normalized).toarray()
+        rows = np.arange(end - start)
+        sims[rows, rows + start] = 0.0
+
+        if n_items > k:
+            top = np.argpartition(-sims, k, axis=1)[:, :k]
+        else:
+            top = np.tile(np.arange(n_items), (end - start, 1))
+        top_scores = np.take_along_axis(sims, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        keep = top_scores > 0
+        indptr[start + 1:end + 1] = indptr[start] + np.cumsum(keep.sum(axis=1))
+        indices_blocks.append(top[keep].astype(np.int32))
+        scores_blocks.append(top_scores[keep].astype(np.float32))
+
+    return SimilarityModel(
+        item_ids=item_ids.astype(np.int64),
+        indptr=indptr,
+        indices=np.concatenate(indices_blocks) if indices_blocks else np.zeros(0, dtype=np.int32),
+        scores=np.concatenate(scores_blocks) if scores_blocks else np.zeros(0, dtype=np.float32),
+        norms=norms.astype(np.float32),
+    )
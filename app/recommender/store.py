@@ -0,0 +1,101 @@
+import json
+import os
+import shutil
+import time
+import uuid
+from typing import List, Optional
+
+import numpy as np
+
+from app.recommender.model import SimilarityModel
+
+FORMAT_VERSION = 1
+ARRAYS = ("item_ids", "indptr", "indices", "scores", "norms")
+CURRENT_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+
+# A model store is a directory of immutable versions plus a CURRENT file naming
+# the live one:
+#
+#   models/recommender/
+#       CURRENT                        "20261018T120000.123456-3f2a9c1e"
+#       20261018T120000.123456-3f2a9c1e/
+#           manifest.json              format, counts, dtype and shape of every array
+#           item_ids.npy indptr.npy indices.npy scores.npy norms.npy
+#
+# Every array is a flat .npy file, so workers map them read-only instead of
+# reading them into private memory: all worker processes on a host share one
+# copy in the page cache, and opening a version costs a few page faults rather
+# than a full read. A new version is written under a temporary name, renamed
+# into place and then published by replacing CURRENT, so readers only ever see
+# complete versions.
+
+def write_version(model: SimilarityModel, root: str, keep: int = 3) -> str:
+    """
+    Writes the model as a new version of the store at `root`, makes it the
+    current one and deletes all but the `keep` newest versions. Returns the
+    new version name.
+    """
+    os.makedirs(root, exist_ok=True)
+    now = time.time()
+    # names sort by creation time, which is how old versions are pruned
+    version = f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime(now))}.{int(now % 1 * 1e6):06d}-{uuid.uuid4().hex[:8]}"
+    tmp_dir = os.path.join(root, f".{version}.tmp")
+    os.makedirs(tmp_dir)
+
+    manifest = {"format": FORMAT_VERSION, "version": version, "n_items": model.n_items, "arrays": {}}
+    for name in ARRAYS:
+        array = np.ascontiguousarray(getattr(model, name))
+        np.save(os.path.join(tmp_dir, f"{name}.npy"), array)
+        manifest["arrays"][name] = {"dtype": array.dtype.str, "shape": list(array.shape)}
+    with open(os.path.join(tmp_dir, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    os.rename(tmp_dir, os.path.join(root, version))
+    current_tmp = os.path.join(root, f".{CURRENT_FILE}.{version}.tmp")
+    with open(current_tmp, "w") as f:
+        f.write(version)
+    os.replace(current_tmp, os.path.join(root, CURRENT_FILE))
+
+    # workers still mapping a deleted version keep reading it until they swap
+    for old in list_versions(root)[:-keep]:
+        if old != version:
+            shutil.rmtree(os.path.join(root, old), ignore_errors=True)
+    return version
+
+def list_versions(root: str) -> List[str]:
+    """Lists the complete versions in the store, oldest first."""
+    if not os.path.isdir(root):
+        return []
+    return sorted(
+        name for name in os.listdir(root)
+        if not name.startswith(".") and os.path.isfile(os.path.join(root, name, MANIFEST_FILE))
+    )
+
+def current_version(root: str) -> Optional[str]:
+    """Returns the name of the live version, or None for an empty store."""
+    try:
+        with open(os.path.join(root, CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def open_version(root: str, version: str, mmap: bool = True) -> SimilarityModel:
+    """
+    Opens a version of the store. With `mmap` the arrays are read-only views
+    of the mapped files; otherwise they are read into process memory.
+    """
+    directory = os.path.join(root, version)
+    with open(os.path.join(directory, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    if manifest.get("format") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported recommendation model format {manifest.get('format')!r} in {directory}")
+
+    arrays = {}
+    for name in ARRAYS:
+        array = np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r" if mmap else None)
+        expected = manifest["arrays"][name]
+        if array.dtype.str != expected["dtype"] or list(array.shape) != expected["shape"]:
+            raise ValueError(f"Array {name} of {directory} does not match its manifest")
+        arrays[name] = array
+    return SimilarityModel(**arrays)
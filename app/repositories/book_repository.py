@@ -1,25 +1,282 @@
-from typing import List, Optional
-from sqlalchemy import or_, select
+from typing import AsyncIterator, Iterable, List, Optional, Sequence, Set, Tuple
+from sqlalchemy import Row, and_, case, func, or_, select, update
+from sqlalchemy.dialects import sqlite
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import with_expression
 
-from app.models.orm_models import Book
+from app.models.orm_models import Book, GenreCount, Review
 
-async def get_books(db: AsyncSession, search: Optional[str], skip: int, limit: int) -> List[Book]:
+def _escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def _search_relevance(dialect_name: str, search: str):
     """
-    Retrieves a list of books from the database.
-    Includes search by title/author and pagination.
+    Relevance of a book to the search term, from 0 to 1.
+    PostgreSQL uses pg_trgm similarity; other databases (SQLite in tests)
+    fall back to ranking exact, prefix and substring matches.
     """
-    query = select(Book).options(selectinload(Book.reviews)).order_by(Book.id)
-    
+    if dialect_name == "postgresql":
+        return func.greatest(func.similarity(Book.title, search), func.similarity(Book.author, search))
+
+    prefix = f"{_escape_like(search)}%"
+    return case(
+        (func.lower(Book.title) == search.lower(), 1.0),
+        (func.lower(Book.author) == search.lower(), 0.9),
+        (Book.title.ilike(prefix, escape="\\"), 0.75),
+        (Book.author.ilike(prefix, escape="\\"), 0.5),
+        else_=0.25,
+    )
+
+def _where_books(query, search: Optional[str], genres: Optional[Sequence[str]], author: Optional[str]):
+    """Applies the search and exact-match genre/author filters."""
     if search:
+        pattern = f"%{_escape_like(search)}%"
         query = query.filter(
             or_(
-                Book.title.ilike(f"%{search}%"),
-                Book.author.ilike(f"%{search}%")
+                Book.title.ilike(pattern, escape="\\"),
+                Book.author.ilike(pattern, escape="\\")
             )
         )
-    
-    query = query.offset(skip).limit(limit)
-    result = await db.execute(query)
-    return result.scalars().unique().all()
\ No newline at end of file
+    if genres:
+        query = query.where(Book.genre.in_(list(genres)))
+    if author is not None:
+        query = query.where(Book.author == author)
+    return query
+
+def _filter_books(
+    query,
+    search: Optional[str],
+    relevance,
+    skip: int,
+    limit: int,
+    after_id: Optional[int],
+    after_relevance: Optional[float],
+    genres: Optional[Sequence[str]] = None,
+    author: Optional[str] = None,
+):
+    """
+    Applies the filters, ordering and pagination shared by get_books and
+    get_book_rows. Without a search, the (genre, id) and (author, id) indexes
+    serve filtered pages in id order.
+    """
+    query = _where_books(query, search, genres, author)
+    if search:
+        query = query.order_by(relevance.desc(), Book.id)
+        if after_id is not None and after_relevance is not None:
+            query = query.where(
+                or_(
+                    relevance < after_relevance,
+                    and_(relevance == after_relevance, Book.id > after_id)
+                )
+            )
+    else:
+        query = query.order_by(Book.id)
+        if after_id is not None:
+            query = query.where(Book.id > after_id)
+    return query.offset(skip).limit(limit)
+
+async def get_books(
+    db: AsyncSession,
+    search: Optional[str],
+    skip: int,
+    limit: int,
+    after_id: Optional[int] = None,
+    after_relevance: Optional[float] = None,
+    genres: Optional[Sequence[str]] = None,
+    author: Optional[str] = None,
+) -> List[Book]:
+    """
+    Retrieves a list of books from the database.
+    Includes search by title/author, exact-match filters on any of `genres`
+    and on `author`, and pagination, either by offset (skip)
+    or by keyset (after_id), which seeks straight to the page through the
+    primary key index instead of scanning past all earlier rows.
+
+    Search results are ordered by relevance (exposed as `Book.relevance`)
+    and keyset-paginated on (relevance, id). On PostgreSQL the substring
+    match is served by the pg_trgm GIN indexes created in app.core.migrations.
+    Reviews are not loaded; ratings come from the denormalized aggregate columns.
+    """
+    query = select(Book)
+    relevance = None
+    if search:
+        relevance = _search_relevance(db.bind.dialect.name, search)
+        query = query.options(with_expression(Book.relevance, relevance))
+    result = await db.execute(
+        _filter_books(query, search, relevance, skip, limit, after_id, after_relevance, genres, author)
+    )
+    return result.scalars().all()
+
+# what the book list needs, selected as plain columns
+BOOK_LIST_COLUMNS = (Book.id, Book.title, Book.author, Book.genre, Book.rating_count, Book.rating_sum)
+
+async def get_book_rows(
+    db: AsyncSession,
+    search: Optional[str],
+    skip: int,
+    limit: int,
+    after_id: Optional[int] = None,
+    after_relevance: Optional[float] = None,
+    genres: Optional[Sequence[str]] = None,
+    author: Optional[str] = None,
+) -> List[Row]:
+    """
+    Same as get_books, but returns column rows (with a `relevance` column
+    when searching) instead of ORM objects, skipping the identity map.
+    """
+    columns = list(BOOK_LIST_COLUMNS)
+    relevance = None
+    if search:
+        relevance = _search_relevance(db.bind.dialect.name, search)
+        columns.append(relevance.label("relevance"))
+    result = await db.execute(
+        _filter_books(select(*columns), search, relevance, skip, limit, after_id, after_relevance, genres, author)
+    )
+    return result.all()
+
+async def get_genre_counts(db: AsyncSession) -> List[Row]:
+    """
+    Reads the number of books per genre from the genre_counts table, which
+    triggers on books keep up to date (see app.core.migrations).
+    """
+    result = await db.execute(
+        select(GenreCount.genre, GenreCount.book_count)
+        .where(GenreCount.book_count > 0)
+        .order_by(GenreCount.book_count.desc(), GenreCount.genre)
+    )
+    return result.all()
+
+async def count_books_by_genre(db: AsyncSession, search: Optional[str], author: Optional[str] = None) -> List[Row]:
+    """Counts the books matching a search and/or author per genre, over the matching rows only."""
+    query = _where_books(
+        select(Book.genre, func.count(Book.id).label("book_count")), search, None, author
+    ).where(Book.genre.is_not(None))
+    result = await db.execute(query.group_by(Book.genre).order_by(func.count(Book.id).desc(), Book.genre))
+    return result.all()
+
+async def get_books_by_ids(db: AsyncSession, book_ids: List[int]) -> List[Book]:
+    """Retrieves the given books, in no particular order."""
+    if not book_ids:
+        return []
+    result = await db.execute(select(Book).where(Book.id.in_(book_ids)))
+    return result.scalars().all()
+
+async def get_existing_book_ids(db: AsyncSession, book_ids: Iterable[int]) -> Set[int]:
+    """Returns which of the given book ids exist."""
+    book_ids = list(book_ids)
+    if not book_ids:
+        return set()
+    result = await db.execute(select(Book.id).where(Book.id.in_(book_ids)))
+    return set(result.scalars().all())
+
+async def iter_rating_aggregates(db: AsyncSession, batch_size: int = 100_000) -> AsyncIterator[Sequence[Row]]:
+    """Streams the (id, genre, rating_count, rating_sum) of every book in batches."""
+    query = select(Book.id, Book.genre, Book.rating_count, Book.rating_sum).execution_options(yield_per=batch_size)
+    result = await db.stream(query)
+    async for partition in result.partitions(batch_size):
+        yield partition
+
+async def iter_title_rows(db: AsyncSession, batch_size: int = 100_000) -> AsyncIterator[Sequence[Row]]:
+    """Streams the (id, title, author, rating_count) of every book in batches."""
+    query = select(Book.id, Book.title, Book.author, Book.rating_count).execution_options(yield_per=batch_size)
+    result = await db.stream(query)
+    async for partition in result.partitions(batch_size):
+        yield partition
+
+async def get_max_book_id(db: AsyncSession) -> Optional[int]:
+    """The highest book id, read from the primary key index; imports only ever raise it."""
+    return (await db.execute(select(func.max(Book.id)))).scalar_one()
+
+async def add_rating(db: AsyncSession, book_id: int, rating_delta: int, count_delta: int) -> None:
+    """
+    Adjusts a book's rating aggregates in the current transaction.
+    The caller is responsible for committing.
+    """
+    await db.execute(
+        update(Book)
+        .where(Book.id == book_id)
+        .values(
+            rating_count=Book.rating_count + count_delta,
+            rating_sum=Book.rating_sum + rating_delta,
+        )
+    )
+
+async def recompute_rating_aggregates(db: AsyncSession, book_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Recomputes rating_count/rating_sum from the reviews table, for the given
+    books or for every book. The caller is responsible for committing.
+    """
+    review_count = (
+        select(func.count(Review.id)).where(Review.book_id == Book.id).scalar_subquery()
+    )
+    review_sum = (
+        select(func.coalesce(func.sum(Review.rating), 0))
+        .where(Review.book_id == Book.id)
+        .scalar_subquery()
+    )
+    statement = update(Book).values(rating_count=review_count, rating_sum=review_sum)
+    if book_ids is not None:
+        statement = statement.where(Book.id.in_(list(book_ids)))
+    result = await db.execute(statement)
+    return result.rowcount
+
+async def backfill_rating_aggregates(db: AsyncSession) -> int:
+    """Recomputes rating_count/rating_sum for every book from the reviews table."""
+    updated = await recompute_rating_aggregates(db)
+    await db.commit()
+    return updated
+
+BOOK_IMPORT_COLUMNS = ("title", "author", "genre")
+# SQLite binds at most 999 variables per statement in builds before 3.32;
+# columns with Python-side defaults are bound for every row too
+_SQLITE_IMPORT_ROWS = 999 // len(Book.__table__.columns)
+
+async def _import_books_postgres(db: AsyncSession, rows: Sequence[Tuple], mode: str) -> None:
+    connection = await db.connection()
+    raw = (await connection.get_raw_connection()).driver_connection
+
+    async with raw.transaction():
+        if mode == "append":
+            await raw.copy_records_to_table("books", records=rows, columns=BOOK_IMPORT_COLUMNS)
+            return
+
+        # COPY into a staging table, then merge on the (title, author) natural key
+        await raw.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS books_import "
+            "(title VARCHAR, author VARCHAR, genre VARCHAR) ON COMMIT DELETE ROWS"
+        )
+        await raw.copy_records_to_table("books_import", records=rows, columns=BOOK_IMPORT_COLUMNS)
+        conflict = "DO UPDATE SET genre = EXCLUDED.genre" if mode == "upsert" else "DO NOTHING"
+        await raw.execute(
+            "INSERT INTO books (title, author, genre) "
+            "SELECT DISTINCT ON (title, author) title, author, genre FROM books_import "
+            f"ON CONFLICT (title, author) {conflict}"
+        )
+
+async def import_books(db: AsyncSession, rows: Sequence[Tuple], mode: str = "upsert") -> None:
+    """
+    Writes a batch of (title, author, genre) rows in one transaction.
+
+    `mode` is "upsert" (update the genre of books that already exist),
+    "skip" (keep existing books) or "append" (plain insert of rows known to be new).
+    PostgreSQL streams the batch with COPY; other databases use multi-row
+    inserts of up to _SQLITE_IMPORT_ROWS rows each.
+    """
+    if not rows:
+        return
+
+    if db.bind.dialect.name == "postgresql":
+        await _import_books_postgres(db, rows, mode)
+        return
+
+    for start in range(0, len(rows), _SQLITE_IMPORT_ROWS):
+        chunk = rows[start:start + _SQLITE_IMPORT_ROWS]
+        statement = sqlite.insert(Book).values([dict(zip(BOOK_IMPORT_COLUMNS, row)) for row in chunk])
+        if mode == "upsert":
+            statement = statement.on_conflict_do_update(
+                index_elements=[Book.title, Book.author], set_={"genre": statement.excluded.genre}
+            )
+        elif mode == "skip":
+            statement = statement.on_conflict_do_nothing(index_elements=[Book.title, Book.author])
+        await db.execute(statement)
+    await db.commit()
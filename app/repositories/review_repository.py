@@ -1,33 +1,237 @@
-from typing import List, Optional
-from sqlalchemy import select
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import Row, and_, or_, select, text, update
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.models.orm_models import Review
+from app.models.orm_models import Book, Review
+from app.repositories import book_repository
 from app.schemas.review_schema import ReviewCreate
 
-async def get_reviews_by_book_id(db: AsyncSession, book_id: int) -> List[Review]:
-    """Fetches all reviews for a specific book from the database."""
-    query = select(Review).where(Review.book_id == book_id)
-    result = await db.execute(query)
-    return result.scalars().all()
+_DEADLOCK_RETRIES = 3
+
+# plain column rows skip the ORM identity map and attribute instrumentation
+REVIEW_COLUMNS = (Review.id, Review.book_id, Review.user_id, Review.rating, Review.review_text)
+
+def _book_reviews_query(book_id: int, sort: str, after_id: Optional[int], after_rating: Optional[int]):
+    """
+    Reviews of a book in `sort` order ("id", or "rating": highest first, then
+    by id), starting after the given review. Both orders seek through an index.
+    """
+    query = select(*REVIEW_COLUMNS).where(Review.book_id == book_id)
+    if sort == "rating":
+        if after_id is not None and after_rating is not None:
+            # the redundant bound lets the index seek past the higher ratings
+            # instead of scanning them and filtering with the OR
+            query = query.where(
+                Review.rating <= after_rating,
+                or_(
+                    Review.rating < after_rating,
+                    and_(Review.rating == after_rating, Review.id > after_id)
+                )
+            )
+        return query.order_by(Review.rating.desc(), Review.id)
+
+    if after_id is not None:
+        query = query.where(Review.id > after_id)
+    return query.order_by(Review.id)
+
+async def get_reviews_page(
+    db: AsyncSession,
+    book_id: int,
+    limit: int,
+    sort: str = "id",
+    after_id: Optional[int] = None,
+    after_rating: Optional[int] = None,
+) -> List[Row]:
+    """Fetches one keyset page of a book's reviews as lean column rows."""
+    result = await db.execute(_book_reviews_query(book_id, sort, after_id, after_rating).limit(limit))
+    return result.all()
 
-async def get_review_by_book_and_user(db: AsyncSession, book_id: int, user_id: int) -> Optional[Review]:
-    """Fetches a single review for a book by a specific user."""
-    query = select(Review).where(Review.book_id == book_id, Review.user_id == user_id)
+async def iter_reviews(
+    db: AsyncSession,
+    book_id: int,
+    sort: str = "id",
+    after_id: Optional[int] = None,
+    after_rating: Optional[int] = None,
+    batch_size: int = 1_000,
+) -> AsyncIterator[Sequence[Row]]:
+    """Streams a book's reviews in batches of column rows, using a server-side cursor."""
+    query = _book_reviews_query(book_id, sort, after_id, after_rating).execution_options(yield_per=batch_size)
+    result = await db.stream(query)
+    async for partition in result.partitions(batch_size):
+        yield partition
+
+async def get_ratings_by_user(db: AsyncSession, user_id: int, limit: Optional[int]) -> List[Tuple[int, int]]:
+    """Fetches the (book_id, rating) pairs of a user's most recent reviews, or all of them without a limit."""
+    query = (
+        select(Review.book_id, Review.rating)
+        .where(Review.user_id == user_id)
+        .order_by(Review.id.desc())
+        .limit(limit)
+    )
     result = await db.execute(query)
-    return result.scalars().first()
+    return [tuple(row) for row in result.all()]
 
-async def create_review(db: AsyncSession, book_id: int, user_id: int, review: ReviewCreate) -> Review:
-    """Creates a new review record in the database."""
-    db_review = Review(**review.model_dump(), book_id=book_id, user_id=user_id)
-    db.add(db_review)
-    await db.commit()
-    await db.refresh(db_review)
-    return db_review
+async def iter_all_ratings(db: AsyncSession, batch_size: int = 100_000) -> AsyncIterator[Sequence[Tuple[int, int, int]]]:
+    """Streams every (user_id, book_id, rating) triple in batches, using a server-side cursor."""
+    query = select(Review.user_id, Review.book_id, Review.rating).execution_options(yield_per=batch_size)
+    result = await db.stream(query)
+    async for partition in result.partitions(batch_size):
+        yield partition
+
+async def iter_review_times(db: AsyncSession, since: datetime, batch_size: int = 100_000) -> AsyncIterator[Sequence[Tuple[int, datetime]]]:
+    """Streams the (book_id, created_at) of every review written since `since`, in batches."""
+    query = (
+        select(Review.book_id, Review.created_at)
+        .where(Review.created_at >= since)
+        .execution_options(yield_per=batch_size)
+    )
+    result = await db.stream(query)
+    async for partition in result.partitions(batch_size):
+        yield partition
+
+# One round trip on PostgreSQL for any number of reviews of one user. `old`
+# locks the user's existing reviews of those books, so a concurrent update of
+# one of them waits and then reads the committed rating; selecting from it
+# makes sure it runs before the insert. Each book's aggregates are updated
+# once, by the summed changes.
+_UPSERT_REVIEWS_POSTGRES = text("""
+WITH input AS (
+    SELECT * FROM unnest(
+        CAST(:book_ids AS INTEGER[]), CAST(:ratings AS INTEGER[]), CAST(:review_texts AS VARCHAR[])
+    ) AS input (book_id, rating, review_text)
+),
+old AS (
+    SELECT reviews.book_id, reviews.rating
+    FROM reviews JOIN input ON input.book_id = reviews.book_id
+    WHERE reviews.user_id = :user_id
+    FOR UPDATE OF reviews
+),
+upserted AS (
+    INSERT INTO reviews (book_id, user_id, rating, review_text)
+    SELECT input.book_id, CAST(:user_id AS INTEGER), input.rating, input.review_text
+    FROM input LEFT JOIN (SELECT count(*) FROM old) AS locked ON true
+    ORDER BY input.book_id
+    ON CONFLICT (book_id, user_id) DO UPDATE
+    SET rating = EXCLUDED.rating, review_text = EXCLUDED.review_text
+    RETURNING id, book_id, user_id, rating, review_text, (xmax = 0) AS inserted
+),
+changes AS (
+    SELECT upserted.book_id,
+           count(*) FILTER (WHERE upserted.inserted) AS count_delta,
+           sum(upserted.rating - COALESCE(old.rating, 0)) AS rating_delta
+    FROM upserted LEFT JOIN old ON old.book_id = upserted.book_id
+    GROUP BY upserted.book_id
+),
+aggregates AS (
+    UPDATE books
+    SET rating_count = books.rating_count + changes.count_delta,
+        rating_sum = books.rating_sum + changes.rating_delta
+    FROM changes
+    WHERE books.id = changes.book_id
+    RETURNING books.id, books.rating_sum
+)
+SELECT upserted.*, old.rating AS old_rating, aggregates.rating_sum
+FROM upserted
+LEFT JOIN old ON old.book_id = upserted.book_id
+LEFT JOIN aggregates ON aggregates.id = upserted.book_id
+""")
 
-async def update_review(db: AsyncSession, db_review: Review, review_update: ReviewCreate) -> Review:
-    """Updates an existing review record in the database."""
-    db_review.rating = review_update.rating
-    db_review.review_text = review_update.review_text
+UpsertResult = Tuple[dict, Optional[int]]
+
+def _review_dict(row) -> dict:
+    return {column: getattr(row, column) for column in ("id", "book_id", "user_id", "rating", "review_text")}
+
+def _is_deadlock(error: DBAPIError) -> bool:
+    return getattr(error.orig, "sqlstate", None) == "40P01"
+
+async def _upsert_reviews_postgres(db: AsyncSession, user_id: int, rows: List[dict]) -> Dict[int, UpsertResult]:
+    params = {
+        "user_id": user_id,
+        "book_ids": [row["book_id"] for row in rows],
+        "ratings": [row["rating"] for row in rows],
+        "review_texts": [row["review_text"] for row in rows],
+    }
+    for attempt in range(_DEADLOCK_RETRIES):
+        try:
+            result = (await db.execute(_UPSERT_REVIEWS_POSTGRES, params)).all()
+            break
+        except DBAPIError as error:
+            # batches touching the same books can lock their rows in different orders
+            if not _is_deadlock(error) or attempt == _DEADLOCK_RETRIES - 1:
+                raise
+            await db.rollback()
+
+    results = {row.book_id: (_review_dict(row), row.old_rating) for row in result}
+    # a user's first review of a book that was inserted concurrently, after our
+    # snapshot, was replaced without subtracting its rating from the aggregates:
+    # recompute them and recover that rating from the difference
+    raced = {row.book_id: row.rating_sum for row in result if row.old_rating is None and not row.inserted}
+    if raced:
+        await book_repository.recompute_rating_aggregates(db, raced)
+        sums = await db.execute(select(Book.id, Book.rating_sum).where(Book.id.in_(list(raced))))
+        for book_id, rating_sum in sums:
+            results[book_id] = (results[book_id][0], raced[book_id] - rating_sum)
+    return results
+
+async def _upsert_reviews_sqlite(db: AsyncSession, user_id: int, rows: List[dict]) -> Dict[int, UpsertResult]:
+    # the insert attempt comes first so that this transaction already holds
+    # SQLite's write lock when it reads the old ratings
+    inserted = (await db.execute(
+        sqlite.insert(Review)
+        .values(rows)
+        .on_conflict_do_nothing(index_elements=[Review.book_id, Review.user_id])
+        .returning(*REVIEW_COLUMNS)
+    )).all()
+    results = {row.book_id: (_review_dict(row), None) for row in inserted}
+
+    existing = [row for row in rows if row["book_id"] not in results]
+    if existing:
+        old_ratings = dict((await db.execute(
+            select(Review.book_id, Review.rating)
+            .where(Review.user_id == user_id, Review.book_id.in_([row["book_id"] for row in existing]))
+        )).all())
+        for row in existing:
+            updated = (await db.execute(
+                update(Review)
+                .where(Review.book_id == row["book_id"], Review.user_id == user_id)
+                .values(rating=row["rating"], review_text=row["review_text"])
+                .returning(*REVIEW_COLUMNS)
+            )).one()
+            results[row["book_id"]] = (_review_dict(updated), old_ratings[row["book_id"]])
+
+    for book_id, (saved, old_rating) in results.items():
+        if saved["rating"] != old_rating:
+            await book_repository.add_rating(
+                db, book_id, rating_delta=saved["rating"] - (old_rating or 0), count_delta=int(old_rating is None)
+            )
+    return results
+
+async def upsert_reviews(db: AsyncSession, user_id: int, reviews: Sequence[Tuple[int, ReviewCreate]]) -> List[UpsertResult]:
+    """
+    Creates or replaces a user's reviews of several books, given as
+    (book_id, review) pairs with distinct book ids, and applies the rating
+    changes to each book's aggregates, in one committed transaction. Returns
+    the saved review and the previous rating (None for a new review) of each
+    pair, in order.
+    """
+    rows = sorted(
+        ({**review.model_dump(), "book_id": book_id, "user_id": user_id} for book_id, review in reviews),
+        key=lambda row: row["book_id"],
+    )
+    if db.bind.dialect.name == "postgresql":
+        results = await _upsert_reviews_postgres(db, user_id, rows)
+    else:
+        results = await _upsert_reviews_sqlite(db, user_id, rows)
     await db.commit()
-    await db.refresh(db_review)
-    return db_review
\ No newline at end of file
+    return [results[book_id] for book_id, _ in reviews]
+
+async def upsert_review(db: AsyncSession, book_id: int, user_id: int, review: ReviewCreate) -> UpsertResult:
+    """
+    Creates the user's review of a book or replaces it, and applies the
+    rating change to the book's aggregates, in one committed transaction.
+    Returns the saved review and the previous rating (None for a new review).
+    """
+    (result,) = await upsert_reviews(db, user_id, [(book_id, review)])
+    return result
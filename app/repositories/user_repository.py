@@ -0,0 +1,50 @@
+from typing import List, Optional
+from sqlalchemy import select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.orm_models import User
+
+async def get_user_by_username(db: AsyncSession, username: str) -> Optional[User]:
+    """Fetches a single user by username, using the unique username index."""
+    query = select(User).where(User.username == username)
+    result = await db.execute(query)
+    return result.scalars().first()
+
+async def update_password_hash(db: AsyncSession, username: str, hashed_password: str) -> None:
+    """Replaces a user's stored password hash."""
+    await db.execute(
+        update(User).where(User.username == username).values(hashed_password=hashed_password)
+    )
+    await db.commit()
+
+async def set_disabled(db: AsyncSession, username: str, disabled: bool) -> bool:
+    """Enables or disables a user. Returns False if the user does not exist."""
+    result = await db.execute(
+        update(User).where(User.username == username).values(disabled=disabled)
+    )
+    await db.commit()
+    return result.rowcount > 0
+
+async def upsert_users(db: AsyncSession, users: List[dict], overwrite: bool = False) -> None:
+    """
+    Inserts a batch of users with one multi-row statement. Existing usernames
+    are left untouched unless `overwrite` is set.
+    """
+    if not users:
+        return
+
+    dialect = postgresql if db.bind.dialect.name == "postgresql" else sqlite
+    statement = dialect.insert(User).values(users)
+    if overwrite:
+        statement = statement.on_conflict_do_update(
+            index_elements=[User.username],
+            set_={
+                column: statement.excluded[column]
+                for column in ("full_name", "email", "hashed_password", "disabled")
+            },
+        )
+    else:
+        statement = statement.on_conflict_do_nothing(index_elements=[User.username])
+    await db.execute(statement)
+    await db.commit()
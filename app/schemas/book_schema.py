@@ -1,11 +1,27 @@
+from typing import List, Optional
 from pydantic import BaseModel
 
 class Book(BaseModel):
     id: int
     title: str
     author: str
-    genre: str
+    genre: Optional[str]
     average_rating: float
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class ScoredBook(Book):
+    score: float
+
+class BookSuggestion(BaseModel):
+    id: int
+    title: str
+    author: str
+
+class GenreFacet(BaseModel):
+    genre: str
+    count: int
+
+class BookFacets(BaseModel):
+    genres: List[GenreFacet]
@@ -1,5 +1,7 @@
-from pydantic import BaseModel, constr, conint
-from typing import Optional
+from pydantic import BaseModel, Field, constr, conint
+from typing import List, Literal, Optional
+
+from app.core.config import settings
 
 class ReviewCreate(BaseModel):
     rating: conint(ge=1, le=5)
@@ -13,4 +15,16 @@ class Review(BaseModel):
     review_text: Optional[str] = None
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class ReviewBatchItem(ReviewCreate):
+    book_id: int
+
+class ReviewBatch(BaseModel):
+    items: List[ReviewBatchItem] = Field(min_length=1, max_length=settings.REVIEW_BATCH_MAX_ITEMS)
+
+class ReviewBatchResult(BaseModel):
+    """Outcome of one batch item, in the order the items were sent."""
+    status: Literal["created", "updated", "error"]
+    review: Optional[Review] = None
+    detail: Optional[str] = None
@@ -1,40 +1,121 @@
-import json
-from pathlib import Path
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Optional, Dict
+from typing import Optional
 from jose import jwt
 from passlib.context import CryptContext
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core import metrics
+from app.core.cache import TTLCache
 from app.core.config import settings
+from app.models.orm_models import User
+from app.repositories import user_repository
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+if settings.PASSWORD_REHASH_ON_LOGIN:
+    # hashes at any other cost are flagged by verify_and_update and rehashed
+    pwd_context = CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+        bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+        bcrypt__max_rounds=settings.BCRYPT_ROUNDS,
+    )
+else:
+    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__default_rounds=settings.BCRYPT_ROUNDS)
 
-# dummy in-memory user "database"
-def load_users_from_json() -> Dict[str, dict]:
-    """
-    Loads the dummy user database from a JSON file located in the project root.
-    """
-    project_root = Path(__file__).resolve().parent.parent.parent
-    user_file = project_root / "users.json"
-    
-    if not user_file.exists():
-        print(f"!!! WARNING: Could not find users.json at {user_file}! Using empty user DB.")
-        return {}
-    
-    print(f"--- Loading dummy users from {user_file} ---")
-    with open(user_file, "r") as f:
-        return json.load(f)
+# bcrypt releases the GIL, so a small thread pool keeps hashing off the event
+# loop; the semaphore bounds the number of logins running or queued for it
+_hash_executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+_hash_slots = asyncio.Semaphore(settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_QUEUE_SIZE)
+
+# read-through cache of recently seen users, keyed by username
+user_cache = TTLCache(maxsize=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL_SECONDS)
+metrics.Counter("user_cache_hits_total", "User lookups served from the user cache", callback=lambda: user_cache.hits)
+metrics.Counter("user_cache_misses_total", "User lookups that queried the users table", callback=lambda: user_cache.misses)
 
-dummy_users_db = load_users_from_json()
+class PasswordHashingBusy(Exception):
+    """Raised when too many password checks are already running or queued."""
 
 # service functions
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verifies a plain-text password against a hashed one."""
     return pwd_context.verify(plain_password, hashed_password)
 
-def get_user(username: str) -> Optional[dict]:
-    """Retrieves a user from the in-memory dummy database."""
-    return dummy_users_db.get(username)
+async def verify_password_in_pool(plain_password: str, hashed_password: str) -> tuple:
+    """
+    Verifies a password on the hashing thread pool without blocking the event loop.
+    Returns (is_valid, new_hash), where new_hash is set when the stored hash
+    should be upgraded to the configured cost.
+    Raises PasswordHashingBusy instead of queueing beyond PASSWORD_HASH_QUEUE_SIZE.
+    """
+    if _hash_slots.locked():
+        raise PasswordHashingBusy()
+    async with _hash_slots:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            _hash_executor, pwd_context.verify_and_update, plain_password, hashed_password
+        )
+
+def _to_user_dict(user: User) -> dict:
+    return {
+        "id": user.id,
+        "username": user.username,
+        "full_name": user.full_name,
+        "email": user.email,
+        "hashed_password": user.hashed_password,
+        "disabled": user.disabled,
+    }
+
+async def get_user(db: AsyncSession, username: str) -> Optional[dict]:
+    """
+    Retrieves a user from the users table, through a small read-through cache
+    so that hot users do not cost a query on every request.
+    """
+    user = user_cache.get(username)
+    if user is not None:
+        return user
+
+    db_user = await user_repository.get_user_by_username(db, username)
+    if db_user is None:
+        return None
+
+    user = _to_user_dict(db_user)
+    user_cache.set(username, user)
+    return user
+
+async def authenticate_user(db: AsyncSession, username: str, password: str) -> Optional[dict]:
+    """
+    Returns the user if the password is correct and the user is not disabled,
+    otherwise None.
+    Rehashes the stored password when PASSWORD_REHASH_ON_LOGIN is enabled
+    and its bcrypt cost differs from BCRYPT_ROUNDS.
+    """
+    user = await get_user(db, username)
+    if not user:
+        return None
+
+    is_valid, new_hash = await verify_password_in_pool(password, user["hashed_password"])
+    if not is_valid or user.get("disabled"):
+        return None
+    if new_hash and settings.PASSWORD_REHASH_ON_LOGIN:
+        await user_repository.update_password_hash(db, username, new_hash)
+        user = {**user, "hashed_password": new_hash}
+        user_cache.set(username, user)
+    return user
+
+async def set_user_disabled(db: AsyncSession, username: str, disabled: bool) -> bool:
+    """
+    Enables or disables a user and drops them and their validated tokens from
+    this process's caches. Other workers pick the change up within USER_CACHE_TTL_SECONDS.
+    """
+    # app.core.security imports this module
+    from app.core.security import invalidate_user_tokens
+
+    updated = await user_repository.set_disabled(db, username, disabled)
+    user_cache.delete(username)
+    invalidate_user_tokens(username)
+    return updated
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Creates a JWT access token."""
@@ -1,26 +1,59 @@
-from typing import List, Optional
+from typing import List, Optional, Sequence, Union
+from sqlalchemy import Row
 from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.orm_models import Book
 from app.repositories import book_repository
 
-async def get_all_books(db: AsyncSession, search: Optional[str], skip: int, limit: int) -> List[dict]:
+def to_book_dict(book: Union[Book, Row]) -> dict:
     """
-    Service to get all books and dynamically calculate the average rating.
+    Converts a book into the API representation, deriving the average rating
+    from the denormalized rating aggregates stored on the book.
     """
-    books = await book_repository.get_books(db, search, skip, limit)
-    
-    book_list = []
-    for book in books:
-        if book.reviews:
-            avg_rating = sum(r.rating for r in book.reviews) / len(book.reviews)
-        else:
-            avg_rating = 0.0
-        
-        book_list.append({
-            "id": book.id,
-            "title": book.title,
-            "author": book.author,
-            "genre": book.genre,
-            "average_rating": round(avg_rating, 1)
-        })
-        
-    return book_list
\ No newline at end of file
+    if book.rating_count:
+        avg_rating = book.rating_sum / book.rating_count
+    else:
+        avg_rating = 0.0
+
+    return {
+        "id": book.id,
+        "title": book.title,
+        "author": book.author,
+        "genre": book.genre,
+        "average_rating": round(avg_rating, 1)
+    }
+
+async def get_all_books(
+    db: AsyncSession,
+    search: Optional[str],
+    skip: int,
+    limit: int,
+    after_id: Optional[int] = None,
+    after_relevance: Optional[float] = None,
+    lean: bool = False,
+    genres: Optional[Sequence[str]] = None,
+    author: Optional[str] = None,
+) -> List[dict]:
+    """
+    Service to get all books with their average rating, optionally only
+    those of any of `genres` and/or by exactly `author`.
+    Search results, ordered by relevance, also carry their relevance score.
+    With `lean`, the books are read as column rows rather than ORM objects.
+    """
+    get_books = book_repository.get_book_rows if lean else book_repository.get_books
+    books = await get_books(
+        db, search, skip, limit, after_id=after_id, after_relevance=after_relevance, genres=genres, author=author
+    )
+    if search:
+        return [{**to_book_dict(book), "relevance": book.relevance} for book in books]
+    return [to_book_dict(book) for book in books]
+
+async def get_genre_facets(db: AsyncSession, search: Optional[str], author: Optional[str] = None) -> dict:
+    """
+    Service to count the books per genre, for the whole catalogue from the
+    genre_counts table, or for a search and/or author over the matching books.
+    """
+    if search or author is not None:
+        counts = await book_repository.count_books_by_genre(db, search, author)
+    else:
+        counts = await book_repository.get_genre_counts(db)
+    return {"genres": [{"genre": genre, "count": count} for genre, count in counts]}
@@ -0,0 +1,131 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import List, Optional, Sequence, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.leaderboard import Leaderboards, merged_ranking
+from app.repositories import book_repository, review_repository
+from app.services.book_service import to_book_dict
+
+# the leaderboards currently used to answer requests; replaced wholesale on refresh
+_leaderboards: Optional[Leaderboards] = None
+_build_lock = asyncio.Lock()
+
+# reviews older than this many half-lives add less than 1/1000 to a book's trending score
+_TRENDING_HORIZON_HALF_LIVES = 10
+
+def get_leaderboards() -> Optional[Leaderboards]:
+    return _leaderboards
+
+def set_leaderboards(leaderboards: Optional[Leaderboards]) -> None:
+    global _leaderboards
+    _leaderboards = leaderboards
+
+def _timestamp(value: datetime) -> float:
+    # SQLite hands back naive datetimes, in UTC
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+async def build_leaderboards_from_db(db: AsyncSession) -> Leaderboards:
+    """Builds fresh leaderboards from the books' rating aggregates and the recent reviews."""
+    now = time.time()
+    half_life = settings.LEADERBOARD_TRENDING_HALF_LIFE_SECONDS
+    since = datetime.fromtimestamp(now - _TRENDING_HORIZON_HALF_LIVES * half_life, tz=timezone.utc)
+
+    books = []
+    async for partition in book_repository.iter_rating_aggregates(db):
+        books.extend(tuple(row) for row in partition)
+    review_times = []
+    async for partition in review_repository.iter_review_times(db, since=since):
+        review_times.extend((book_id, _timestamp(created_at)) for book_id, created_at in partition)
+
+    # sorting every board is CPU-bound, keep it off the event loop
+    return await asyncio.to_thread(
+        Leaderboards.build,
+        books,
+        review_times,
+        prior_weight=settings.LEADERBOARD_PRIOR_WEIGHT,
+        half_life=half_life,
+        now=now,
+    )
+
+async def ensure_leaderboards(db: AsyncSession) -> Leaderboards:
+    """Returns the loaded leaderboards, building them first if no refresh has run yet."""
+    if _leaderboards is None:
+        async with _build_lock:
+            if _leaderboards is None:
+                set_leaderboards(await build_leaderboards_from_db(db))
+    return _leaderboards
+
+def record_rating_change(book_id: int, old_rating: Optional[int], new_rating: int) -> None:
+    """Applies a committed rating write to the leaderboards of this process."""
+    if _leaderboards is not None:
+        _leaderboards.record_rating(book_id, old_rating, new_rating, at=time.time())
+
+async def run_refresh_worker() -> None:
+    """
+    Background task that rebuilds the leaderboards every
+    LEADERBOARD_REFRESH_SECONDS, picking up writes made by other workers and
+    re-centring the rating prior on the current catalogue mean.
+    """
+    while True:
+        try:
+            async with AsyncSessionLocal() as session:
+                set_leaderboards(await build_leaderboards_from_db(session))
+        except Exception as exc:
+            print(f"!!! WARNING: Failed to refresh the book leaderboards: {exc!r}")
+        await asyncio.sleep(settings.LEADERBOARD_REFRESH_SECONDS)
+
+async def _attach_books(db: AsyncSession, ranked: List[Tuple[int, float]]) -> List[dict]:
+    books = await book_repository.get_books_by_ids(db, [book_id for book_id, _ in ranked])
+    books_by_id = {book.id: book for book in books}
+    return [
+        {**to_book_dict(books_by_id[book_id]), "score": score}
+        for book_id, score in ranked
+        if book_id in books_by_id
+    ]
+
+async def get_ranked_books(
+    db: AsyncSession,
+    metric: str,
+    limit: int,
+    skip: int = 0,
+    after_score: Optional[float] = None,
+    after_id: Optional[int] = None,
+    genres: Optional[Sequence[str]] = None,
+) -> List[dict]:
+    """
+    Service to page through all books, or the books of any of `genres`, in
+    leaderboard order, by offset or after a (score, id) position. Each book
+    carries its ranking `score`, which for "trending" is in the
+    leaderboard's internal units.
+    """
+    leaderboards = await ensure_leaderboards(db)
+    after = (after_score, after_id) if after_id is not None and after_score is not None else None
+    if genres:
+        boards = [leaderboards.board(metric, genre) for genre in dict.fromkeys(genres)]
+        return await _attach_books(db, merged_ranking(boards, limit, offset=0 if after else skip, after=after))
+
+    board = leaderboards.board(metric)
+    if after is not None:
+        ranked = board.after(after_score, after_id, limit)
+    else:
+        ranked = board.top(limit, offset=skip)
+    return await _attach_books(db, ranked)
+
+async def get_top_books(db: AsyncSession, metric: str, genre: Optional[str], limit: int) -> List[dict]:
+    """
+    Service to get the best books by a metric, overall or within a genre.
+    Trending scores are reported as decayed review counts.
+    """
+    leaderboards = await ensure_leaderboards(db)
+    ranked = leaderboards.board(metric, genre).top(limit)
+    if metric == "trending":
+        decay = leaderboards.decay(time.time())
+        ranked = [(book_id, score * decay) for book_id, score in ranked]
+    return [{**book, "score": round(book["score"], 4)} for book in await _attach_books(db, ranked)]
@@ -0,0 +1,238 @@
+import asyncio
+import heapq
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.recommender.incremental import IncrementalModel, RatingChange
+from app.recommender.model import SimilarityModel, build_model
+from app.recommender.store import current_version, open_version
+from app.repositories import book_repository, review_repository
+from app.services.book_service import to_book_dict
+
+# the model currently used to answer requests, and the store version it was
+# opened from; replaced wholesale on reload
+_model: Optional[IncrementalModel] = None
+_model_version: Optional[str] = None
+
+# rating writes waiting to be folded into the model by the update worker, and
+# the same changes per user, oldest first, until the worker takes them off the queue
+_updates: "asyncio.Queue[RatingChange]" = asyncio.Queue(maxsize=settings.RECOMMENDER_UPDATE_QUEUE_SIZE)
+_queued_by_user: Dict[int, Deque[RatingChange]] = defaultdict(deque)
+
+# per user: rating writes between their first statement and their enqueue,
+# and whether one began while the update worker was reading the user's ratings
+_writes_in_flight: Dict[int, int] = defaultdict(int)
+_disturbed_reads: Dict[int, bool] = {}
+
+_SETTLE_ATTEMPTS = 10
+_SETTLE_DELAY_SECONDS = 0.05
+
+@contextmanager
+def rating_write(user_id: int) -> Iterator[None]:
+    """
+    Marks a rating write of the user as in flight until its changes are
+    queued, so that an update batch never reads the user's ratings halfway
+    through it. Free when no model is loaded; never blocks the write.
+    """
+    if _model is None:
+        yield
+        return
+    _writes_in_flight[user_id] += 1
+    if user_id in _disturbed_reads:
+        _disturbed_reads[user_id] = True
+    try:
+        yield
+    finally:
+        _writes_in_flight[user_id] -= 1
+        if not _writes_in_flight[user_id]:
+            del _writes_in_flight[user_id]
+
+def get_model() -> Optional[IncrementalModel]:
+    return _model
+
+def set_model(model: Optional[SimilarityModel], version: Optional[str] = None) -> None:
+    global _model, _model_version
+    _model = IncrementalModel(model, k=settings.RECOMMENDER_NEIGHBOURS) if model is not None else None
+    _model_version = version
+
+def load_model_from_disk(path: str = settings.RECOMMENDER_MODEL_PATH) -> bool:
+    """
+    Memory-maps the current version of the model store written by the
+    offline rebuild command, if there is one.
+    """
+    version = current_version(path)
+    if version is None:
+        print(f"!!! WARNING: No recommendation model at {path}! Recommendations are disabled.")
+        return False
+
+    print(f"--- Loading recommendation model {version} from {path} ---")
+    set_model(open_version(path, version), version)
+    return True
+
+async def run_reload_worker(path: str = settings.RECOMMENDER_MODEL_PATH) -> None:
+    """
+    Background task that swaps in a new version of the model store every
+    time the rebuild command publishes one, without a restart. Requests that
+    already hold the old model finish with it; rating changes folded into the
+    old model since its build are dropped, as the new one is built from the
+    reviews table.
+    """
+    while True:
+        await asyncio.sleep(settings.RECOMMENDER_RELOAD_SECONDS)
+        try:
+            version = current_version(path)
+            if version is not None and version != _model_version:
+                model = await asyncio.to_thread(open_version, path, version)
+                set_model(model, version)
+                print(f"--- Swapped in recommendation model {version} ---")
+        except Exception as exc:
+            print(f"!!! WARNING: Failed to reload the recommendation model from {path}: {exc!r}")
+
+async def build_model_from_db(db: AsyncSession) -> SimilarityModel:
+    """Builds a fresh similarity model from every rating in the reviews table."""
+    chunks = []
+    async for partition in review_repository.iter_all_ratings(db):
+        chunks.append(np.array(partition, dtype=np.int64).reshape(-1, 3))
+
+    triples = np.concatenate(chunks) if chunks else np.zeros((0, 3), dtype=np.int64)
+    return build_model(
+        user_ids=triples[:, 0],
+        book_ids=triples[:, 1],
+        ratings=triples[:, 2],
+        k=settings.RECOMMENDER_NEIGHBOURS,
+    )
+
+def enqueue_rating_change(user_id: int, book_id: int, old_rating: Optional[int], new_rating: int) -> None:
+    """
+    Queues a rating write for the update worker without waiting for it.
+    If the queue is full the change is dropped; the next full rebuild picks it up.
+    """
+    if _model is None or old_rating == new_rating:
+        return
+    change = RatingChange(user_id, book_id, old_rating, new_rating)
+    try:
+        _updates.put_nowait(change)
+    except asyncio.QueueFull:
+        print("!!! WARNING: Recommendation update queue is full, dropping rating change.")
+        return
+    _queued_by_user[user_id].append(change)
+
+def _take_update(change: RatingChange) -> RatingChange:
+    """Marks a change taken off the queue as part of the batch being cut."""
+    queued = _queued_by_user[change.user_id]
+    queued.popleft()
+    if not queued:
+        del _queued_by_user[change.user_id]
+    return change
+
+async def _read_settled_ratings(db: AsyncSession, user_id: int) -> Optional[Dict[int, int]]:
+    """
+    Reads a user's ratings as they were right after the batch being applied,
+    or returns None if the user kept writing through every attempt.
+    """
+    for _ in range(_SETTLE_ATTEMPTS):
+        if not _writes_in_flight.get(user_id):
+            _disturbed_reads[user_id] = False
+            try:
+                ratings = dict(await review_repository.get_ratings_by_user(db, user_id=user_id, limit=None))
+            finally:
+                disturbed = _disturbed_reads.pop(user_id)
+            if not disturbed:
+                # no write was in flight during the read, so every committed
+                # write of this user is either in the batch or still queued;
+                # rewind the queued ones, which are newer
+                for change in reversed(_queued_by_user.get(user_id, ())):
+                    if change.old_rating is None:
+                        ratings.pop(change.book_id, None)
+                    else:
+                        ratings[change.book_id] = change.old_rating
+                return ratings
+        await asyncio.sleep(_SETTLE_DELAY_SECONDS)
+    return None
+
+async def apply_rating_changes(db: AsyncSession, changes: List[RatingChange]) -> int:
+    """
+    Folds a batch of rating changes into the loaded model. Changes of a user
+    whose ratings cannot be read between writes are dropped; the next full
+    rebuild picks them up.
+    """
+    model = _model
+    if model is None:
+        return 0
+
+    user_ratings: Dict[int, Dict[int, int]] = {}
+    for user_id in {change.user_id for change in changes}:
+        ratings = await _read_settled_ratings(db, user_id)
+        if ratings is None:
+            print(f"!!! WARNING: Ratings of user {user_id} kept changing, dropping their recommendation updates.")
+        else:
+            user_ratings[user_id] = ratings
+    changes = [change for change in changes if change.user_id in user_ratings]
+
+    # the arithmetic is CPU-bound, keep it off the event loop
+    return await asyncio.to_thread(model.apply, changes, user_ratings)
+
+async def run_update_worker() -> None:
+    """
+    Background task that drains the update queue, batching the changes that
+    arrive within RECOMMENDER_UPDATE_FLUSH_SECONDS of each other.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [_take_update(await _updates.get())]
+        deadline = loop.time() + settings.RECOMMENDER_UPDATE_FLUSH_SECONDS
+        while len(batch) < settings.RECOMMENDER_UPDATE_BATCH_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(_take_update(await asyncio.wait_for(_updates.get(), timeout)))
+            except asyncio.TimeoutError:
+                break
+
+        try:
+            async with AsyncSessionLocal() as session:
+                await apply_rating_changes(session, batch)
+        except Exception as exc:
+            print(f"!!! WARNING: Failed to apply {len(batch)} recommendation updates: {exc!r}")
+
+def score_candidates(
+    model: IncrementalModel, ratings: List[Tuple[int, int]], limit: int
+) -> List[Tuple[int, float]]:
+    """
+    Scores unrated books by the similarity-weighted sum of the user's ratings
+    over the precomputed neighbours of each book the user has rated.
+    """
+    rated = {book_id for book_id, _ in ratings}
+    scores: Dict[int, float] = {}
+    for book_id, rating in ratings:
+        for neighbour_id, similarity in model.neighbours(book_id, settings.RECOMMENDER_NEIGHBOURS):
+            if neighbour_id not in rated:
+                scores[neighbour_id] = scores.get(neighbour_id, 0.0) + similarity * rating
+    return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+
+async def _attach_books(db: AsyncSession, scored: List[Tuple[int, float]]) -> List[dict]:
+    books = await book_repository.get_books_by_ids(db, [book_id for book_id, _ in scored])
+    books_by_id = {book.id: book for book in books}
+    return [
+        {**to_book_dict(books_by_id[book_id]), "score": round(score, 4)}
+        for book_id, score in scored
+        if book_id in books_by_id
+    ]
+
+async def get_similar_books(db: AsyncSession, model: IncrementalModel, book_id: int, limit: int) -> List[dict]:
+    """Service to get the books most similar to the given book."""
+    return await _attach_books(db, model.neighbours(book_id, limit))
+
+async def get_recommendations_for_user(db: AsyncSession, model: IncrementalModel, user_id: int, limit: int) -> List[dict]:
+    """Service to recommend unrated books to a user based on their own ratings."""
+    ratings = await review_repository.get_ratings_by_user(
+        db, user_id=user_id, limit=settings.RECOMMENDER_MAX_HISTORY
+    )
+    return await _attach_books(db, score_candidates(model, ratings, limit))
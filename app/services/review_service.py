@@ -1,30 +1,108 @@
-from typing import List
+from typing import AsyncIterator, List, Optional
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.repositories import review_repository
-from app.schemas.review_schema import Review, ReviewCreate
+from app.core import fast_json
+from app.core.response_cache import book_tag, response_cache
+from app.repositories import book_repository, review_repository
+from app.schemas.review_schema import ReviewBatchItem, ReviewCreate
+from app.services import leaderboard_service, recommendation_service
 
-async def get_reviews_for_book(db: AsyncSession, book_id: int) -> List[Review]:
-    """Service to retrieve all reviews for a book."""
-    return await review_repository.get_reviews_by_book_id(db=db, book_id=book_id)
+async def get_reviews_for_book(
+    db: AsyncSession,
+    book_id: int,
+    limit: int,
+    sort: str = "id",
+    after_id: Optional[int] = None,
+    after_rating: Optional[int] = None,
+) -> List[dict]:
+    """Service to retrieve one page of a book's reviews."""
+    rows = await review_repository.get_reviews_page(
+        db, book_id=book_id, limit=limit, sort=sort, after_id=after_id, after_rating=after_rating
+    )
+    return [row._asdict() for row in rows]
+
+async def iter_reviews_ndjson(
+    db: AsyncSession,
+    book_id: int,
+    sort: str = "id",
+    after_id: Optional[int] = None,
+    after_rating: Optional[int] = None,
+) -> AsyncIterator[bytes]:
+    """
+    Yields every review of a book as newline-delimited JSON, one chunk per
+    database batch, so memory use does not grow with the number of reviews.
+    """
+    async for rows in review_repository.iter_reviews(
+        db, book_id=book_id, sort=sort, after_id=after_id, after_rating=after_rating
+    ):
+        yield b"".join(fast_json.dumps(row._asdict()) + b"\n" for row in rows)
 
 async def create_or_update_review(
     db: AsyncSession, book_id: int, user_id: int, review: ReviewCreate
-) -> Review:
+) -> dict:
     """
     Service logic to create a new review or update an existing one
-    for the given user and book.
+    for the given user and book, as a single upsert. Once the write has been
+    committed, cached book pages containing the book are invalidated if its
+    rating changed, the leaderboards are updated, and the rating change is
+    queued for the recommendation model.
     """
-    existing_review = await review_repository.get_review_by_book_and_user(
-        db=db, book_id=book_id, user_id=user_id
-    )
-
-    if existing_review:
-        updated_review = await review_repository.update_review(
-            db=db, db_review=existing_review, review_update=review
-        )
-        return updated_review
-    else:
-        new_review = await review_repository.create_review(
+    with recommendation_service.rating_write(user_id):
+        saved_review, old_rating = await review_repository.upsert_review(
             db=db, book_id=book_id, user_id=user_id, review=review
         )
-        return new_review
\ No newline at end of file
+        recommendation_service.enqueue_rating_change(
+            user_id=user_id, book_id=book_id, old_rating=old_rating, new_rating=review.rating
+        )
+
+    if old_rating != review.rating:
+        await response_cache.invalidate_tags([book_tag(book_id)])
+
+    leaderboard_service.record_rating_change(book_id=book_id, old_rating=old_rating, new_rating=review.rating)
+    return saved_review
+
+async def create_or_update_reviews(
+    db: AsyncSession, user_id: int, items: List[ReviewBatchItem]
+) -> List[dict]:
+    """
+    Service logic for a batch of reviews by one user. Items for unknown books,
+    and all but the last item for the same book, are rejected; the others are
+    upserted together in one transaction. Cache invalidation, leaderboard and
+    recommendation updates then follow as for a single review. Returns one result per item.
+    """
+    results: List[dict] = [{"status": "error"} for _ in items]
+    existing_books = await book_repository.get_existing_book_ids(db, {item.book_id for item in items})
+
+    last_index = {item.book_id: index for index, item in enumerate(items)}
+    accepted = []
+    for index, item in enumerate(items):
+        if item.book_id not in existing_books:
+            results[index]["detail"] = "Book not found"
+        elif last_index[item.book_id] != index:
+            results[index]["detail"] = "Superseded by a later item for the same book"
+        else:
+            accepted.append(index)
+    if not accepted:
+        return results
+
+    with recommendation_service.rating_write(user_id):
+        saved = await review_repository.upsert_reviews(
+            db,
+            user_id=user_id,
+            reviews=[(items[index].book_id, ReviewCreate(**items[index].model_dump(exclude={"book_id"}))) for index in accepted],
+        )
+        for index, (_, old_rating) in zip(accepted, saved):
+            recommendation_service.enqueue_rating_change(
+                user_id=user_id, book_id=items[index].book_id, old_rating=old_rating, new_rating=items[index].rating
+            )
+
+    changed_books = []
+    for index, (saved_review, old_rating) in zip(accepted, saved):
+        item = items[index]
+        results[index] = {"status": "created" if old_rating is None else "updated", "review": saved_review}
+        if old_rating != item.rating:
+            changed_books.append(item.book_id)
+        leaderboard_service.record_rating_change(book_id=item.book_id, old_rating=old_rating, new_rating=item.rating)
+
+    if changed_books:
+        await response_cache.invalidate_tags([book_tag(book_id) for book_id in changed_books])
+    return results
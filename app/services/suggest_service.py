@@ -0,0 +1,70 @@
+import asyncio
+import time
+from typing import List, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.core.suggest import PrefixIndex
+from app.repositories import book_repository
+
+# the index currently used to answer requests, and the highest book id it
+# contains; replaced wholesale on rebuild
+_index: Optional[PrefixIndex] = None
+_max_book_id: Optional[int] = None
+_built_at = 0.0
+_build_lock = asyncio.Lock()
+
+def get_index() -> Optional[PrefixIndex]:
+    return _index
+
+def set_index(index: Optional[PrefixIndex], max_book_id: Optional[int] = None) -> None:
+    global _index, _max_book_id, _built_at
+    _index = index
+    _max_book_id = max_book_id
+    _built_at = time.monotonic()
+
+async def build_index_from_db(db: AsyncSession) -> PrefixIndex:
+    """Builds a fresh prefix index over the titles and authors of every book."""
+    rows = []
+    async for partition in book_repository.iter_title_rows(db):
+        rows.extend(tuple(row) for row in partition)
+    # tokenizing and sorting the whole catalogue is CPU-bound, keep it off the event loop
+    return await asyncio.to_thread(PrefixIndex, rows)
+
+async def rebuild_index(db: AsyncSession) -> None:
+    max_book_id = await book_repository.get_max_book_id(db)
+    set_index(await build_index_from_db(db), max_book_id)
+
+async def ensure_index(db: AsyncSession) -> PrefixIndex:
+    """Returns the loaded index, building it first if the startup build has not finished."""
+    if _index is None:
+        async with _build_lock:
+            if _index is None:
+                await rebuild_index(db)
+    return _index
+
+async def run_refresh_worker() -> None:
+    """
+    Background task that builds the index at startup, then rebuilds it when
+    a catalog import has added books (the highest book id grew) or once it
+    is SUGGEST_REBUILD_SECONDS old, so the popularity ranking follows reviews.
+    """
+    while True:
+        try:
+            async with AsyncSessionLocal() as session:
+                stale = time.monotonic() - _built_at >= settings.SUGGEST_REBUILD_SECONDS
+                if _index is None or stale or await book_repository.get_max_book_id(session) != _max_book_id:
+                    await rebuild_index(session)
+        except Exception as exc:
+            print(f"!!! WARNING: Failed to refresh the book suggestion index: {exc!r}")
+        await asyncio.sleep(settings.SUGGEST_CHECK_SECONDS)
+
+async def suggest_books(db: AsyncSession, q: str, limit: int) -> List[dict]:
+    """Service to complete a partial title/author query with the most popular matching books."""
+    index = await ensure_index(db)
+    return [
+        {"id": book_id, "title": title, "author": author}
+        for book_id, title, author in index.suggest(q, limit)
+    ]
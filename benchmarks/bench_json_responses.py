@@ -0,0 +1,91 @@
+"""
+CPU cost per request of the books and reviews list pages, with the default
+response path (ORM objects or row dicts validated against the response model)
+and with FAST_JSON_RESPONSES (column rows encoded by app.core.fast_json).
+
+Drives the real FastAPI app in-process through httpx's ASGI transport, with a
+SQLite stand-in for PostgreSQL. The books response cache is cleared before
+every request, outside the measurement.
+
+    python -m benchmarks.bench_json_responses --limit 100 --requests 300
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from benchmarks.common import create_sqlite_engine, seed_books, seed_reviews, session_factory
+
+from sqlalchemy import insert
+
+from app.core.config import settings
+from app.core.dependencies import get_db, get_read_db
+from app.core.response_cache import response_cache
+from app.core.security import get_current_user
+from app.main import app
+from app.models.orm_models import Review
+from app.schemas.user_schema import User
+
+async def cpu_per_request(client: httpx.AsyncClient, path: str, requests: int) -> float:
+    """Median CPU time in ms, over all threads of the process, of one request."""
+    samples = []
+    for _ in range(requests):
+        await response_cache.clear()
+        started = time.process_time()
+        response = await client.get(path)
+        samples.append((time.process_time() - started) * 1000)
+        response.raise_for_status()
+    return statistics.median(samples)
+
+async def run(args) -> None:
+    engine = await create_sqlite_engine()
+    await seed_books(engine, args.books)
+    await seed_reviews(engine, args.books, n_books=args.books)
+    async with engine.begin() as conn:
+        # one book with a full page of reviews
+        await conn.execute(insert(Review), [
+            {"book_id": 1, "user_id": 1_000_000 + i, "rating": i % 5 + 1, "review_text": f"Review number {i}"}
+            for i in range(args.limit)
+        ])
+    Session = session_factory(engine)
+
+    async def override_get_db():
+        async with Session() as session:
+            yield session
+
+    async def override_get_current_user():
+        return User(id=1, username="bench")
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+    app.dependency_overrides[get_current_user] = override_get_current_user
+
+    paths = {
+        "books": f"/api/v1/books/?limit={args.limit}",
+        "books search": f"/api/v1/books/?limit={args.limit}&search=Book",
+        "reviews": f"/api/v1/books/1/reviews?limit={args.limit}",
+    }
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for name, path in paths.items():
+            timings = {}
+            for fast in (False, True):
+                settings.FAST_JSON_RESPONSES = fast
+                await cpu_per_request(client, path, 20)  # warm up
+                timings[fast] = await cpu_per_request(client, path, args.requests)
+            saving = 1 - timings[True] / timings[False]
+            print(f"{name:>12}: default {timings[False]:.2f}ms | fast {timings[True]:.2f}ms CPU per request ({saving:.0%} less)")
+
+    await engine.dispose()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=10_000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=300)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Benchmarks the in-memory book leaderboards on a synthetic catalog.
+
+Reports the build time, the latency of top-N reads overall and per genre,
+and the latency of applying one rating write. No database is needed.
+
+    python -m benchmarks.bench_leaderboard --books 1000000
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+import benchmarks.common  # noqa: F401  (provides the settings the app needs)
+from app.core.leaderboard import Leaderboards
+
+GENRES = ["Fantasy", "Science Fiction", "Romance", "Mystery", "History", "Poetry", "Horror", "Biography"]
+
+def percentile(samples, q):
+    return statistics.quantiles(samples, n=100)[q - 1]
+
+def timed(samples, call):
+    started = time.perf_counter()
+    call()
+    samples.append((time.perf_counter() - started) * 1e6)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=1_000_000)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=10_000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    counts = rng.zipf(1.8, size=args.books).clip(max=100_000)
+    sums = (counts * rng.uniform(1, 5, size=args.books)).astype(np.int64)
+    genres = rng.integers(0, len(GENRES), size=args.books)
+    books = [
+        (book_id, GENRES[genre], int(count), int(total))
+        for book_id, genre, count, total in zip(range(1, args.books + 1), genres, counts, sums)
+    ]
+
+    now = time.time()
+    started = time.perf_counter()
+    leaderboards = Leaderboards.build(books, review_times=[], prior_weight=10, half_life=86_400, now=now)
+    print(f"build: {time.perf_counter() - started:.2f}s for {args.books} books")
+
+    for label, genre in (("top overall", None), ("top per genre", "Mystery")):
+        for metric in Leaderboards.METRICS:
+            board = leaderboards.board(metric, genre)
+            samples = []
+            for _ in range(args.requests):
+                timed(samples, lambda: board.top(args.limit))
+            print(f"{label} {metric}: p50={percentile(samples, 50):.1f}us p99={percentile(samples, 99):.1f}us")
+
+    samples = []
+    for book_id in rng.integers(1, args.books + 1, size=args.requests):
+        timed(samples, lambda: leaderboards.record_rating(int(book_id), None, int(rng.integers(1, 6)), at=time.time()))
+    print(f"write: p50={percentile(samples, 50):.1f}us p99={percentile(samples, 99):.1f}us")
+
+if __name__ == "__main__":
+    main()
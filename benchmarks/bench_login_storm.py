@@ -0,0 +1,94 @@
+"""
+Load test: latency of GET /api/v1/books/ while a storm of logins is running.
+
+Drives the real FastAPI app in-process through httpx's ASGI transport, with a
+SQLite stand-in for PostgreSQL, and compares /books p50/p99 without and with
+concurrent logins. Pass --inline to verify passwords on the event loop, as the
+login endpoint used to, for comparison.
+
+    python -m benchmarks.bench_login_storm --logins 32 --seconds 5
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from benchmarks.common import create_sqlite_engine, seed_books, session_factory, summarize
+
+from app.core.dependencies import get_db, get_read_db
+from app.main import app
+from app.repositories import user_repository
+from app.services import auth_service
+
+async def probe_books(client: httpx.AsyncClient, headers: dict, seconds: float) -> list:
+    samples = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        response = await client.get("/api/v1/books/", headers=headers)
+        response.raise_for_status()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+async def run(args) -> None:
+    engine = await create_sqlite_engine()
+    await seed_books(engine, 10_000)
+    Session = session_factory(engine)
+
+    async def override_get_db():
+        async with Session() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+    async with Session() as session:
+        await user_repository.upsert_users(session, [{
+            "id": 999_999,
+            "username": "storm",
+            "hashed_password": auth_service.pwd_context.hash("storm-password"),
+        }])
+
+    if args.inline:
+        async def verify_inline(plain_password, hashed_password):
+            return auth_service.pwd_context.verify_and_update(plain_password, hashed_password)
+        auth_service.verify_password_in_pool = verify_inline
+
+    token = auth_service.create_access_token(data={"sub": "storm", "id": 999_999})
+    headers = {"Authorization": f"Bearer {token}"}
+    statuses = {}
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        baseline = await probe_books(client, headers, args.seconds)
+        print(f"/books idle:        {summarize(baseline)} ({len(baseline)} requests)")
+
+        stop = asyncio.Event()
+
+        async def login_loop():
+            while not stop.is_set():
+                response = await client.post(
+                    "/api/v1/auth/login", data={"username": "storm", "password": "storm-password"}
+                )
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+                if response.status_code == 503:
+                    await asyncio.sleep(0.05)
+
+        storm = [asyncio.create_task(login_loop()) for _ in range(args.logins)]
+        loaded = await probe_books(client, headers, args.seconds)
+        stop.set()
+        await asyncio.gather(*storm)
+
+    print(f"/books login storm: {summarize(loaded)} ({len(loaded)} requests)")
+    print(f"login responses:    {dict(sorted(statuses.items()))}")
+    await engine.dispose()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=32, help="concurrent login clients")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--inline", action="store_true", help="verify passwords on the event loop")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Benchmarks how the recommendation model store scales across worker processes.
+
+Writes a synthetic model to a temporary store, then starts --workers processes
+that each open it, either memory-mapped (as the API does) or read into
+private memory, touch every array and answer some neighbour lookups while the
+others hold the model too. Reports per-worker cold-start time and the memory
+each worker adds: RSS counts shared pages in full, PSS splits them between the
+processes mapping them, and "private" is what the worker alone holds.
+
+    python -m benchmarks.bench_model_memory --items 200000 --workers 8
+
+Cold starts are measured with the files already in the page cache, as after
+the rebuild command has written them.
+"""
+import argparse
+import multiprocessing
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+import benchmarks.common  # noqa: F401  (provides the settings the app needs)
+from app.recommender.model import SimilarityModel
+from app.recommender.store import open_version, write_version
+
+def synthetic_model(n_items: int, k: int, seed: int = 0) -> SimilarityModel:
+    """A model of the given shape with random neighbour lists."""
+    rng = np.random.default_rng(seed)
+    return SimilarityModel(
+        item_ids=np.arange(1, n_items + 1, dtype=np.int64),
+        indptr=np.arange(0, (n_items + 1) * k, k, dtype=np.int64),
+        indices=rng.integers(0, n_items, size=n_items * k, dtype=np.int32),
+        scores=np.sort(rng.random(n_items * k, dtype=np.float32).reshape(n_items, k), axis=1)[:, ::-1].ravel(),
+        norms=rng.random(n_items, dtype=np.float32) + 1.0,
+    )
+
+def memory_kb() -> dict:
+    """Rss, Pss and private memory of this process, from /proc/self/smaps_rollup."""
+    values = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                values[parts[0].rstrip(":")] = int(parts[1])
+    return {
+        "rss": values["Rss"],
+        "pss": values["Pss"],
+        "private": values["Private_Clean"] + values["Private_Dirty"],
+    }
+
+def worker(root: str, version: str, mmap: bool, lookups: int, barrier, results) -> None:
+    before = memory_kb()
+    started = time.perf_counter()
+    model = open_version(root, version, mmap=mmap)
+    opened = time.perf_counter() - started
+    model.neighbours(int(model.item_ids[0]), 10)
+    first_answer = time.perf_counter() - started
+
+    # the working set of a long-running worker: every page of every array
+    for name in ("item_ids", "indptr", "indices", "scores", "norms"):
+        float(np.asarray(getattr(model, name)).sum())
+    rng = np.random.default_rng()
+    for book_id in rng.choice(model.item_ids, size=lookups):
+        model.neighbours(int(book_id), 10)
+
+    # measure while every worker holds the model, so shared pages are split
+    barrier.wait()
+    after = memory_kb()
+    barrier.wait()
+    results.put({
+        "open": opened,
+        "first_answer": first_answer,
+        **{key: after[key] - before[key] for key in after},
+    })
+
+def run(root: str, version: str, mmap: bool, workers: int, lookups: int) -> dict:
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [
+        context.Process(target=worker, args=(root, version, mmap, lookups, barrier, results))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    samples = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return {key: statistics.median(sample[key] for sample in samples) for key in samples[0]}
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=200_000)
+    parser.add_argument("--neighbours", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--lookups", type=int, default=10_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        model = synthetic_model(args.items, args.neighbours)
+        version = write_version(model, root)
+        size_mb = sum(getattr(model, name).nbytes for name in ("item_ids", "indptr", "indices", "scores", "norms")) / 2**20
+        print(f"model: {args.items} books, {len(model.indices)} neighbour links, {size_mb:.0f} MiB on disk")
+        del model
+
+        for label, mmap in (("copy", False), ("mmap", True)):
+            result = run(root, version, mmap, args.workers, args.lookups)
+            print(
+                f"{label}: {args.workers} workers, per worker: "
+                f"open={result['open'] * 1e3:.1f}ms first answer={result['first_answer'] * 1e3:.1f}ms "
+                f"rss=+{result['rss'] / 1024:.0f}MiB pss=+{result['pss'] / 1024:.0f}MiB private=+{result['private'] / 1024:.0f}MiB"
+            )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Load test: latency of well-behaved users while one user floods the API.
+
+Drives the real FastAPI app in-process through httpx's ASGI transport, with a
+SQLite stand-in for PostgreSQL. --users quiet users each request a book page
+--rate times per second while one noisy user runs --noisy concurrent loops of
+uncached book pages. Runs once without admission control and once with the
+configured per-user rate limit and in-flight cap, and reports the quiet users'
+p50/p99 and the noisy user's responses by status.
+
+    python -m benchmarks.bench_noisy_neighbour --users 20 --noisy 64 --seconds 5
+"""
+import argparse
+import asyncio
+import random
+import time
+
+import httpx
+
+from benchmarks.common import create_sqlite_engine, seed_books, session_factory, summarize
+
+from app.core import admission
+from app.core.config import settings
+from app.core.dependencies import get_db, get_read_db
+from app.core.security import get_current_user
+from app.main import app
+from app.schemas.user_schema import User
+from app.services import auth_service
+
+def headers_for(user_id: int) -> dict:
+    token = auth_service.create_access_token(data={"sub": f"user-{user_id}", "id": user_id})
+    return {"Authorization": f"Bearer {token}"}
+
+async def quiet_user(client: httpx.AsyncClient, user_id: int, rate: float, deadline: float, samples: list) -> None:
+    headers = headers_for(user_id)
+    # spread the users' first requests over one interval
+    await asyncio.sleep(random.random() / rate)
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        response = await client.get("/api/v1/books/", params={"limit": 20}, headers=headers)
+        response.raise_for_status()
+        samples.append((time.perf_counter() - started) * 1000)
+        await asyncio.sleep(max(0.0, 1 / rate - (time.perf_counter() - started)))
+
+async def noisy_user(client: httpx.AsyncClient, deadline: float, statuses: dict) -> None:
+    headers = headers_for(0)
+    rng = random.Random()
+    while time.perf_counter() < deadline:
+        response = await client.get("/api/v1/books/", params={"skip": rng.randrange(9_000), "limit": 100}, headers=headers)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        if response.status_code in (429, 503):
+            # a client that ignores Retry-After but does not spin
+            await asyncio.sleep(0.01)
+
+async def run_round(client: httpx.AsyncClient, args) -> tuple:
+    samples, statuses = [], {}
+    deadline = time.perf_counter() + args.seconds
+    await asyncio.gather(
+        *(quiet_user(client, user_id, args.rate, deadline, samples) for user_id in range(1, args.users + 1)),
+        *(noisy_user(client, deadline, statuses) for _ in range(args.noisy)),
+    )
+    return samples, statuses
+
+async def run(args) -> None:
+    engine = await create_sqlite_engine()
+    await seed_books(engine, 10_000)
+    Session = session_factory(engine)
+
+    async def override_get_db():
+        async with Session() as session:
+            yield session
+
+    async def override_get_current_user():
+        return User(id=1, username="bench", email="bench@example.com")
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+    # the users only exist in their tokens; the middleware keys on the verified token
+    app.dependency_overrides[get_current_user] = override_get_current_user
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for label, enabled in (("off", False), ("on", True)):
+            settings.RATE_LIMIT_ENABLED = enabled
+            admission.rate_limit_backend = admission.InMemoryRateLimitBackend(maxsize=settings.RATE_LIMIT_MAX_KEYS)
+            admission.concurrency_limiter = admission.ConcurrencyLimiter(
+                settings.ADMISSION_MAX_IN_FLIGHT if enabled else 0,
+                settings.ADMISSION_QUEUE_SIZE,
+                settings.ADMISSION_QUEUE_TIMEOUT_SECONDS,
+            )
+            samples, statuses = await run_round(client, args)
+            print(f"admission {label:3}: quiet users {summarize(samples)} ({len(samples)} requests), "
+                  f"noisy user {dict(sorted(statuses.items()))}")
+    await engine.dispose()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20, help="well-behaved users")
+    parser.add_argument("--rate", type=float, default=5.0, help="requests per second of each well-behaved user")
+    parser.add_argument("--noisy", type=int, default=64, help="concurrent request loops of the noisy user")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
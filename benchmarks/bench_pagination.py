@@ -0,0 +1,45 @@
+"""
+Compares offset (skip) and keyset (cursor) pagination of the books list on a
+deep page, using book_repository.get_books against a SQLite stand-in.
+
+    python -m benchmarks.bench_pagination --books 1000000 --page 10000
+"""
+import argparse
+import asyncio
+
+from benchmarks.common import create_sqlite_engine, seed_books, session_factory, summarize, timed
+
+from app.repositories import book_repository
+
+async def run(args) -> None:
+    engine = await create_sqlite_engine()
+    await seed_books(engine, args.books)
+    Session = session_factory(engine)
+    print(f"catalog: {args.books} books, page size {args.limit}")
+
+    async with Session() as db:
+        for page in (1, args.page):
+            skip = (page - 1) * args.limit
+            # the cursor of page N points at the last id of page N - 1
+            books = await book_repository.get_books(db, None, skip=max(skip - 1, 0), limit=1)
+            after_id = books[0].id if skip else None
+
+            offset = await timed(lambda: book_repository.get_books(db, None, skip=skip, limit=args.limit), args.repeat)
+            keyset = await timed(
+                lambda: book_repository.get_books(db, None, skip=0, limit=args.limit, after_id=after_id), args.repeat
+            )
+            print(f"page {page:>6}: offset {summarize(offset)} | cursor {summarize(keyset)}")
+
+    await engine.dispose()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=1_000_000)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--page", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
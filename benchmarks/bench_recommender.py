@@ -0,0 +1,72 @@
+"""
+Benchmarks the item-item recommendation model on a synthetic rating dataset.
+
+Reports the model build time and the per-request latency of the similar-books
+lookup and of scoring recommendations for a user. No database is needed.
+
+    python -m benchmarks.bench_recommender --reviews 1000000
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+import benchmarks.common  # noqa: F401  (provides the settings the app needs)
+from app.recommender.model import build_model
+from app.services.recommendation_service import score_candidates
+
+def synthetic_ratings(n_reviews: int, n_users: int, n_books: int, seed: int = 0):
+    """Generates (user_id, book_id, rating) arrays with a long-tailed book popularity."""
+    rng = np.random.default_rng(seed)
+    popularity = 1.0 / np.arange(1, n_books + 1) ** 0.8
+    popularity /= popularity.sum()
+    user_ids = rng.integers(1, n_users + 1, size=n_reviews)
+    book_ids = rng.choice(np.arange(1, n_books + 1), size=n_reviews, p=popularity)
+    ratings = rng.integers(1, 6, size=n_reviews)
+
+    # one rating per (user, book), like the reviews table
+    _, unique_idx = np.unique(user_ids * (n_books + 1) + book_ids, return_index=True)
+    return user_ids[unique_idx], book_ids[unique_idx], ratings[unique_idx]
+
+def percentile(samples, q):
+    return statistics.quantiles(samples, n=100)[q - 1]
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reviews", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--books", type=int, default=20_000)
+    parser.add_argument("--neighbours", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=10_000)
+    args = parser.parse_args()
+
+    user_ids, book_ids, ratings = synthetic_ratings(args.reviews, args.users, args.books)
+    print(f"dataset: {len(ratings)} ratings, {args.users} users, {args.books} books")
+
+    started = time.perf_counter()
+    model = build_model(user_ids, book_ids, ratings, k=args.neighbours)
+    print(f"build: {time.perf_counter() - started:.2f}s ({len(model.indices)} neighbour links)")
+
+    rng = np.random.default_rng(1)
+    samples = []
+    for book_id in rng.choice(model.item_ids, size=args.requests):
+        started = time.perf_counter()
+        model.neighbours(int(book_id), 10)
+        samples.append((time.perf_counter() - started) * 1e6)
+    print(f"similar: p50={percentile(samples, 50):.1f}us p99={percentile(samples, 99):.1f}us")
+
+    # user histories as they would be read by review_repository.get_ratings_by_user
+    order = np.argsort(user_ids, kind="stable")
+    sorted_users = user_ids[order]
+    samples = []
+    for user_id in rng.choice(np.unique(user_ids), size=min(args.requests, 2_000)):
+        lo, hi = np.searchsorted(sorted_users, [user_id, user_id + 1])
+        history = [(int(book_ids[i]), int(ratings[i])) for i in order[lo:hi]]
+        started = time.perf_counter()
+        score_candidates(model, history, 10)
+        samples.append((time.perf_counter() - started) * 1e6)
+    print(f"recommend: p50={percentile(samples, 50):.1f}us p99={percentile(samples, 99):.1f}us")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Throughput of review ingestion: one POST /api/v1/books/{book_id}/reviews per
+rating against POST /api/v1/reviews:batch, for the same ratings.
+
+Drives the real FastAPI app in-process through httpx's ASGI transport, with a
+SQLite stand-in for PostgreSQL.
+
+    python -m benchmarks.bench_review_batch --ratings 2000 --batch-size 200
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.common import create_sqlite_engine, seed_books, session_factory
+
+from app.core.dependencies import get_db, get_read_db
+from app.main import app
+from app.repositories import user_repository
+from app.services import auth_service
+
+async def per_item(client: httpx.AsyncClient, headers: dict, items: list) -> None:
+    for item in items:
+        response = await client.post(
+            f"/api/v1/books/{item['book_id']}/reviews", json={"rating": item["rating"]}, headers=headers
+        )
+        response.raise_for_status()
+
+async def batched(client: httpx.AsyncClient, headers: dict, items: list, batch_size: int) -> None:
+    for start in range(0, len(items), batch_size):
+        response = await client.post("/api/v1/reviews:batch", json={"items": items[start:start + batch_size]}, headers=headers)
+        response.raise_for_status()
+
+async def run(args) -> None:
+    rng = random.Random(0)
+    book_ids = rng.sample(range(1, args.books + 1), args.ratings)
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name in ("per-item", "batch"):
+            engine = await create_sqlite_engine(os.path.join(directory, f"{name}.db"))
+            await seed_books(engine, args.books)
+            Session = session_factory(engine)
+
+            async def override_get_db():
+                async with Session() as session:
+                    yield session
+
+            app.dependency_overrides[get_db] = override_get_db
+            app.dependency_overrides[get_read_db] = override_get_db
+            async with Session() as session:
+                await user_repository.upsert_users(session, [{
+                    "id": 1, "username": "partner", "hashed_password": auth_service.pwd_context.hash("partner"),
+                }])
+            token = auth_service.create_access_token(data={"sub": "partner", "id": 1})
+            headers = {"Authorization": f"Bearer {token}"}
+
+            items = [{"book_id": book_id, "rating": rng.randint(1, 5)} for book_id in book_ids]
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+                started = time.perf_counter()
+                if name == "per-item":
+                    await per_item(client, headers, items)
+                else:
+                    await batched(client, headers, items, args.batch_size)
+                elapsed = time.perf_counter() - started
+
+            print(f"{name:>8}: {len(items) / elapsed:,.0f} ratings/s ({elapsed:.2f}s for {len(items)})")
+            await engine.dispose()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=10_000)
+    parser.add_argument("--ratings", type=int, default=2_000)
+    parser.add_argument("--batch-size", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
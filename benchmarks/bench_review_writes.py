@@ -0,0 +1,88 @@
+"""
+Measures review write throughput: the single-statement upsert of
+review_repository.upsert_review against the previous read-then-write path
+(SELECT, INSERT or UPDATE, then a re-SELECT), against a SQLite stand-in.
+Half of the writes replace an existing review.
+
+    python -m benchmarks.bench_review_writes --writes 5000
+
+SQLite runs in-process and its commits dominate, so both paths come out close
+here; against PostgreSQL every saved statement is also a saved network round
+trip. SQLite also serializes writers, so a --concurrency above 1 mostly
+measures its lock retries.
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.common import create_sqlite_engine, seed_books, session_factory, summarize
+
+from sqlalchemy import select
+
+from app.models.orm_models import Review
+from app.repositories import book_repository, review_repository
+from app.schemas.review_schema import ReviewCreate
+
+async def legacy_write(db, book_id: int, user_id: int, review: ReviewCreate) -> None:
+    existing = (await db.execute(
+        select(Review).where(Review.book_id == book_id, Review.user_id == user_id)
+    )).scalars().first()
+    if existing is None:
+        existing = Review(**review.model_dump(), book_id=book_id, user_id=user_id)
+        db.add(existing)
+        await book_repository.add_rating(db, book_id, rating_delta=review.rating, count_delta=1)
+    else:
+        delta = review.rating - existing.rating
+        existing.rating = review.rating
+        existing.review_text = review.review_text
+        await book_repository.add_rating(db, book_id, rating_delta=delta, count_delta=0)
+    await db.commit()
+    await db.refresh(existing)
+
+async def upsert_write(db, book_id: int, user_id: int, review: ReviewCreate) -> None:
+    await review_repository.upsert_review(db, book_id, user_id, review)
+
+async def measure(Session, write, writes: list, concurrency: int) -> tuple:
+    queue = list(writes)
+    samples = []
+
+    async def worker():
+        async with Session() as db:
+            while queue:
+                book_id, user_id, rating = queue.pop()
+                started = time.perf_counter()
+                await write(db, book_id, user_id, ReviewCreate(rating=rating))
+                samples.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return len(writes) / (time.perf_counter() - started), samples
+
+async def run(args) -> None:
+    rng = random.Random(0)
+    # the first half creates reviews, the second half replaces the same ones
+    keys = [(rng.randrange(1, args.books + 1), user_id) for user_id in range(1, args.writes // 2 + 1)]
+    writes = [(book_id, user_id, rng.randint(1, 5)) for book_id, user_id in keys + keys]
+    writes.reverse()  # workers pop from the end
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name, write in (("read-then-write", legacy_write), ("upsert", upsert_write)):
+            engine = await create_sqlite_engine(os.path.join(directory, f"{name}.db"))
+            await seed_books(engine, args.books)
+            throughput, samples = await measure(session_factory(engine), write, writes, args.concurrency)
+            print(f"{name:>15}: {throughput:,.0f} writes/s {summarize(samples)}")
+            await engine.dispose()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=10_000)
+    parser.add_argument("--writes", type=int, default=5_000)
+    parser.add_argument("--concurrency", type=int, default=1)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmarks the book suggestion index on a synthetic catalog.
+
+Titles and authors are drawn from Zipf-distributed vocabularies, so a few
+words ("the", "of") occur in a large share of the books, as in a real
+catalog. Reports the build time, the index size and the p50/p99 latency of
+typed-out prefixes of one to three words. No database is needed.
+
+    python -m benchmarks.bench_suggest --books 1000000
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+import benchmarks.common  # noqa: F401  (provides the settings the app needs)
+from app.core.suggest import PrefixIndex
+
+LETTERS = "abcdefghijklmnopqrstuvwxyz"
+
+def percentile(samples, q):
+    return statistics.quantiles(samples, n=100)[q - 1]
+
+def vocabulary(rng, size: int) -> list:
+    lengths = rng.integers(2, 11, size=size)
+    return ["".join(rng.choice(list(LETTERS), size=length)) for length in lengths]
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--books", type=int, default=1_000_000)
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--requests", type=int, default=20_000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    words = vocabulary(rng, 50_000)
+    names = vocabulary(rng, 20_000)
+    title_words = (rng.zipf(1.3, size=(args.books, 4)) - 1) % len(words)
+    title_lengths = rng.integers(1, 5, size=args.books)
+    author_words = (rng.zipf(1.5, size=(args.books, 2)) - 1) % len(names)
+    counts = rng.zipf(1.8, size=args.books).clip(max=100_000)
+    books = [
+        (
+            book_id,
+            " ".join(words[w] for w in title_words[book_id - 1, :title_lengths[book_id - 1]]).title(),
+            " ".join(names[w] for w in author_words[book_id - 1]).title(),
+            int(counts[book_id - 1]),
+        )
+        for book_id in range(1, args.books + 1)
+    ]
+
+    started = time.perf_counter()
+    index = PrefixIndex(books)
+    print(
+        f"build: {time.perf_counter() - started:.2f}s for {args.books} books, "
+        f"{len(index.words)} words, {len(index.postings)} postings, {len(index.top)} precomputed prefixes"
+    )
+
+    # what a user types: the first 1..n characters of the words of a real title
+    queries = {1: [], 2: [], 3: []}
+    for book_id in rng.integers(1, args.books + 1, size=args.requests):
+        title_words_of_book = books[book_id - 1][1].lower().split()
+        n = min(len(title_words_of_book), int(rng.integers(1, 4)))
+        typed = title_words_of_book[:n]
+        typed[-1] = typed[-1][:int(rng.integers(1, len(typed[-1]) + 1))]
+        queries[n].append(" ".join(typed))
+
+    for n, batch in queries.items():
+        samples = []
+        for query in batch:
+            started = time.perf_counter()
+            index.suggest(query, args.limit)
+            samples.append((time.perf_counter() - started) * 1e6)
+        print(f"{n} word(s): p50={percentile(samples, 50):.1f}us p99={percentile(samples, 99):.1f}us max={max(samples):.1f}us")
+
+if __name__ == "__main__":
+    main()
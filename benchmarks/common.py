@@ -0,0 +1,93 @@
+"""
+Shared helpers for the benchmarks: a local SQLite stand-in for PostgreSQL and
+synthetic catalog data.
+"""
+import os
+import random
+import statistics
+import time
+
+# app.core.config requires these; the benchmarks never talk to PostgreSQL
+for _name, _default in {
+    "POSTGRES_USER": "bench",
+    "POSTGRES_PASSWORD": "bench",
+    "POSTGRES_HOST": "localhost",
+    "POSTGRES_PORT": "5432",
+    "POSTGRES_DB": "bench",
+    "SECRET_KEY": "benchmark-secret-key",
+    # the load generators send everything as one user; bench_noisy_neighbour turns it back on
+    "RATE_LIMIT_ENABLED": "false",
+}.items():
+    os.environ.setdefault(_name, _default)
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+
+from app.core.database import Base
+from app.models.orm_models import Book, Review
+from app.repositories import book_repository
+
+GENRES = ["Fiction", "Science Fiction", "Fantasy", "Romance", "Mystery", "History", "Biography", "Poetry"]
+
+async def create_sqlite_engine(path: str = ":memory:") -> AsyncEngine:
+    """Creates a SQLite engine with the application schema."""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    return engine
+
+def session_factory(engine: AsyncEngine) -> async_sessionmaker:
+    return async_sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+async def seed_books(engine: AsyncEngine, count: int, batch_size: int = 50_000, seed: int = 0) -> None:
+    """Inserts `count` synthetic books with multi-row inserts."""
+    rng = random.Random(seed)
+    async with engine.begin() as conn:
+        for start in range(0, count, batch_size):
+            rows = [
+                {
+                    "title": f"Book {i} {rng.choice(['of', 'and', 'in'])} {rng.randrange(10_000)}",
+                    "author": f"Author {rng.randrange(count // 10 + 1)}",
+                    "genre": rng.choice(GENRES),
+                }
+                for i in range(start, min(start + batch_size, count))
+            ]
+            await conn.execute(insert(Book), rows)
+
+async def seed_reviews(
+    engine: AsyncEngine, count: int, n_books: int, per_user: int = 10, batch_size: int = 50_000, seed: int = 0
+) -> None:
+    """
+    Inserts `count` synthetic reviews, `per_user` per user on distinct books
+    (which needs n_books >= 1000), then recomputes the books' rating aggregates.
+    """
+    rng = random.Random(seed)
+    async with engine.begin() as conn:
+        for start in range(0, count, batch_size):
+            rows = []
+            for i in range(start, min(start + batch_size, count)):
+                user_id, slot = divmod(i, per_user)
+                rows.append({
+                    "user_id": user_id + 1,
+                    "book_id": (user_id * 2_654_435_761 + slot * 97) % n_books + 1,
+                    "rating": rng.randint(1, 5),
+                })
+            await conn.execute(insert(Review), rows)
+
+    async with session_factory(engine)() as db:
+        await book_repository.backfill_rating_aggregates(db)
+
+async def timed(coro_factory, repeat: int) -> list:
+    """Awaits `coro_factory()` `repeat` times and returns the latencies in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await coro_factory()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+def summarize(samples: list) -> str:
+    if len(samples) < 2:
+        return f"{samples[0]:.2f}ms"
+    quantiles = statistics.quantiles(samples, n=100)
+    return f"p50={quantiles[49]:.2f}ms p99={quantiles[98]:.2f}ms"
@@ -0,0 +1,16 @@
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.core.database import Base
+
+@pytest_asyncio.fixture
+async def db():
+    """An in-memory SQLite session standing in for PostgreSQL."""
+    engine = create_async_engine("sqlite+aiosqlite://")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    async with async_sessionmaker(bind=engine, expire_on_commit=False)() as session:
+        yield session
+
+    await engine.dispose()
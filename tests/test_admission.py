@@ -0,0 +1,128 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient
+
+from app.core import admission, security
+from app.core.admission import (
+    AdmissionMiddleware, ConcurrencyLimiter, InMemoryRateLimitBackend, Overloaded, RedisRateLimitBackend,
+)
+from app.schemas.user_schema import User
+from app.services import auth_service
+
+pytestmark = pytest.mark.asyncio
+
+class FakeRedis:
+    """Local stand-in for the subset of redis.asyncio.Redis used by RedisRateLimitBackend."""
+
+    def __init__(self, wait: bytes):
+        self.wait = wait
+        self.calls = []
+
+    async def eval(self, script, numkeys, *args):
+        self.calls.append((numkeys, *args))
+        return self.wait
+
+async def test_token_bucket_allows_bursts_then_refills():
+    backend = InMemoryRateLimitBackend(maxsize=10)
+
+    assert [await backend.take("user:1", rate=2, burst=3, now=100.0) for _ in range(3)] == [0, 0, 0]
+    assert await backend.take("user:1", rate=2, burst=3, now=100.0) == pytest.approx(0.5)
+    assert await backend.take("user:2", rate=2, burst=3, now=100.0) == 0
+    # half a second refills one token
+    assert await backend.take("user:1", rate=2, burst=3, now=100.5) == 0
+    assert await backend.take("user:1", rate=2, burst=3, now=100.5) > 0
+
+async def test_redis_backend_runs_one_script_per_take():
+    client = FakeRedis(wait=b"0.25")
+    backend = RedisRateLimitBackend(client)
+
+    assert await backend.take("user:1", rate=2.0, burst=3, now=100.0) == 0.25
+    assert client.calls == [(1, "rate-limit:user:1", 2.0, 3, 100.0)]
+
+async def test_concurrency_limiter_queues_then_sheds():
+    limiter = ConcurrencyLimiter(max_in_flight=1, max_queue=1, queue_timeout=0.05)
+    await limiter.acquire()
+
+    queued = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0)
+    assert limiter.waiting == 1
+    with pytest.raises(Overloaded) as exc:
+        await limiter.acquire()
+    assert exc.value.reason == "queue_full"
+
+    # the released slot goes straight to the waiter
+    limiter.release()
+    await queued
+    assert limiter.in_flight == 1 and limiter.waiting == 0
+
+    with pytest.raises(Overloaded) as exc:
+        await limiter.acquire()
+    assert exc.value.reason == "queue_timeout"
+    assert limiter.waiting == 0
+    limiter.release()
+    assert limiter.in_flight == 0
+
+async def test_middleware_limits_each_user_and_sheds_overload(mocker):
+    """Users are limited on their own buckets, logins per IP, and a full worker answers 503."""
+    app = FastAPI()
+    release = asyncio.Event()
+
+    @app.get("/api/v1/books/")
+    async def books():
+        return []
+
+    @app.post("/api/v1/auth/login")
+    async def login():
+        return {}
+
+    @app.get("/slow")
+    async def slow():
+        await release.wait()
+        return {}
+
+    app.add_middleware(AdmissionMiddleware)
+    mocker.patch.object(admission, "rate_limit_backend", InMemoryRateLimitBackend(maxsize=10))
+    mocker.patch.object(admission, "concurrency_limiter", ConcurrencyLimiter(max_in_flight=1, max_queue=0, queue_timeout=1))
+    mocker.patch.multiple(
+        admission.settings,
+        RATE_LIMIT_ENABLED=True, RATE_LIMIT_PER_SECOND=0.1, RATE_LIMIT_BURST=2,
+        LOGIN_RATE_LIMIT_PER_SECOND=0.1, LOGIN_RATE_LIMIT_BURST=1,
+    )
+    alice = {"Authorization": "Bearer " + auth_service.create_access_token({"sub": "alice", "id": 1})}
+    bob = {"Authorization": "Bearer " + auth_service.create_access_token({"sub": "bob", "id": 2})}
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        alice_statuses = [(await client.get("/api/v1/books/", headers=alice)).status_code for _ in range(3)]
+        bob_response = await client.get("/api/v1/books/", headers=bob)
+        logins = [(await client.post("/api/v1/auth/login", headers=bob)).status_code for _ in range(2)]
+        limited = await client.get("/api/v1/books/", headers=alice)
+
+        mocker.patch.object(admission.settings, "RATE_LIMIT_ENABLED", False)
+        slow = asyncio.create_task(client.get("/slow"))
+        while admission.concurrency_limiter.in_flight == 0:
+            await asyncio.sleep(0.01)
+        shed = await client.get("/api/v1/books/")
+        release.set()
+        await slow
+
+    assert alice_statuses == [200, 200, 429]
+    assert bob_response.status_code == 200
+    assert logins == [200, 429]
+    assert limited.headers["Retry-After"] == "10"
+    assert shed.status_code == 503 and shed.headers["Retry-After"] == "1"
+    assert admission.concurrency_limiter.in_flight == 0
+
+async def test_rate_limit_key_does_not_count_token_cache_lookups():
+    token = auth_service.create_access_token({"sub": "alice", "id": 1})
+    security.token_cache.set(token, User(id=1, username="alice"))
+    hits, misses = security.token_cache.hits, security.token_cache.misses
+
+    key, _, _ = admission.rate_limit_key(
+        {"type": "http", "path": "/api/v1/books/", "client": ("10.0.0.1", 1), "headers": [(b"authorization", f"Bearer {token}".encode())]}
+    )
+
+    assert key == "user:1"
+    assert (security.token_cache.hits, security.token_cache.misses) == (hits, misses)
+    security.token_cache.delete(token)
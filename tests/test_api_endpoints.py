@@ -1,16 +1,35 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
 import pytest
+import pytest_asyncio
 from httpx import AsyncClient
 from unittest.mock import AsyncMock
 
+import numpy as np
+
 from app.main import app
-from app.core.dependencies import get_db
+from app.core.config import settings
+from app.core.dependencies import get_db, get_read_db
+from app.core.pagination import decode_cursor, encode_cursor
+from app.core.replicas import replica_router
+from app.commands.import_books import to_row
+from app.core import admission
+from app.core.response_cache import response_cache
 from app.core.security import get_current_user
 from app.schemas.user_schema import User
-from app.models.orm_models import Book, Review
+from app.models.orm_models import Book
+from app.recommender.incremental import IncrementalModel
+from app.recommender.model import build_model
+from app.core.leaderboard import Leaderboards
+from app.services import auth_service, leaderboard_service, recommendation_service
 
 async def override_get_db():
     """Mock dependency for the database session."""
-    yield AsyncMock()
+    session = AsyncMock()
+    session.info = {}
+    yield session
 
 async def override_get_current_user():
     """Mock dependency for the authenticated user."""
@@ -18,17 +37,26 @@ async def override_get_current_user():
 
 # Apply the overrides to the main FastAPI app instance for all tests.
 app.dependency_overrides[get_db] = override_get_db
+app.dependency_overrides[get_read_db] = override_get_db
 app.dependency_overrides[get_current_user] = override_get_current_user
 
 # Mark all tests in this file as asynchronous
 pytestmark = pytest.mark.asyncio
 
+@pytest_asyncio.fixture(autouse=True)
+async def clear_response_cache():
+    """Start every test with an empty books response cache, full rate limit buckets and no recent writers."""
+    await response_cache.clear()
+    await admission.rate_limit_backend.clear()
+    replica_router.recent_writers.clear()
+    replica_router.last_write_at = float("-inf")
+
 
 async def test_read_books_endpoint(mocker):
     """
     Tests the GET /books endpoint, mocking the repository layer.
     """
-    mock_book = Book(id=1, title="Test Book", author="Author", genre="Genre", reviews=[Review(rating=5), Review(rating=3)])
+    mock_book = Book(id=1, title="Test Book", author="Author", genre="Genre", rating_count=2, rating_sum=8)
     mocker.patch("app.repositories.book_repository.get_books", new_callable=AsyncMock, return_value=[mock_book])
 
     async with AsyncClient(app=app, base_url="http://test") as client:
@@ -46,10 +74,8 @@ async def test_create_review_endpoint(mocker):
     """
     review_payload = {"rating": 5, "review_text": "A masterpiece!"}
     
-    mocker.patch("app.repositories.review_repository.get_review_by_book_and_user", new_callable=AsyncMock, return_value=None)
-    
-    mock_created_review = Review(id=1, book_id=1, user_id=1, **review_payload)
-    mocker.patch("app.repositories.review_repository.create_review", new_callable=AsyncMock, return_value=mock_created_review)
+    mock_created_review = {"id": 1, "book_id": 1, "user_id": 1, **review_payload}
+    mocker.patch("app.repositories.review_repository.upsert_review", new_callable=AsyncMock, return_value=(mock_created_review, None))
 
     async with AsyncClient(app=app, base_url="http://test") as client:
         response = await client.post("/api/v1/books/1/reviews", json=review_payload)
@@ -64,15 +90,361 @@ async def test_update_review_endpoint(mocker):
     """
     review_payload = {"rating": 4, "review_text": "Updated review."}
     
-    existing_review = Review(id=99, book_id=1, user_id=1, rating=3, review_text="Old text")
-    mocker.patch("app.repositories.review_repository.get_review_by_book_and_user", new_callable=AsyncMock, return_value=existing_review)
-    
-    mock_updated_review = Review(id=99, book_id=1, user_id=1, **review_payload)
-    mocker.patch("app.repositories.review_repository.update_review", new_callable=AsyncMock, return_value=mock_updated_review)
+    mock_updated_review = {"id": 99, "book_id": 1, "user_id": 1, **review_payload}
+    mocker.patch("app.repositories.review_repository.upsert_review", new_callable=AsyncMock, return_value=(mock_updated_review, 3))
 
     async with AsyncClient(app=app, base_url="http://test") as client:
         response = await client.post("/api/v1/books/1/reviews", json=review_payload)
     
     assert response.status_code == 201
     assert response.json()["review_text"] == "Updated review."
-    assert response.json()["rating"] == 4
\ No newline at end of file
+    assert response.json()["rating"] == 4
+
+async def test_read_books_with_cursor(mocker):
+    """
+    Tests keyset pagination on GET /books: the cursor is turned into an id
+    bound and the next cursor is returned in the X-Next-Cursor header.
+    """
+    mock_book = Book(id=6, title="Test Book", author="Author", genre="Genre", rating_count=0, rating_sum=0)
+    mock_get_books = mocker.patch("app.repositories.book_repository.get_books", new_callable=AsyncMock, return_value=[mock_book])
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.get("/api/v1/books/", params={"cursor": encode_cursor({"id": 5}), "limit": 1})
+
+    assert response.status_code == 200
+    assert mock_get_books.call_args.kwargs["after_id"] == 5
+    assert decode_cursor(response.headers["X-Next-Cursor"]) == {"id": 6}
+
+async def test_read_books_with_invalid_cursor():
+    """
+    Tests that a malformed cursor is rejected with 400.
+    """
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.get("/api/v1/books/", params={"cursor": "not-a-cursor"})
+
+    assert response.status_code == 400
+
+async def test_read_books_is_cached_with_etag(mocker):
+    """
+    Tests that a repeated GET /books is answered from the response cache, and
+    that a matching If-None-Match gets a 304 without a body.
+    """
+    mock_book = Book(id=1, title="Test Book", author="Author", genre="Genre", rating_count=1, rating_sum=5)
+    mock_get_books = mocker.patch("app.repositories.book_repository.get_books", new_callable=AsyncMock, return_value=[mock_book])
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        first = await client.get("/api/v1/books/")
+        second = await client.get("/api/v1/books/", headers={"If-None-Match": first.headers["ETag"]})
+
+    assert first.status_code == 200
+    assert second.status_code == 304
+    assert second.content == b""
+    mock_get_books.assert_awaited_once()
+
+async def test_review_invalidates_cached_books(mocker):
+    """
+    Tests that posting a review evicts the cached pages that contain the reviewed book.
+    """
+    mock_book = Book(id=1, title="Test Book", author="Author", genre="Genre", rating_count=0, rating_sum=0)
+    mock_get_books = mocker.patch("app.repositories.book_repository.get_books", new_callable=AsyncMock, return_value=[mock_book])
+    mocker.patch(
+        "app.repositories.review_repository.upsert_review",
+        new_callable=AsyncMock,
+        return_value=({"id": 1, "book_id": 1, "user_id": 1, "rating": 5, "review_text": None}, None)
+    )
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        await client.get("/api/v1/books/")
+        await client.post("/api/v1/books/1/reviews", json={"rating": 5})
+        await client.get("/api/v1/books/")
+
+    assert mock_get_books.await_count == 2
+
+async def test_cached_books_follow_recent_writes(mocker):
+    """
+    A user who just wrote bypasses cached pages, and pages read from a replica
+    right after a write are not cached, since the replica may still lag.
+    """
+    mock_get_books = mocker.patch("app.repositories.book_repository.get_books", new_callable=AsyncMock, return_value=[])
+
+    async def override_get_replica_db():
+        session = AsyncMock()
+        session.info = {"replica": True}
+        yield session
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        await client.get("/api/v1/books/")
+        replica_router.record_write("testuser")
+        await client.get("/api/v1/books/")
+        assert mock_get_books.await_count == 2
+
+        replica_router.recent_writers.clear()
+        await response_cache.clear()
+        mocker.patch.dict(app.dependency_overrides, {get_read_db: override_get_replica_db})
+        await client.get("/api/v1/books/")
+        await client.get("/api/v1/books/")
+        assert mock_get_books.await_count == 4
+
+        replica_router.last_write_at -= settings.READ_YOUR_WRITES_SECONDS
+        await client.get("/api/v1/books/")
+        await client.get("/api/v1/books/")
+        assert mock_get_books.await_count == 5
+
+async def test_similar_books_endpoint(mocker):
+    """
+    Tests the GET /books/{book_id}/similar endpoint with a small in-memory model.
+    """
+    model = build_model(
+        user_ids=np.array([1, 1, 2, 2]), book_ids=np.array([1, 2, 1, 2]), ratings=np.array([5, 4, 4, 5]), k=5
+    )
+    mocker.patch.object(recommendation_service, "_model", IncrementalModel(model, k=5))
+    similar_book = Book(id=2, title="Similar Book", author="Author", genre="Genre", rating_count=0, rating_sum=0)
+    mocker.patch("app.repositories.book_repository.get_books_by_ids", new_callable=AsyncMock, return_value=[similar_book])
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.get("/api/v1/books/1/similar")
+
+    assert response.status_code == 200
+    assert response.json()[0]["id"] == 2
+    assert 0 < response.json()[0]["score"] <= 1
+
+async def test_recommendations_unavailable_without_model(mocker):
+    """
+    Tests that GET /recommendations/me returns 503 before any model was built.
+    """
+    mocker.patch.object(recommendation_service, "_model", None)
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.get("/api/v1/recommendations/me")
+
+    assert response.status_code == 503
+
+async def test_login_sheds_load_when_hash_pool_is_full(mocker):
+    """
+    Tests that POST /auth/login answers 503 with Retry-After instead of queueing
+    when the password hashing pool has no free slots.
+    """
+    mocker.patch.object(auth_service, "_hash_slots", asyncio.Semaphore(0))
+    mocker.patch(
+        "app.services.auth_service.get_user",
+        new_callable=AsyncMock,
+        return_value={"id": 1, "username": "smitpatel2002", "hashed_password": "x"}
+    )
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.post("/api/v1/auth/login", data={"username": "smitpatel2002", "password": "smit123"})
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
+async def test_metrics_endpoint_exposes_pool_gauges():
+    """
+    Tests that GET /metrics serves the pool gauges in the Prometheus text format.
+    """
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "# TYPE db_pool_checked_out gauge" in response.text
+    assert 'db_pool_size{host="localhost:5432"} 5' in response.text
+
+async def test_read_reviews_page_and_stream(mocker):
+    """
+    Tests that GET /books/{book_id}/reviews returns a page with a next cursor,
+    and streams newline-delimited JSON with format=ndjson.
+    """
+    review = {"id": 7, "book_id": 1, "user_id": 2, "rating": 4, "review_text": "Good"}
+    mocker.patch("app.services.review_service.get_reviews_for_book", new_callable=AsyncMock, return_value=[review])
+
+    async def iter_reviews(db, **kwargs):
+        yield [SimpleNamespace(_asdict=lambda: review)] * 2
+
+    mocker.patch("app.repositories.review_repository.iter_reviews", iter_reviews)
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        page = await client.get("/api/v1/books/1/reviews", params={"limit": 1, "sort": "rating"})
+        stream = await client.get("/api/v1/books/1/reviews", params={"format": "ndjson"})
+
+    assert page.status_code == 200
+    assert page.json() == [review]
+    assert decode_cursor(page.headers["X-Next-Cursor"]) == {"id": 7, "rating": 4}
+    assert stream.headers["content-type"] == "application/x-ndjson"
+    assert [json.loads(line) for line in stream.text.splitlines()] == [review, review]
+
+async def test_review_batch_reports_each_item(mocker):
+    """
+    Tests that POST /reviews:batch upserts the valid items together and
+    reports unknown books and superseded duplicates per item.
+    """
+    mocker.patch("app.repositories.book_repository.get_existing_book_ids", new_callable=AsyncMock, return_value={1, 2})
+    mock_upsert = mocker.patch(
+        "app.repositories.review_repository.upsert_reviews",
+        new_callable=AsyncMock,
+        return_value=[
+            ({"id": 10, "book_id": 1, "user_id": 1, "rating": 4, "review_text": None}, None),
+            ({"id": 11, "book_id": 2, "user_id": 1, "rating": 2, "review_text": None}, 5),
+        ]
+    )
+    items = [
+        {"book_id": 2, "rating": 1},
+        {"book_id": 1, "rating": 4},
+        {"book_id": 3, "rating": 5},
+        {"book_id": 2, "rating": 2},
+    ]
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.post("/api/v1/reviews:batch", json={"items": items})
+        too_many = await client.post("/api/v1/reviews:batch", json={"items": [{"book_id": 1, "rating": 1}] * 501})
+
+    assert response.status_code == 200
+    assert [result["status"] for result in response.json()] == ["error", "created", "error", "updated"]
+    assert response.json()[2]["detail"] == "Book not found"
+    assert [book_id for book_id, _ in mock_upsert.await_args.kwargs["reviews"]] == [1, 2]
+    assert too_many.status_code == 422
+
+async def test_request_metrics_and_server_timing(mocker):
+    """
+    Tests that requests are recorded per route template, and that the
+    Server-Timing breakdown is only sent when enabled and asked for.
+    """
+    mocker.patch("app.services.review_service.get_reviews_for_book", new_callable=AsyncMock, return_value=[])
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        plain = await client.get("/api/v1/books/5/reviews", headers={"X-Debug-Timing": "1"})
+        mocker.patch.object(settings, "SERVER_TIMING_ENABLED", True)
+        debug = await client.get("/api/v1/books/5/reviews", headers={"X-Debug-Timing": "1"})
+        invalid = await client.get("/api/v1/books/", params={"sort": "rating", "search": "x"})
+        metrics = await client.get("/metrics")
+
+    assert "Server-Timing" not in plain.headers
+    assert debug.headers["Server-Timing"].startswith('db;dur=')
+    assert 'desc="0 queries"' in debug.headers["Server-Timing"]
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/v1/books/{book_id}/reviews",status="200"}' in metrics.text
+    assert "http_requests_in_flight" in metrics.text
+    # requests whose endpoint raises are still labelled with their route
+    assert invalid.status_code == 400
+    assert 'http_request_duration_seconds_count{method="GET",route="/api/v1/books/",status="400"}' in metrics.text
+
+async def test_fast_json_responses_match_validated_ones(mocker):
+    """
+    Tests that with FAST_JSON_RESPONSES the books and reviews pages are built
+    from column rows and encode to the same JSON as the validated path.
+    """
+    row = SimpleNamespace(id=1, title="Dune", author="Frank Herbert", genre="Science Fiction", rating_count=3, rating_sum=13)
+    mocker.patch("app.repositories.book_repository.get_book_rows", new_callable=AsyncMock, return_value=[row])
+    mocker.patch(
+        "app.repositories.book_repository.get_books",
+        new_callable=AsyncMock,
+        return_value=[Book(id=1, title="Dune", author="Frank Herbert", genre="Science Fiction", rating_count=3, rating_sum=13)]
+    )
+    review = {"id": 7, "book_id": 1, "user_id": 2, "rating": 4, "review_text": None}
+    mocker.patch("app.services.review_service.get_reviews_for_book", new_callable=AsyncMock, return_value=[review])
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        validated = [(await client.get(path)).json() for path in ("/api/v1/books/", "/api/v1/books/1/reviews?limit=1")]
+        await response_cache.clear()
+        mocker.patch.object(settings, "FAST_JSON_RESPONSES", True)
+        books = await client.get("/api/v1/books/")
+        reviews = await client.get("/api/v1/books/1/reviews?limit=1")
+
+    assert [books.json(), reviews.json()] == validated
+    assert books.json()[0]["average_rating"] == 4.3
+    assert decode_cursor(reviews.headers["X-Next-Cursor"]) == {"id": 7}
+
+async def test_books_sorted_by_leaderboard(mocker):
+    """
+    Tests that sort=rating pages through the in-memory leaderboard with a
+    (score, id) cursor, that review writes move books on it, and that
+    /books/top ranks within a genre.
+    """
+    catalogue = [
+        Book(id=1, title="One", author="A", genre="Fantasy", rating_count=1, rating_sum=5),
+        Book(id=2, title="Two", author="B", genre="Fantasy", rating_count=100, rating_sum=450),
+        Book(id=3, title="Three", author="C", genre="Romance", rating_count=10, rating_sum=20),
+    ]
+    leaderboards = Leaderboards.build(
+        [(book.id, book.genre, book.rating_count, book.rating_sum) for book in catalogue],
+        review_times=[], prior_weight=10, half_life=3600, now=0.0,
+    )
+    mocker.patch.object(leaderboard_service, "_leaderboards", leaderboards)
+
+    async def get_books_by_ids(db, book_ids):
+        return [book for book in catalogue if book.id in book_ids]
+
+    mocker.patch("app.repositories.book_repository.get_books_by_ids", side_effect=get_books_by_ids)
+    mocker.patch(
+        "app.repositories.review_repository.upsert_review",
+        new_callable=AsyncMock,
+        return_value=({"id": 1, "book_id": 3, "user_id": 1, "rating": 5, "review_text": None}, 1),
+    )
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        first = await client.get("/api/v1/books/", params={"sort": "rating", "limit": 2})
+        second = await client.get("/api/v1/books/", params={"sort": "rating", "limit": 2, "cursor": first.headers["X-Next-Cursor"]})
+        top = await client.get("/api/v1/books/top", params={"genre": "Fantasy", "metric": "popularity"})
+        await client.post("/api/v1/books/3/reviews", json={"rating": 5})
+        after_write = await client.get("/api/v1/books/top", params={"metric": "rating", "limit": 3})
+        invalid = await client.get("/api/v1/books/", params={"sort": "rating", "search": "One"})
+
+    assert [book["id"] for book in first.json() + second.json()] == [2, 1, 3]
+    assert "X-Next-Cursor" not in second.headers
+    assert [(book["id"], book["score"]) for book in top.json()] == [(2, 100.0), (1, 1.0)]
+    assert [book["id"] for book in after_write.json()] == [2, 1, 3]
+    assert after_write.json()[2]["score"] > (leaderboards.prior_weight * leaderboards.prior_mean + 20) / 20
+    assert invalid.status_code == 400
+
+async def test_books_without_genre_are_listed(mocker):
+    """
+    Tests that a book imported without a genre (stored as NULL) is listed by
+    the validated and fast JSON paths and by /books/top.
+    """
+    title, author, genre = to_row({"title": "Untitled", "author": "Anon", "genre": " "})
+    book = Book(id=1, title=title, author=author, genre=genre, rating_count=1, rating_sum=4)
+    row = SimpleNamespace(id=1, title=title, author=author, genre=genre, rating_count=1, rating_sum=4)
+    mocker.patch("app.repositories.book_repository.get_books", new_callable=AsyncMock, return_value=[book])
+    mocker.patch("app.repositories.book_repository.get_book_rows", new_callable=AsyncMock, return_value=[row])
+    mocker.patch("app.repositories.book_repository.get_books_by_ids", new_callable=AsyncMock, return_value=[book])
+    leaderboards = Leaderboards.build([(1, None, 1, 4)], review_times=[], prior_weight=10, half_life=3600, now=0.0)
+    mocker.patch.object(leaderboard_service, "_leaderboards", leaderboards)
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        validated = await client.get("/api/v1/books/")
+        await response_cache.clear()
+        mocker.patch.object(settings, "FAST_JSON_RESPONSES", True)
+        fast = await client.get("/api/v1/books/")
+        top = await client.get("/api/v1/books/top")
+
+    assert genre is None
+    assert validated.status_code == fast.status_code == top.status_code == 200
+    assert validated.json() == fast.json()
+    assert validated.json()[0]["genre"] is None and top.json()[0]["genre"] is None
+
+async def test_book_filters_and_facets(mocker):
+    """
+    Tests that repeated genre parameters and the author filter reach the
+    repository, and that facets come from the count table unless searching.
+    """
+    get_books = mocker.patch("app.repositories.book_repository.get_books", new_callable=AsyncMock, return_value=[])
+    counts = mocker.patch(
+        "app.repositories.book_repository.get_genre_counts",
+        new_callable=AsyncMock,
+        return_value=[("Romance", 12), ("Horror", 3)],
+    )
+    searched = mocker.patch(
+        "app.repositories.book_repository.count_books_by_genre", new_callable=AsyncMock, return_value=[("Horror", 1)]
+    )
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        await client.get("/api/v1/books/", params={"genre": ["Romance", "Horror", "Romance"], "author": "Jane Austen"})
+        facets = await client.get("/api/v1/books/facets")
+        cached = await client.get("/api/v1/books/facets", headers={"If-None-Match": facets.headers["ETag"]})
+        search_facets = await client.get("/api/v1/books/facets", params={"search": "dracula"})
+
+    assert get_books.await_args.kwargs["genres"] == ["Horror", "Romance"]
+    assert get_books.await_args.kwargs["author"] == "Jane Austen"
+    assert facets.json() == {"genres": [{"genre": "Romance", "count": 12}, {"genre": "Horror", "count": 3}]}
+    assert cached.status_code == 304
+    assert counts.await_count == 1
+    assert search_facets.json() == {"genres": [{"genre": "Horror", "count": 1}]}
+    assert searched.await_args.args[1:] == ("dracula", None)
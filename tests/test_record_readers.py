@@ -0,0 +1,26 @@
+import io
+import json
+
+import pytest
+
+from app.core.record_readers import detect_format, iter_csv, iter_json_array, iter_json_lines
+
+def test_json_array_is_parsed_incrementally():
+    """
+    Elements are yielded correctly even when they straddle read-chunk boundaries.
+    """
+    books = [{"title": f"Book, [{i}]", "author": "Author", "genre": None} for i in range(50)]
+
+    assert list(iter_json_array(io.StringIO(json.dumps(books, indent=2)), chunk_size=7)) == books
+    assert list(iter_json_array(io.StringIO("[]"))) == []
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO('[{"title": "Dune"}'), chunk_size=4))
+
+def test_json_lines_and_csv_readers():
+    assert list(iter_json_lines(io.StringIO('{"title": "Dune"}\n\n{"title": "Emma"}\n'))) == [
+        {"title": "Dune"}, {"title": "Emma"}
+    ]
+    assert list(iter_csv(io.StringIO("title,author\nDune,Frank Herbert\n"))) == [
+        {"title": "Dune", "author": "Frank Herbert"}
+    ]
+    assert detect_format("catalog.ndjson") == "jsonl"
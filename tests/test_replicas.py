@@ -0,0 +1,69 @@
+import pytest
+from starlette.requests import Request
+
+from app.core import dependencies, metrics
+from app.core.replicas import Replica, ReplicaRouter
+from app.services import auth_service
+
+pytestmark = pytest.mark.asyncio
+
+def make_router(n_replicas: int = 2) -> ReplicaRouter:
+    replicas = [Replica(f"sqlite+aiosqlite:///replica{i}.db") for i in range(n_replicas)]
+    return ReplicaRouter(replicas, eject_seconds=60, sticky_seconds=60)
+
+def bearer_request(username: str) -> Request:
+    token = auth_service.create_access_token(data={"sub": username, "id": 1})
+    return Request({"type": "http", "headers": [(b"authorization", f"Bearer {token}".encode())]})
+
+async def test_round_robin_skips_ejected_replicas():
+    """
+    Replicas are used in turn; an ejected one is skipped, and with every
+    replica ejected reads fall back to the primary.
+    """
+    router = make_router()
+    first, second = router.replicas
+
+    assert [router.choose() for _ in range(4)] == [first, second, first, second]
+
+    router.eject(first)
+    assert [router.choose() for _ in range(3)] == [second, second, second]
+
+    router.eject(second)
+    assert router.choose() is None
+
+async def test_recent_writers_read_from_primary():
+    """
+    A user who just wrote is routed to the primary; other users are not.
+    """
+    router = make_router()
+    router.record_write("alice")
+
+    assert router.choose("alice") is None
+    assert router.choose("bob") is not None
+
+async def test_get_read_db_ejects_replica_on_connection_error(mocker):
+    """
+    A connection failure inside a replica session ejects that replica.
+    """
+    router = make_router(n_replicas=1)
+    mocker.patch.object(dependencies, "replica_router", router)
+
+    sessions = dependencies.get_read_db(bearer_request("alice"))
+    session = await sessions.__anext__()
+    assert session.bind is router.replicas[0].engine
+
+    with pytest.raises(ConnectionRefusedError):
+        await sessions.athrow(ConnectionRefusedError())
+    assert not router.replicas[0].healthy
+    assert router.choose("alice") is None
+
+async def test_pool_metrics_are_labelled_per_replica():
+    """
+    Every replica's pool is reported next to the primary's, under its own host label.
+    """
+    replica = Replica("postgresql+asyncpg://u:p@replica-a:6432/d")
+    rendered = metrics.REGISTRY.render()
+
+    assert replica.engine.pool.host == "replica-a:6432"
+    assert 'db_pool_size{host="replica-a:6432"} 5' in rendered
+    assert 'db_pool_size{host="localhost:5432"} 5' in rendered
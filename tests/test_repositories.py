@@ -0,0 +1,313 @@
+import asyncio
+
+import pytest
+from sqlalchemy import delete, event, exc, func, select, text, update
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.commands.import_users import to_row
+from app.core import instrumentation
+from app.core.instrumentation import RequestStats, instrument_engine
+from app.core.migrations import run_migrations
+from app.core.database import Base, InstrumentedQueuePool, POOL_CHECKOUT_SECONDS, POOL_CHECKOUT_TIMEOUTS
+from app.models.orm_models import Book, Review
+from app.repositories import book_repository, review_repository, user_repository
+from app.schemas.review_schema import ReviewCreate
+
+pytestmark = pytest.mark.asyncio
+
+async def test_search_orders_by_relevance(db):
+    """
+    Exact title matches rank above prefix matches, which rank above substring matches.
+    """
+    db.add_all([
+        Book(title="The Dune Encyclopedia", author="Willis McNelly", genre="Reference"),
+        Book(title="Dune Messiah", author="Frank Herbert", genre="Science Fiction"),
+        Book(title="Dune", author="Frank Herbert", genre="Science Fiction"),
+        Book(title="Emma", author="Jane Austen", genre="Romance"),
+    ])
+    await db.commit()
+
+    books = await book_repository.get_books(db, search="dune", skip=0, limit=10)
+
+    assert [book.title for book in books] == ["Dune", "Dune Messiah", "The Dune Encyclopedia"]
+    assert books[0].relevance > books[1].relevance > books[2].relevance
+
+async def test_search_keyset_pagination_and_wildcards(db):
+    """
+    Paging through search results with (relevance, id) cursors visits every match once,
+    and LIKE wildcards in the search term are matched literally.
+    """
+    db.add_all([Book(title=f"Book {i}", author="Author", genre="Genre") for i in range(5)])
+    db.add(Book(title="100% Book", author="Author", genre="Genre"))
+    await db.commit()
+
+    seen = []
+    after_id = after_relevance = None
+    while True:
+        page = await book_repository.get_books(
+            db, search="book", skip=0, limit=2, after_id=after_id, after_relevance=after_relevance
+        )
+        if not page:
+            break
+        seen.extend(book.id for book in page)
+        after_id, after_relevance = page[-1].id, page[-1].relevance
+
+    assert sorted(seen) == list(range(1, 7))
+    assert [book.title for book in await book_repository.get_books(db, search="%", skip=0, limit=10)] == ["100% Book"]
+
+async def test_upsert_users_skips_existing_unless_overwriting(db):
+    """
+    Bulk-imported users are looked up by username; re-imports only overwrite when asked to.
+    """
+    await user_repository.upsert_users(db, [{"username": "ada", "hashed_password": "old"}])
+    await user_repository.upsert_users(db, [{"username": "ada", "hashed_password": "new"}])
+    assert (await user_repository.get_user_by_username(db, "ada")).hashed_password == "old"
+
+    await user_repository.upsert_users(db, [{"username": "ada", "hashed_password": "new"}], overwrite=True)
+    db.expire_all()
+    user = await user_repository.get_user_by_username(db, "ada")
+    assert user.hashed_password == "new"
+    assert user.disabled is False
+
+async def test_imported_users_with_null_disabled_are_enabled(db):
+    """
+    A null or missing `disabled` in users.json imports as an enabled user instead of failing the batch.
+    """
+    records = [{"username": "ada", "hashed_password": "x", "disabled": None}, {"username": "bob", "hashed_password": "y"}]
+
+    await user_repository.upsert_users(db, [to_row(record) for record in records])
+
+    assert [(await user_repository.get_user_by_username(db, name)).disabled for name in ("ada", "bob")] == [False, False]
+
+async def test_import_books_upserts_on_title_and_author(db):
+    """
+    Catalog imports update existing books in upsert mode and leave them alone in skip mode.
+    """
+    await book_repository.import_books(db, [("Dune", "Frank Herbert", None), ("Emma", "Jane Austen", "Romance")])
+    await book_repository.import_books(db, [("Dune", "Frank Herbert", "Science Fiction")], mode="upsert")
+    await book_repository.import_books(db, [("Emma", "Jane Austen", "Classic")], mode="skip")
+
+    books = await book_repository.get_books(db, search=None, skip=0, limit=10)
+
+    assert [(book.title, book.genre) for book in books] == [("Dune", "Science Fiction"), ("Emma", "Romance")]
+
+async def test_import_books_batch_beyond_sqlite_variable_limit(db):
+    """
+    A batch of the documented maximum size imports on SQLite in statements
+    below the 999 bound variables of older SQLite builds.
+    """
+    bound = []
+    listener = lambda conn, cursor, statement, parameters, context, executemany: bound.append(len(parameters))
+    event.listen(db.bind.sync_engine, "before_cursor_execute", listener)
+    await book_repository.import_books(db, [(f"Book {i}", "Author", None) for i in range(50_000)])
+    event.remove(db.bind.sync_engine, "before_cursor_execute", listener)
+
+    assert await db.scalar(select(func.count()).select_from(Book)) == 50_000
+    assert max(bound) <= 999
+
+async def test_genre_and_author_filters(db):
+    """
+    Books can be filtered on any of several genres and on an exact author,
+    with and without a search.
+    """
+    db.add_all([
+        Book(title="Dune", author="Frank Herbert", genre="Science Fiction"),
+        Book(title="Emma", author="Jane Austen", genre="Romance"),
+        Book(title="Persuasion", author="Jane Austen", genre="Romance"),
+        Book(title="Dracula", author="Bram Stoker", genre="Horror"),
+    ])
+    await db.commit()
+
+    by_genre = await book_repository.get_books(db, search=None, skip=0, limit=10, genres=["Horror", "Romance"])
+    by_author = await book_repository.get_book_rows(db, search=None, skip=0, limit=10, author="Jane Austen", after_id=2)
+    searched = await book_repository.get_books(db, search="d", skip=0, limit=10, genres=["Horror"])
+
+    assert [book.title for book in by_genre] == ["Emma", "Persuasion", "Dracula"]
+    assert [row.title for row in by_author] == ["Persuasion"]
+    assert [book.title for book in searched] == ["Dracula"]
+
+async def test_genre_counts_follow_book_writes(db):
+    """
+    The genre_counts table is backfilled by the migrations and then kept up
+    to date by triggers on inserts, genre changes and deletes.
+    """
+    db.add_all([
+        Book(title="Dune", author="Frank Herbert", genre="Science Fiction"),
+        Book(title="Emma", author="Jane Austen", genre="Romance"),
+    ])
+    await db.commit()
+    async with db.bind.begin() as conn:
+        await run_migrations(conn)
+
+    await book_repository.import_books(db, [("Persuasion", "Jane Austen", "Romance"), ("Untitled", "Anon", None)])
+    await book_repository.import_books(db, [("Dune", "Frank Herbert", "Classics")], mode="upsert")
+    await db.execute(delete(Book).where(Book.title == "Emma"))
+    await db.execute(update(Book).values(rating_count=1))
+    await db.commit()
+
+    counts = await book_repository.get_genre_counts(db)
+    searched = await book_repository.count_books_by_genre(db, search="u")
+
+    assert [tuple(row) for row in counts] == [("Classics", 1), ("Romance", 1)]
+    assert [tuple(row) for row in searched] == [("Classics", 1), ("Romance", 1)]
+
+async def test_instrumented_pool_records_waits_and_timeouts():
+    """
+    A checkout from an exhausted pool times out and is counted, and every
+    checkout attempt lands in the wait histogram.
+    """
+    engine = create_async_engine(
+        "sqlite+aiosqlite://", poolclass=InstrumentedQueuePool, pool_size=1, max_overflow=0, pool_timeout=0.05
+    )
+    engine.pool.host = "exhausted"
+    waits, timeouts = POOL_CHECKOUT_SECONDS.count(host="exhausted"), POOL_CHECKOUT_TIMEOUTS.value(host="exhausted")
+
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+        assert engine.pool.checkedout() == 1
+        with pytest.raises(exc.TimeoutError):
+            async with engine.connect():
+                pass
+
+    assert POOL_CHECKOUT_TIMEOUTS.value(host="exhausted") == timeouts + 1
+    assert POOL_CHECKOUT_SECONDS.count(host="exhausted") == waits + 2
+    await engine.dispose()
+
+async def test_review_pages_by_id_and_by_rating(db):
+    """
+    Keyset pages of a book's reviews cover every review exactly once, in id
+    order or highest rating first, and streaming yields the same rows.
+    """
+    book = Book(title="Dune", author="Frank Herbert")
+    db.add(book)
+    await db.flush()
+    db.add_all([Review(book_id=book.id, user_id=user_id, rating=user_id % 5 + 1) for user_id in range(1, 12)])
+    db.add(Review(book_id=book.id + 1, user_id=1, rating=5))
+    await db.commit()
+
+    async def all_pages(sort):
+        rows, after_id, after_rating = [], None, None
+        while True:
+            page = await review_repository.get_reviews_page(
+                db, book.id, limit=4, sort=sort, after_id=after_id, after_rating=after_rating
+            )
+            rows.extend(page)
+            if len(page) < 4:
+                return rows
+            after_id, after_rating = page[-1].id, page[-1].rating
+
+    by_id = await all_pages("id")
+    assert [row.user_id for row in by_id] == list(range(1, 12))
+
+    by_rating = await all_pages("rating")
+    assert [(row.rating, row.id) for row in by_rating] == sorted(
+        ((row.rating, row.id) for row in by_id), key=lambda pair: (-pair[0], pair[1])
+    )
+
+    streamed = [row async for batch in review_repository.iter_reviews(db, book.id, sort="rating", batch_size=3) for row in batch]
+    assert streamed == by_rating
+
+async def test_rating_page_predicate_bounds_the_index_range(db):
+    """
+    Pages by rating carry a plain upper bound on the rating next to the OR,
+    so the (book_id, rating, id) index seeks to the page instead of scanning.
+    """
+    query = review_repository._book_reviews_query(1, "rating", after_id=5, after_rating=3)
+    sql = str(query.compile(dialect=postgresql.dialect()))
+    assert "reviews.book_id = %(book_id_1)s AND reviews.rating <= %(rating_1)s AND (" in sql
+
+    compiled = query.limit(10).compile(db.bind, compile_kwargs={"literal_binds": True})
+    plan = (await db.execute(text(f"EXPLAIN QUERY PLAN {compiled}"))).all()
+    assert "ix_reviews_book_id_rating_id (book_id=? AND rating<?)" in plan[0][-1]
+
+async def test_upsert_review_keeps_aggregates_exact(db):
+    """
+    Creating a review adds it to the book's aggregates; replacing it only
+    applies the rating difference and reports the previous rating.
+    """
+    book = Book(title="Dune", author="Frank Herbert")
+    db.add(book)
+    await db.commit()
+
+    saved, old_rating = await review_repository.upsert_review(db, book.id, user_id=1, review=ReviewCreate(rating=2))
+    assert old_rating is None
+    updated, old_rating = await review_repository.upsert_review(
+        db, book.id, user_id=1, review=ReviewCreate(rating=5, review_text="Better on a second read")
+    )
+    assert old_rating == 2
+    assert updated["id"] == saved["id"]
+    assert updated["review_text"] == "Better on a second read"
+
+    await db.refresh(book)
+    assert (book.rating_count, book.rating_sum) == (1, 5)
+
+async def test_concurrent_review_upserts(tmp_path):
+    """
+    Concurrent writes of the same users' reviews, each on its own connection,
+    leave one review per user and aggregates matching the stored ratings.
+    """
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'reviews.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    Session = async_sessionmaker(bind=engine, expire_on_commit=False)
+    async with Session() as db:
+        book = Book(title="Dune", author="Frank Herbert")
+        db.add(book)
+        await db.commit()
+
+    async def post(user_id, rating):
+        async with Session() as db:
+            return await review_repository.upsert_review(db, book.id, user_id=user_id, review=ReviewCreate(rating=rating))
+
+    results = await asyncio.gather(*(post(user_id, rating) for rating in range(1, 6) for user_id in range(1, 5)))
+    assert sum(old_rating is None for _, old_rating in results) == 4
+
+    async with Session() as db:
+        ratings = (await db.execute(select(Review.rating).where(Review.book_id == book.id))).scalars().all()
+        stored = await db.get(Book, book.id)
+    assert len(ratings) == 4
+    assert (stored.rating_count, stored.rating_sum) == (len(ratings), sum(ratings))
+    await engine.dispose()
+
+async def test_upsert_reviews_batch_updates_each_book_once(db):
+    """
+    A batch creates and replaces reviews of several books in one transaction,
+    returning the previous ratings in input order.
+    """
+    books = [Book(title=f"Book {i}", author="Author") for i in range(3)]
+    db.add_all(books)
+    await db.commit()
+    await review_repository.upsert_review(db, books[0].id, user_id=1, review=ReviewCreate(rating=1))
+
+    results = await review_repository.upsert_reviews(db, user_id=1, reviews=[
+        (books[2].id, ReviewCreate(rating=4)),
+        (books[0].id, ReviewCreate(rating=3)),
+        (books[1].id, ReviewCreate(rating=5)),
+    ])
+
+    assert [(saved["book_id"], old_rating) for saved, old_rating in results] == [
+        (books[2].id, None), (books[0].id, 1), (books[1].id, None)
+    ]
+    for book in books:
+        await db.refresh(book)
+    assert [(book.rating_count, book.rating_sum) for book in books] == [(1, 3), (1, 5), (1, 4)]
+
+async def test_instrumented_engine_counts_queries_per_request(db):
+    """
+    Queries are attributed to the request whose stats are current, and not
+    counted when no request is being served.
+    """
+    instrument_engine(db.bind)
+    await db.execute(text("SELECT 1"))
+
+    stats = RequestStats()
+    token = instrumentation._current_stats.set(stats)
+    try:
+        await db.execute(text("SELECT 1"))
+        await db.execute(select(Book))
+    finally:
+        instrumentation._current_stats.reset(token)
+
+    assert stats.db_queries == 2
+    assert stats.db_seconds > 0
@@ -0,0 +1,98 @@
+import pytest
+
+from app.core.response_cache import InMemoryCacheBackend, RedisCacheBackend, etag_matches
+
+pytestmark = pytest.mark.asyncio
+
+class FakePipeline:
+    """Queues commands and runs them against the FakeRedis on execute, as one round trip."""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+            return self
+        return queue
+
+    async def execute(self):
+        self.redis.round_trips += 1
+        return [getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+
+class FakeRedis:
+    """Local stand-in for the subset of redis.asyncio.Redis used by RedisCacheBackend."""
+
+    def __init__(self):
+        self.values = {}
+        self.sets = {}
+        self.round_trips = 0
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def get(self, key):
+        self.round_trips += 1
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value
+
+    def sadd(self, key, member):
+        self.sets.setdefault(key, set()).add(member.encode())
+
+    def smembers(self, key):
+        return self.sets.get(key, set())
+
+    def expire(self, key, ttl):
+        pass
+
+    async def scan_iter(self, match, count=None):
+        prefix = match.rstrip("*")
+        for key in [*self.values, *self.sets]:
+            if key.startswith(prefix):
+                yield key
+
+    async def delete(self, *keys):
+        self.round_trips += 1
+        for key in keys:
+            self.values.pop(key, None)
+            self.sets.pop(key, None)
+
+@pytest.mark.parametrize("backend_factory", [lambda: InMemoryCacheBackend(maxsize=10), lambda: RedisCacheBackend(FakeRedis())])
+async def test_invalidating_a_tag_evicts_only_its_entries(backend_factory):
+    backend = backend_factory()
+    await backend.set("page-1", b"one", ttl=60, tags=["book:1", "book:2"])
+    await backend.set("page-2", b"two", ttl=60, tags=["book:3"])
+
+    assert await backend.invalidate_tags(["book:2"]) == 1
+    assert await backend.get("page-1") is None
+    assert await backend.get("page-2") == b"two"
+
+@pytest.mark.parametrize("backend_factory", [lambda: InMemoryCacheBackend(maxsize=10), lambda: RedisCacheBackend(FakeRedis())])
+async def test_clear_empties_the_cache(backend_factory):
+    backend = backend_factory()
+    await backend.set("page-1", b"one", ttl=60, tags=["book:1"])
+    await backend.clear()
+
+    assert await backend.get("page-1") is None
+    assert await backend.invalidate_tags(["book:1"]) == 0
+
+async def test_redis_set_is_one_round_trip():
+    client = FakeRedis()
+    await RedisCacheBackend(client).set("page-1", b"one", ttl=60, tags=[f"book:{i}" for i in range(100)])
+
+    assert client.round_trips == 1
+
+def test_etag_matching():
+    assert etag_matches('W/"abc", "def"', '"abc"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches('"def"', '"abc"')
+    assert not etag_matches(None, '"abc"')
@@ -1,8 +1,20 @@
+import asyncio
+from collections import defaultdict, deque
+
 import pytest
 from unittest.mock import AsyncMock
 
-from app.services import auth_service, book_service, review_service
-from app.models.orm_models import Book, Review
+import numpy as np
+
+from fastapi import HTTPException
+
+from app.core import metrics, security
+from app.core.config import settings
+from app.services import auth_service, book_service, recommendation_service, review_service
+from app.models.orm_models import Book, User
+from app.recommender.incremental import IncrementalModel, RatingChange
+from app.recommender.model import build_model
+from app.recommender.store import current_version, list_versions, open_version, write_version
 from app.schemas.review_schema import ReviewCreate
 
 pytestmark = pytest.mark.asyncio
@@ -18,13 +30,42 @@ def test_verify_password_logic():
     assert auth_service.verify_password(plain_password, hashed_password) is True
     assert auth_service.verify_password("wrong-password", hashed_password) is False
 
+async def test_authenticate_user_verifies_on_hash_pool(mocker):
+    """
+    Unit test for auth_service.authenticate_user, which checks the password on the hashing pool.
+    """
+    user = {"id": 5, "username": "pooluser", "hashed_password": auth_service.pwd_context.hash("secret")}
+    mocker.patch("app.services.auth_service.get_user", new_callable=AsyncMock, side_effect=lambda db, username: user if username == "pooluser" else None)
+
+    assert await auth_service.authenticate_user(AsyncMock(), "pooluser", "secret") == user
+    assert await auth_service.authenticate_user(AsyncMock(), "pooluser", "wrong") is None
+    assert await auth_service.authenticate_user(AsyncMock(), "nobody", "secret") is None
+
+async def test_get_user_reads_through_cache(mocker):
+    """
+    Unit test for auth_service.get_user: the users table is queried once, then the cache answers.
+    """
+    auth_service.user_cache.clear()
+    db_user = User(id=3, username="cached", full_name="Cached User", email=None, hashed_password="x", disabled=False)
+    mock_get_user = mocker.patch(
+        "app.repositories.user_repository.get_user_by_username",
+        new_callable=AsyncMock,
+        return_value=db_user
+    )
+
+    first = await auth_service.get_user(AsyncMock(), "cached")
+    second = await auth_service.get_user(AsyncMock(), "cached")
+
+    assert first == second == auth_service._to_user_dict(db_user)
+    mock_get_user.assert_awaited_once()
+
 async def test_book_service_calculates_average_rating(mocker):
     """
     Unit test for the book_service.get_all_books function.
     Verifies that the average rating logic is correct.
     """
-    mock_book_with_reviews = Book(id=1, title="Book A", author="Author", genre="Genre", reviews=[Review(rating=5), Review(rating=3)])  # Avg: 4.0
-    mock_book_no_reviews = Book(id=2, title="Book B", author="Author", genre="Genre", reviews=[])  # Avg: 0.0
+    mock_book_with_reviews = Book(id=1, title="Book A", author="Author", genre="Genre", rating_count=2, rating_sum=8)  # Avg: 4.0
+    mock_book_no_reviews = Book(id=2, title="Book B", author="Author", genre="Genre", rating_count=0, rating_sum=0)  # Avg: 0.0
 
     mocker.patch(
         "app.repositories.book_repository.get_books",
@@ -38,29 +79,229 @@ async def test_book_service_calculates_average_rating(mocker):
     assert result[0]["average_rating"] == 4.0
     assert result[1]["average_rating"] == 0.0
 
-async def test_review_service_chooses_create_path(mocker):
+async def test_review_service_invalidates_only_on_rating_change(mocker):
     """
-    Unit test for the 'create' path in the review_service.create_or_update_review function.
+    Unit test for review_service.create_or_update_review: cached book pages
+    are invalidated when the upsert changed the rating, not when only the text changed.
     """
-    review_data = ReviewCreate(rating=5, review_text="Great book!")
+    saved_review = {"id": 1, "book_id": 1, "user_id": 1, "rating": 5, "review_text": "Great book!"}
+    mock_upsert = mocker.patch(
+        "app.repositories.review_repository.upsert_review",
+        new_callable=AsyncMock,
+        return_value=(saved_review, 5)
+    )
+    mock_invalidate = mocker.patch("app.core.response_cache.response_cache.invalidate_tags", new_callable=AsyncMock)
+
+    result = await review_service.create_or_update_review(
+        db=AsyncMock(), book_id=1, user_id=1, review=ReviewCreate(rating=5, review_text="Great book!")
+    )
+    assert result == saved_review
+    mock_invalidate.assert_not_called()
 
+    mock_upsert.return_value = (saved_review, None)
+    await review_service.create_or_update_review(
+        db=AsyncMock(), book_id=1, user_id=1, review=ReviewCreate(rating=5)
+    )
+    mock_invalidate.assert_awaited_once_with(["book:1"])
+
+def test_recommendations_exclude_rated_books():
+    """
+    Unit test for recommendation_service.score_candidates.
+    Books co-rated with the user's books are recommended; rated books are not.
+    """
+    model = build_model(
+        user_ids=np.array([1, 1, 1, 2, 2, 3, 3]),
+        book_ids=np.array([10, 20, 30, 10, 20, 10, 40]),
+        ratings=np.array([5, 5, 1, 4, 5, 2, 2]),
+        k=5,
+    )
+
+    scored = recommendation_service.score_candidates(model, ratings=[(10, 5), (30, 1)], limit=10)
+    recommended_ids = [book_id for book_id, _ in scored]
+
+    assert recommended_ids[0] == 20
+    assert 10 not in recommended_ids and 30 not in recommended_ids
+
+def test_incremental_update_matches_full_rebuild():
+    """
+    Unit test for IncrementalModel.apply.
+    A new rating folded in incrementally gives the same neighbours as rebuilding from scratch.
+    """
+    user_ids, book_ids, ratings = [1, 1, 2, 2, 3, 3], [10, 20, 10, 30, 20, 30], [5, 3, 4, 2, 1, 5]
+    model = IncrementalModel(
+        build_model(np.array(user_ids), np.array(book_ids), np.array(ratings), k=10), k=10
+    )
+
+    model.apply([RatingChange(user_id=1, book_id=30, old_rating=None, new_rating=4)], {1: {10: 5, 20: 3, 30: 4}})
+    rebuilt = build_model(np.array(user_ids + [1]), np.array(book_ids + [30]), np.array(ratings + [4]), k=10)
+
+    for book_id in (10, 20, 30):
+        assert [b for b, _ in model.neighbours(book_id, 10)] == [b for b, _ in rebuilt.neighbours(book_id, 10)]
+        for (_, incremental), (_, full) in zip(model.neighbours(book_id, 10), rebuilt.neighbours(book_id, 10)):
+            assert incremental == pytest.approx(full, rel=1e-4)
+
+async def test_rating_written_between_batch_cut_and_read_is_counted_once(mocker):
+    """
+    A rating committed after the update worker cut its batch but before it read
+    the user's ratings is rewound for that batch and applied once, by the next one.
+    """
+    user_ids, book_ids, ratings = [1, 1, 2, 2, 3, 3], [10, 20, 10, 30, 20, 30], [5, 3, 4, 2, 1, 5]
+    base = build_model(np.array(user_ids), np.array(book_ids), np.array(ratings), k=10)
+    mocker.patch.object(recommendation_service, "_model", IncrementalModel(base, k=10))
+    mocker.patch.object(recommendation_service, "_updates", asyncio.Queue())
+    mocker.patch.object(recommendation_service, "_queued_by_user", defaultdict(deque))
+    # the reviews table once both writes below are committed
     mocker.patch(
-        "app.repositories.review_repository.get_review_by_book_and_user",
+        "app.repositories.review_repository.get_ratings_by_user",
         new_callable=AsyncMock,
-        return_value=None
+        return_value=[(10, 5), (20, 1), (30, 4)],
     )
-    mock_create_review = mocker.patch(
-        "app.repositories.review_repository.create_review",
-        new_callable=AsyncMock
-    )
-    mock_update_review = mocker.patch(
-        "app.repositories.review_repository.update_review",
-        new_callable=AsyncMock
+
+    recommendation_service.enqueue_rating_change(user_id=1, book_id=30, old_rating=None, new_rating=4)
+    first_batch = [recommendation_service._take_update(await recommendation_service._updates.get())]
+    recommendation_service.enqueue_rating_change(user_id=1, book_id=20, old_rating=3, new_rating=1)
+    await recommendation_service.apply_rating_changes(AsyncMock(), first_batch)
+    second_batch = [recommendation_service._take_update(await recommendation_service._updates.get())]
+    await recommendation_service.apply_rating_changes(AsyncMock(), second_batch)
+
+    rebuilt = build_model(np.array(user_ids + [1]), np.array(book_ids + [30]), np.array([5, 1, 4, 2, 1, 5, 4]), k=10)
+    model = recommendation_service.get_model()
+    for book_id in (10, 20, 30):
+        assert [b for b, _ in model.neighbours(book_id, 10)] == [b for b, _ in rebuilt.neighbours(book_id, 10)]
+        for (_, incremental), (_, full) in zip(model.neighbours(book_id, 10), rebuilt.neighbours(book_id, 10)):
+            assert incremental == pytest.approx(full, rel=1e-4)
+
+async def test_rating_write_during_the_read_makes_the_batch_read_again(mocker):
+    """
+    A write that is in flight while the update worker reads a user's ratings
+    does not block; the worker reads again once the write has been queued.
+    """
+    user_ids, book_ids, ratings = [1, 1, 2, 2, 3, 3], [10, 20, 10, 30, 20, 30], [5, 3, 4, 2, 1, 5]
+    base = build_model(np.array(user_ids), np.array(book_ids), np.array(ratings), k=10)
+    mocker.patch.object(recommendation_service, "_model", IncrementalModel(base, k=10))
+    mocker.patch.object(recommendation_service, "_updates", asyncio.Queue())
+    mocker.patch.object(recommendation_service, "_queued_by_user", defaultdict(deque))
+    mocker.patch.object(recommendation_service, "_SETTLE_DELAY_SECONDS", 0.01)
+    write = recommendation_service.rating_write(1)
+
+    def finish_write():
+        recommendation_service.enqueue_rating_change(user_id=1, book_id=20, old_rating=3, new_rating=1)
+        write.__exit__(None, None, None)
+
+    async def read_ratings(db, user_id, limit):
+        if read_ratings.calls == 0:
+            # the write starts mid-read and commits before its enqueue
+            write.__enter__()
+            asyncio.get_running_loop().call_later(0.02, finish_write)
+        read_ratings.calls += 1
+        return [(10, 5), (20, 1), (30, 4)]
+    read_ratings.calls = 0
+    mocker.patch("app.repositories.review_repository.get_ratings_by_user", side_effect=read_ratings)
+
+    recommendation_service.enqueue_rating_change(user_id=1, book_id=30, old_rating=None, new_rating=4)
+    first_batch = [recommendation_service._take_update(await recommendation_service._updates.get())]
+    await recommendation_service.apply_rating_changes(AsyncMock(), first_batch)
+    assert read_ratings.calls == 2 and not recommendation_service._writes_in_flight
+    second_batch = [recommendation_service._take_update(await recommendation_service._updates.get())]
+    await recommendation_service.apply_rating_changes(AsyncMock(), second_batch)
+
+    rebuilt = build_model(np.array(user_ids + [1]), np.array(book_ids + [30]), np.array([5, 1, 4, 2, 1, 5, 4]), k=10)
+    model = recommendation_service.get_model()
+    for book_id in (10, 20, 30):
+        for (_, incremental), (_, full) in zip(model.neighbours(book_id, 10), rebuilt.neighbours(book_id, 10)):
+            assert incremental == pytest.approx(full, rel=1e-4)
+
+async def test_model_store_maps_versions_and_hot_swaps(tmp_path, mocker):
+    """
+    Versions written to the model store open as read-only memory maps with the
+    same neighbours, and the reload worker swaps in a newly published version.
+    """
+    root = str(tmp_path / "recommender")
+    first = build_model(np.array([1, 1, 2, 2]), np.array([10, 20, 10, 30]), np.array([5, 3, 4, 2]), k=10)
+    second = build_model(np.array([1, 1, 2]), np.array([10, 20, 20]), np.array([5, 3, 4]), k=10)
+
+    v1 = write_version(first, root)
+    mapped = open_version(root, v1)
+    assert isinstance(mapped.indices, np.memmap) and not mapped.indices.flags.writeable
+    assert mapped.neighbours(10, 10) == first.neighbours(10, 10)
+
+    mocker.patch.object(settings, "RECOMMENDER_RELOAD_SECONDS", 0.01)
+    mocker.patch.object(recommendation_service, "_model", None)
+    mocker.patch.object(recommendation_service, "_model_version", None)
+    assert recommendation_service.load_model_from_disk(root)
+    reloader = asyncio.create_task(recommendation_service.run_reload_worker(root))
+    try:
+        v2 = write_version(second, root, keep=1)
+        for _ in range(100):
+            if recommendation_service._model_version == v2:
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        reloader.cancel()
+
+    assert current_version(root) == v2 and list_versions(root) == [v2]
+    assert recommendation_service.get_model().neighbours(10, 10) == second.neighbours(10, 10)
+    # the old map stays readable after its version is deleted
+    assert mapped.neighbours(10, 10) == first.neighbours(10, 10)
+
+async def test_review_write_queues_recommendation_update(mocker):
+    """
+    Unit test that create_or_update_review hands the rating change to the recommendation model.
+    """
+    mocker.patch(
+        "app.repositories.review_repository.upsert_review",
+        new_callable=AsyncMock,
+        return_value=({"id": 1, "book_id": 1, "user_id": 1, "rating": 5, "review_text": None}, 2)
     )
+    mock_enqueue = mocker.patch("app.services.recommendation_service.enqueue_rating_change")
 
     await review_service.create_or_update_review(
-        db=AsyncMock(), book_id=1, user_id=1, review=review_data
+        db=AsyncMock(), book_id=1, user_id=1, review=ReviewCreate(rating=5)
     )
 
-    mock_create_review.assert_called_once()
-    mock_update_review.assert_not_called()
+    mock_enqueue.assert_called_once_with(user_id=1, book_id=1, old_rating=2, new_rating=5)
+
+async def test_get_current_user_caches_validated_tokens(mocker):
+    """
+    Unit test for the token cache in security.get_current_user.
+    A token is decoded once until its user's cached tokens are invalidated.
+    """
+    security.token_cache.clear()
+    token = auth_service.create_access_token(data={"sub": "smitpatel2002", "id": 1})
+    mock_decode = mocker.spy(security.jwt, "decode")
+    mocker.patch(
+        "app.services.auth_service.get_user",
+        new_callable=AsyncMock,
+        return_value={"id": 1, "username": "smitpatel2002", "hashed_password": "x"}
+    )
+
+    first_user = await security.get_current_user(token, db=AsyncMock())
+    second_user = await security.get_current_user(token, db=AsyncMock())
+
+    assert second_user is first_user
+    assert mock_decode.call_count == 1
+
+    assert security.invalidate_user_tokens("smitpatel2002") == 1
+    await security.get_current_user(token, db=AsyncMock())
+    assert mock_decode.call_count == 2
+
+async def test_disabling_a_user_revokes_cached_tokens(mocker):
+    """
+    Unit test that set_user_disabled drops the user's cached tokens, so their
+    next request is checked again and rejected with 403.
+    """
+    security.token_cache.clear()
+    token = auth_service.create_access_token(data={"sub": "smitpatel2002", "id": 1})
+    user = {"id": 1, "username": "smitpatel2002", "hashed_password": "x", "disabled": False}
+    mocker.patch("app.services.auth_service.get_user", new_callable=AsyncMock, side_effect=lambda db, username: user)
+    mocker.patch("app.repositories.user_repository.set_disabled", new_callable=AsyncMock, return_value=True)
+
+    await security.get_current_user(token, db=AsyncMock())
+    user["disabled"] = True
+    assert await auth_service.set_user_disabled(AsyncMock(), "smitpatel2002", True)
+
+    with pytest.raises(HTTPException) as exc:
+        await security.get_current_user(token, db=AsyncMock())
+    assert exc.value.status_code == 403
+    assert len(security.token_cache) == 0
+    assert "token_cache_hits_total" in metrics.REGISTRY.render()
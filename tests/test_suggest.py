@@ -0,0 +1,60 @@
+import random
+
+import pytest
+from httpx import AsyncClient
+
+from app.core.suggest import PrefixIndex, tokenize
+from app.services import suggest_service
+
+BOOKS = [
+    (1, "Dune", "Frank Herbert", 50),
+    (2, "Dune Messiah", "Frank Herbert", 20),
+    (3, "Les Misérables", "Victor Hugo", 30),
+    (4, "Dracula", "Bram Stoker", 40),
+    (5, "The Dutch House", "Ann Patchett", 40),
+]
+
+def test_tokenize_folds_case_and_accents():
+    assert tokenize("Les Misérables, ÉMILE!") == ["les", "miserables", "emile"]
+
+def test_suggest_ranks_prefix_matches_by_popularity():
+    """Every query word must start a title or author word; ties in popularity go to the lower id."""
+    index = PrefixIndex(BOOKS)
+
+    assert [book_id for book_id, _, _ in index.suggest("d", 10)] == [1, 4, 5, 2]
+    assert [book_id for book_id, _, _ in index.suggest("du", 2)] == [1, 5]
+    assert index.suggest("herb mess", 10) == [(2, "Dune Messiah", "Frank Herbert")]
+    assert [book_id for book_id, _, _ in index.suggest("misera", 10)] == [3]
+    assert index.suggest("une", 10) == []
+    assert index.suggest("  ", 10) == []
+
+def test_precomputed_prefixes_match_a_full_scan():
+    """Prefixes above the scan limit answer from their precomputed pool with the same ranking."""
+    rng = random.Random(0)
+    syllables = ["ka", "ri", "to", "mo", "la", "ne", "su", "pa"]
+    books = [
+        (book_id, " ".join("".join(rng.choices(syllables, k=rng.randint(1, 3))) for _ in range(2)), "Author", rng.randint(0, 100))
+        for book_id in range(1, 2_001)
+    ]
+    index = PrefixIndex(books, scan_limit=50, pool=20)
+    assert "k" in index.top and "ka" in index.top
+
+    for prefix in ["k", "ka", "kar", "karit", "m", "su", "pala", "x"]:
+        expected = sorted(
+            (book for book in books if any(word.startswith(prefix) for word in tokenize(book[1]))),
+            key=lambda book: (-book[3], book[0]),
+        )
+        assert [book_id for book_id, _, _ in index.suggest(prefix, 10)] == [book[0] for book in expected[:10]]
+
+@pytest.mark.asyncio
+async def test_suggest_endpoint(mocker):
+    """GET /books/suggest answers from the loaded index."""
+    from tests.test_api_endpoints import app
+
+    mocker.patch.object(suggest_service, "_index", PrefixIndex(BOOKS))
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.get("/api/v1/books/suggest", params={"q": "fra", "limit": 1})
+        empty = await client.get("/api/v1/books/suggest", params={"q": ""})
+
+    assert response.json() == [{"id": 1, "title": "Dune", "author": "Frank Herbert"}]
+    assert empty.status_code == 422